@@ -0,0 +1,166 @@
+"""Memeriksa mode batch offline (--batch) dari awal sampai akhir terhadap Batch API tiruan di benchmark.py.
+
+Untuk setiap provider: CLI metadata_engine.py dijalankan dengan --batch dan --api-base ke server tiruan, lalu
+dimatikan paksa (kill) segera setelah job tercatat di BatchJobStore. Run kedua harus melanjutkan polling job yang
+sama tanpa mengirim ulang gambar, menerapkan hasilnya (XMP ditulis ke setiap file) dan menutup job di store.
+Sebagian jawaban dibuat sebagai jawaban model lemah (keyword kurang) untuk memastikan validasi hasil batch
+memberi peringatan. State (~/.adobe_stock_metadata) diarahkan ke folder sementara, jadi data pengguna tidak tersentuh.
+
+Contoh:
+    python batch_check.py
+    python batch_check.py --provider OpenAI --images 12 --weak-rate 0.5
+
+Exit code 0 jika semua pemeriksaan lolos, 1 jika ada yang gagal, 2 jika pemeriksaan tidak bisa dijalankan.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark import MOCK_METADATA, MOCK_BATCH_POLLS, fetch_mock_stats, generate_corpus, start_mock_provider
+from metadata_engine import DEFAULT_MODELS, BatchJobStore, folder_state_path
+
+ENGINE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "metadata_engine.py")
+INVALID_WARNING = "tetap dipakai walau tidak sesuai aturan"
+
+
+def _engine_command(provider, folder, key_file, api_base, poll_interval):
+    return [
+        sys.executable, ENGINE_SCRIPT, folder, "--provider", provider, "--key-file", key_file, "--batch",
+        "--api-base", api_base, "--poll-interval", str(poll_interval), "--output", "xmp", "--verbosity", "info",
+    ]
+
+
+def _open_batches(folder, state_dir):
+    if not os.path.exists(folder_state_path(folder, state_dir)):
+        return []
+    store = BatchJobStore(folder, state_dir)
+    try:
+        return store.open_batches()
+    finally:
+        store.close()
+
+
+def _tagged_files(folder):
+    """File gambar yang sudah berisi judul jawaban server tiruan (XMP JPEG/PNG tidak dikompres)."""
+    title = MOCK_METADATA["title"].encode("utf-8")
+    tagged = []
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name), "rb") as f:
+            if title in f.read():
+                tagged.append(name)
+    return tagged
+
+
+def check_provider(provider, args, work_dir):
+    """Menjalankan skenario submit -> kill -> resume untuk satu provider. Mengembalikan daftar kegagalan."""
+    failures = []
+    provider_dir = os.path.join(work_dir, provider.lower())
+    corpus_dir = os.path.join(provider_dir, "corpus")
+    home_dir = os.path.join(provider_dir, "home")
+    state_dir = os.path.join(home_dir, ".adobe_stock_metadata", "batches")
+    os.makedirs(home_dir)
+    generate_corpus(corpus_dir, args.images, ["jpeg", "png"], 0.05, args.seed, jobs=1)
+    key_file = os.path.join(provider_dir, "keys.txt")
+    with open(key_file, "w", encoding="utf-8") as f:
+        f.write("AIzaBatchCheck0001\n" if provider == "Gemini" else "sk-batch-check-0001\n")
+    env = dict(os.environ, HOME=home_dir, USERPROFILE=home_dir, PYTHONIOENCODING="utf-8")
+
+    model_name = DEFAULT_MODELS[provider]
+    config = {
+        "latency": 0.0, "jitter": 0.0, "error_rate": 0.0, "rate_limit_rate": 0.0, "retry_after": 1,
+        "tail_rate": 0.0, "tail_latency": 0.0, "tail_provider": provider, "malformed_rate": 0.0,
+        "weak_models": [model_name], "weak_rate": args.weak_rate, "model": model_name, "seed": args.seed,
+        "batch_polls": MOCK_BATCH_POLLS,
+    }
+    mock_process, port = start_mock_provider(config)
+    api_base = f"http://127.0.0.1:{port}/v1" if provider == "OpenAI" else f"http://127.0.0.1:{port}"
+    try:
+        # Run pertama: job dikirim lalu proses dimatikan paksa saat menunggu jeda polling yang panjang
+        first = subprocess.Popen(
+            _engine_command(provider, corpus_dir, key_file, api_base, 3600),
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding="utf-8", env=env,
+        )
+        deadline = time.monotonic() + args.timeout
+        while not _open_batches(corpus_dir, state_dir) and first.poll() is None and time.monotonic() < deadline:
+            time.sleep(0.2)
+        submitted = _open_batches(corpus_dir, state_dir)
+        first.kill()
+        first_output = first.communicate()[0]
+        if not submitted:
+            return [f"{provider}: job batch tidak tercatat di BatchJobStore sebelum kill. Output:\n{first_output}"]
+        print(f"  {provider}: {len(submitted)} job dikirim ({submitted[0][0]}), proses dimatikan paksa")
+        if _tagged_files(corpus_dir):
+            failures.append(f"{provider}: metadata sudah ditulis sebelum job selesai")
+
+        # Run kedua: melanjutkan job yang sama dari BatchJobStore
+        try:
+            second = subprocess.run(
+                _engine_command(provider, corpus_dir, key_file, api_base, 1),
+                capture_output=True, text=True, encoding="utf-8", env=env, timeout=args.timeout,
+            )
+        except subprocess.TimeoutExpired:
+            return failures + [f"{provider}: run lanjutan tidak selesai dalam {args.timeout:g} s"]
+        output = second.stdout + second.stderr
+        stats = fetch_mock_stats(port)
+    finally:
+        mock_process.terminate()
+        mock_process.join(timeout=5)
+
+    tagged = _tagged_files(corpus_dir)
+    warnings = output.count(INVALID_WARNING)
+    print(f"  {provider}: run lanjutan exit {second.returncode}, {len(tagged)}/{args.images} file berisi metadata, "
+          f"{stats['batches']} job di server, {warnings} peringatan validasi untuk {stats['weak']} jawaban model lemah")
+    if second.returncode != 0:
+        failures.append(f"{provider}: run lanjutan gagal (exit {second.returncode})")
+    if "Melanjutkan" not in output:
+        failures.append(f"{provider}: run lanjutan tidak melanjutkan job yang tersimpan")
+    if stats["batches"] != len(submitted):
+        failures.append(f"{provider}: gambar dikirim ulang ({stats['batches']} job di server, seharusnya {len(submitted)})")
+    if len(tagged) != args.images:
+        failures.append(f"{provider}: hanya {len(tagged)} dari {args.images} file yang berisi metadata hasil batch")
+    if _open_batches(corpus_dir, state_dir):
+        failures.append(f"{provider}: job masih terbuka di BatchJobStore setelah hasil diterapkan")
+    if warnings != stats["weak"]:
+        failures.append(f"{provider}: {warnings} peringatan validasi, seharusnya {stats['weak']} (jawaban model lemah)")
+    if failures:
+        print(output, file=sys.stderr)
+    return failures
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Periksa mode batch offline (submit, kill, lanjutkan, terapkan hasil) terhadap Batch API tiruan.")
+    parser.add_argument("--provider", choices=["OpenAI", "Gemini"], action="append", help="Provider yang diperiksa (default: keduanya)")
+    parser.add_argument("--images", type=int, default=6, help="Jumlah gambar sintetis per provider")
+    parser.add_argument("--weak-rate", type=float, default=0.3, help="Peluang jawaban model lemah yang harus memicu peringatan validasi")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--timeout", type=float, default=120.0, help="Batas waktu setiap run CLI (detik)")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    work_dir = tempfile.mkdtemp(prefix="metadata_batch_check_")
+    failures = []
+    try:
+        for provider in args.provider or ["OpenAI", "Gemini"]:
+            print(f"Memeriksa mode batch {provider} ...")
+            failures += check_provider(provider, args, work_dir)
+    except Exception as e:
+        print(f"Error: Pemeriksaan tidak bisa dijalankan: {e}", file=sys.stderr)
+        return 2
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    for failure in failures:
+        print(f"GAGAL: {failure}")
+    if failures:
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,746 @@
+"""Benchmark throughput pipeline metadata tanpa API dan exiftool sungguhan.
+
+Alur yang diukur sama dengan tombol "Proses" di GUI (_process_images_in_background -> MetadataEngine.run),
+tetapi provider diganti server tiruan lokal dan exiftool diganti skrip tiruan, sehingga hasilnya bisa
+diulang dan dibandingkan antar perubahan kode.
+
+Contoh:
+    python benchmark.py --images 200 --megapixels 12 --report hasil.json
+    python benchmark.py --provider Gemini --latency-ms 800 --rate-limit-rate 0.05 --baseline hasil.json
+
+Yang dilaporkan: gambar/detik, peak RSS proses benchmark, dan waktu per tahap (cache, key_wait, read,
+encode, api, parse, write) dari RunStats engine. Korpus dan server tiruan berjalan di proses terpisah
+agar tidak ikut terhitung di RSS maupun bersaing GIL dengan engine.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import struct
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from metadata_engine import (
+    DEFAULT_ASYNC_CONCURRENCY,
+    DEFAULT_MODELS,
+    DEFAULT_UPLOAD_FORMAT,
+    DEFAULT_UPLOAD_LONG_EDGE,
+    DEFAULT_WORKER_COUNT,
+    EXECUTION_MODES,
+    LOG_ERROR,
+    LOG_LEVELS,
+    MAX_ASYNC_CONCURRENCY,
+    MAX_IMAGES_PER_REQUEST,
+    OUTPUT_MODES,
+    REQUIRED_KEYWORD_COUNT,
+    UPLOAD_FORMATS,
+    ExifToolWriter,
+    MetadataEngine,
+    log_level_enabled,
+)
+
+CORPUS_FORMATS = {"jpeg": ".jpg", "png": ".png", "tiff": ".tif", "psd": ".psd"}
+MOCK_METADATA = {
+    "title": "Synthetic benchmark image with soft abstract color gradients",
+    "description": "Abstract synthetic texture generated for pipeline throughput benchmarking.",
+    "keywords": ", ".join(f"keyword{i}" for i in range(REQUIRED_KEYWORD_COUNT)),
+}
+MOCK_WEAK_METADATA = dict(MOCK_METADATA, keywords=", ".join(f"keyword{i}" for i in range(REQUIRED_KEYWORD_COUNT // 2)))
+MOCK_COMPLETION_TOKENS = 180
+MOCK_BATCH_POLLS = 2 # Job batch tiruan selesai setelah diperiksa sebanyak ini
+REPORT_VERSION = 1
+
+
+# --- Korpus sintetis ---
+
+def _synthetic_image(width, height, seed):
+    """Gambar RGB deterministik: gradasi halus plus detail, agar ukuran hasil kompresi mendekati foto asli."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    coarse = Image.frombytes("RGB", (16, 12), rng.randbytes(16 * 12 * 3)).resize((width, height), Image.BICUBIC)
+    fine_size = (max(1, width // 8), max(1, height // 8))
+    fine = Image.frombytes("RGB", fine_size, rng.randbytes(fine_size[0] * fine_size[1] * 3)).resize((width, height), Image.BILINEAR)
+    return Image.blend(coarse, fine, 0.25)
+
+
+def write_psd(image, path):
+    """Menulis PSD RGB 8-bit minimal (tanpa layer, data mentah per kanal) yang bisa dibaca Pillow dan exiftool."""
+    width, height = image.size
+    with open(path, "wb") as f:
+        f.write(b"8BPS" + struct.pack(">H6xHIIHH", 1, 3, height, width, 8, 3))
+        f.write(struct.pack(">III", 0, 0, 0)) # Color mode data, image resources, layer & mask info: kosong
+        f.write(struct.pack(">H", 0)) # Kompresi: raw
+        for channel in image.split():
+            f.write(channel.tobytes())
+
+
+def _generate_corpus_file(path, image_format, width, height, seed):
+    image = _synthetic_image(width, height, seed)
+    if image_format == "psd":
+        write_psd(image, path)
+    elif image_format == "jpeg":
+        image.save(path, "JPEG", quality=92)
+    elif image_format == "png":
+        image.save(path, "PNG", compress_level=6)
+    else:
+        image.save(path, "TIFF", compression="tiff_lzw")
+    return os.path.getsize(path)
+
+
+def generate_corpus(folder, count, formats, megapixels, seed, jobs=None):
+    """Membuat `count` gambar sintetis bergiliran antar format. Dijalankan di proses anak. Mengembalikan total byte."""
+    os.makedirs(folder, exist_ok=True)
+    # Rasio 3:2 seperti kebanyakan kamera
+    height = max(16, int((megapixels * 1_000_000 / 1.5) ** 0.5))
+    width = int(height * 1.5)
+    tasks = []
+    for index in range(count):
+        image_format = formats[index % len(formats)]
+        path = os.path.join(folder, f"bench_{index:05d}{CORPUS_FORMATS[image_format]}")
+        tasks.append((path, image_format, width, height, seed * 1_000_003 + index))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return sum(executor.map(_generate_corpus_file, *zip(*tasks)))
+
+
+# --- Server provider tiruan ---
+
+class MockProviderHandler(BaseHTTPRequestHandler):
+    """Meniru endpoint chat completions OpenAI dan generateContent Gemini (REST), serta Batch API
+    keduanya: OpenAI /files + /batches dan Gemini batchGenerateContent + polling operasi batches/...
+    """
+
+    protocol_version = "HTTP/1.1" # Keep-alive, seperti API sungguhan
+    config = {}
+    counters = {}
+    rng = random.Random()
+    lock = threading.Lock()
+    batch_files = {} # id file -> isi (input JSONL yang diunggah atau output job)
+    batch_jobs = {} # id job (OpenAI batch_... / Gemini batches/...) -> status job tiruan
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/_stats":
+            with self.lock:
+                self._send_json(200, dict(self.counters))
+            return
+        segments = self.path.rstrip("/").split("/")
+        if len(segments) >= 3 and segments[-3] == "files" and segments[-1] == "content":
+            with self.lock:
+                content = self.batch_files.get(segments[-2])
+            if content is None:
+                self._send_json(404, {"error": {"message": "No such file"}})
+            else:
+                self._send_bytes(200, content, "application/octet-stream")
+        elif len(segments) >= 2 and segments[-2] == "batches":
+            job_id = segments[-1] if segments[-1].startswith("batch_") else f"batches/{segments[-1]}"
+            with self.lock:
+                job = self.batch_jobs.get(job_id)
+                if job is not None:
+                    job["polls"] += 1
+                    if job["polls"] >= self.config["batch_polls"] and not job["done"]:
+                        self._finish_batch_job(job)
+                    payload = self._batch_job_payload(job_id, job)
+            if job is None:
+                self._send_json(404, {"error": {"message": f"Job batch tiruan tidak dikenal: {job_id}"}})
+            else:
+                self._send_json(200, payload)
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.endswith(("/files", "/batches")) or ":batchGenerateContent" in self.path:
+            self._create_batch_resource(body)
+            return
+        if self.path.endswith("/chat/completions"):
+            provider = "OpenAI"
+        elif ":generateContent" in self.path:
+            provider = "Gemini"
+        else:
+            self._send_json(404, {"error": {"message": f"Endpoint tiruan tidak dikenal: {self.path}"}})
+            return
+
+        with self.lock:
+            self.counters["requests"] += 1
+            self.counters["request_bytes"] += len(body)
+            roll = self.rng.random()
+            malformed = self.rng.random() < self.config["malformed_rate"]
+            weak = self._roll_weak(requested_model(provider, self.path, body))
+            delay = max(0.0, self.config["latency"] + self.rng.uniform(-1, 1) * self.config["jitter"])
+            if provider == self.config["tail_provider"] and self.rng.random() < self.config["tail_rate"]:
+                self.counters["slow"] += 1
+                delay += self.config["tail_latency"]
+        time.sleep(delay)
+
+        if roll < self.config["rate_limit_rate"]:
+            self._count("rate_limited")
+            retry_after = self.config["retry_after"]
+            if provider == "OpenAI":
+                payload = {"error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}}
+            else:
+                payload = {"error": {"code": 429, "message": f"Resource has been exhausted (mock). Please retry in {retry_after}s.", "status": "RESOURCE_EXHAUSTED"}}
+            self._send_json(429, payload, {"Retry-After": str(retry_after)})
+        elif roll < self.config["rate_limit_rate"] + self.config["error_rate"]:
+            self._count("errors")
+            if provider == "OpenAI":
+                payload = {"error": {"message": "Internal server error (mock)", "type": "server_error"}}
+            else:
+                payload = {"error": {"code": 500, "message": "Internal error (mock)", "status": "INTERNAL"}}
+            self._send_json(500, payload)
+        else:
+            self._count("succeeded")
+            if malformed:
+                self._count("malformed")
+            if weak:
+                self._count("weak")
+            self._send_json(200, self._completion_payload(provider, body, malformed, weak))
+
+    def _roll_weak(self, model_name):
+        """True jika jawaban untuk model ini dibuat sebagai jawaban model lemah. Dipanggil dengan self.lock."""
+        return model_name in self.config["weak_models"] and self.rng.random() < self.config["weak_rate"]
+
+    def _completion_payload(self, provider, body, malformed, weak):
+        """Body respons sukses chat completions (OpenAI) atau generateContent (Gemini) untuk satu request."""
+        # Perkiraan kasar token prompt dari ukuran body (gambar base64 + prompt)
+        prompt_tokens = 300 + len(body) // 1000
+        # Request multi-gambar dijawab dengan {"images": [...]} berisi satu hasil per gambar
+        image_count = count_request_images(provider, body)
+        # Model lemah: keyword kurang dari yang diminta, juga pada putaran perbaikan (memicu eskalasi router model)
+        metadata = MOCK_WEAK_METADATA if weak else MOCK_METADATA
+        if image_count > 1:
+            text = json.dumps({"images": [dict(metadata, index=number) for number in range(1, image_count + 1)]})
+        else:
+            text = json.dumps(metadata)
+        # Jawaban terpotong di tengah (seperti output habis), kecuali untuk putaran perbaikan teks saja
+        if image_count and malformed:
+            text = text[:len(text) // 2]
+        completion_tokens = MOCK_COMPLETION_TOKENS * max(1, image_count)
+        if provider == "OpenAI":
+            return {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": self.config["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+            }
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": completion_tokens, "totalTokenCount": prompt_tokens + completion_tokens},
+        }
+
+    # --- Batch API tiruan ---
+
+    def _create_batch_resource(self, body):
+        """POST /files (unggah JSONL multipart), POST /batches (job OpenAI) atau models/<model>:batchGenerateContent (job Gemini)."""
+        if self.path.endswith("/files"):
+            content = multipart_file_content(self.headers.get("Content-Type", ""), body)
+            if content is None:
+                self._send_json(400, {"error": {"message": "Field 'file' tidak ada di upload multipart"}})
+                return
+            with self.lock:
+                file_id = f"file-mock{len(self.batch_files) + 1}"
+                self.batch_files[file_id] = content
+            self._send_json(200, {
+                "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": "batch.jsonl", "purpose": "batch", "status": "processed",
+            })
+            return
+
+        request = json.loads(body)
+        with self.lock:
+            if self.path.endswith("/batches"):
+                input_file = self.batch_files.get(request.get("input_file_id"))
+                if input_file is None:
+                    self._send_json(404, {"error": {"message": "No such file"}})
+                    return
+                job_id = f"batch_mock{len(self.batch_jobs) + 1}"
+                items = [json.loads(line) for line in input_file.decode("utf-8").splitlines() if line.strip()]
+                job = {"provider": "OpenAI", "input_file_id": request["input_file_id"], "items": items}
+            else:
+                job_id = f"batches/mock{len(self.batch_jobs) + 1}"
+                items = request["batch"]["input_config"]["requests"]["requests"]
+                job = {"provider": "Gemini", "model": requested_model("Gemini", self.path, body), "items": items}
+            job.update(polls=0, done=False, created_at=int(time.time()))
+            self.batch_jobs[job_id] = job
+            self.counters["batches"] += 1
+            self.counters["requests"] += len(items)
+            self.counters["request_bytes"] += len(body)
+            payload = self._batch_job_payload(job_id, job)
+        self._send_json(200, payload)
+
+    def _finish_batch_job(self, job):
+        """Membuat jawaban semua request job dengan error_rate, malformed_rate dan model lemah yang sama seperti
+        request biasa (tanpa rate limit: job batch memakai kuota terpisah). Dipanggil dengan self.lock."""
+        results, errors = [], []
+        for item in job["items"]:
+            if job["provider"] == "OpenAI":
+                request_body = json.dumps(item["body"]).encode("utf-8")
+                model_name, custom_id = item["body"].get("model"), item["custom_id"]
+            else:
+                request_body = json.dumps(item["request"]).encode("utf-8")
+                model_name, custom_id = job["model"], item.get("metadata") # {"key": custom_id}, dikembalikan apa adanya
+            if self.rng.random() < self.config["error_rate"]:
+                self.counters["errors"] += 1
+                if job["provider"] == "OpenAI":
+                    errors.append({"id": f"batch_req_{custom_id}", "custom_id": custom_id, "response": {
+                        "status_code": 500, "body": {"error": {"message": "Internal server error (mock)", "type": "server_error"}}}, "error": None})
+                else:
+                    results.append({"error": {"code": 500, "message": "Internal error (mock)", "status": "INTERNAL"}, "metadata": custom_id})
+                continue
+            malformed = self.rng.random() < self.config["malformed_rate"]
+            weak = self._roll_weak(model_name)
+            self.counters["succeeded"] += 1
+            self.counters["malformed"] += malformed
+            self.counters["weak"] += weak
+            response = self._completion_payload(job["provider"], request_body, malformed, weak)
+            if job["provider"] == "OpenAI":
+                results.append({"id": f"batch_req_{custom_id}", "custom_id": custom_id, "response": {"status_code": 200, "body": response}, "error": None})
+            else:
+                results.append({"response": response, "metadata": custom_id})
+        if job["provider"] == "OpenAI":
+            for name, lines in (("output_file_id", results), ("error_file_id", errors)):
+                if lines:
+                    file_id = f"file-mock{len(self.batch_files) + 1}"
+                    self.batch_files[file_id] = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+                    job[name] = file_id
+        else:
+            job["responses"] = results
+        job["done"] = True
+
+    def _batch_job_payload(self, job_id, job):
+        """Objek batch OpenAI atau operasi batch Gemini sesuai status job. Dipanggil dengan self.lock."""
+        if job["provider"] == "OpenAI":
+            failed = len(self.batch_files[job["error_file_id"]].splitlines()) if job.get("error_file_id") else 0
+            return {
+                "id": job_id, "object": "batch", "endpoint": "/v1/chat/completions", "input_file_id": job["input_file_id"],
+                "completion_window": "24h", "status": "completed" if job["done"] else ("validating" if job["polls"] == 0 else "in_progress"),
+                "created_at": job["created_at"], "output_file_id": job.get("output_file_id"), "error_file_id": job.get("error_file_id"),
+                "request_counts": {"total": len(job["items"]), "completed": len(job["items"]) - failed if job["done"] else 0, "failed": failed},
+            }
+        if not job["done"]:
+            return {"name": job_id, "metadata": {"name": job_id, "state": "BATCH_STATE_PENDING" if job["polls"] == 0 else "BATCH_STATE_RUNNING"}}
+        return {
+            "name": job_id, "done": True,
+            "metadata": {"name": job_id, "state": "BATCH_STATE_SUCCEEDED"},
+            "response": {"inlinedResponses": {"inlinedResponses": job["responses"]}},
+        }
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def _send_json(self, status, payload, headers=None):
+        self._send_bytes(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    def _send_bytes(self, status, data, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass # Klien menutup koneksi, mis. request hedging yang kalah dibatalkan
+
+
+def requested_model(provider, path, body):
+    """Nama model yang diminta: field "model" body chat completions (OpenAI) atau path .../models/<model>:generateContent (Gemini)."""
+    if provider == "Gemini":
+        return path.split("/models/")[-1].split(":")[0]
+    try:
+        return json.loads(body).get("model")
+    except ValueError:
+        return None
+
+
+def multipart_file_content(content_type, body):
+    """Isi field 'file' dari body multipart/form-data (upload /files OpenAI), atau None jika tidak ada."""
+    from email import policy
+    from email.parser import BytesParser
+
+    message = BytesParser(policy=policy.HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body)
+    if not message.is_multipart():
+        return None
+    for part in message.iter_parts():
+        if part.get_param("name", header="content-disposition") == "file":
+            return part.get_payload(decode=True)
+    return None
+
+
+def count_request_images(provider, body):
+    """Jumlah gambar di body request chat completions (OpenAI) atau generateContent (Gemini)."""
+    try:
+        request = json.loads(body)
+    except ValueError:
+        return 0
+    if provider == "OpenAI":
+        parts = [part for message in request.get("messages", []) if isinstance(message.get("content"), list) for part in message["content"]]
+        return sum(1 for part in parts if part.get("type") == "image_url")
+    parts = [part for content in request.get("contents", []) for part in content.get("parts", [])]
+    return sum(1 for part in parts if "inlineData" in part or "inline_data" in part)
+
+
+class MockProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024 # Backlog besar agar mode asyncio tidak ditolak di accept()
+
+
+def _serve_mock_provider(config, port_pipe):
+    MockProviderHandler.config = config
+    MockProviderHandler.counters = {"requests": 0, "request_bytes": 0, "succeeded": 0, "errors": 0, "rate_limited": 0, "slow": 0, "malformed": 0, "weak": 0, "batches": 0}
+    MockProviderHandler.batch_files = {}
+    MockProviderHandler.batch_jobs = {}
+    MockProviderHandler.rng = random.Random(config["seed"])
+    server = MockProviderServer(("127.0.0.1", 0), MockProviderHandler)
+    port_pipe.send(server.server_address[1])
+    port_pipe.close()
+    server.serve_forever()
+
+
+def start_mock_provider(config):
+    """Menjalankan server tiruan di proses terpisah. Mengembalikan (process, port)."""
+    parent_pipe, child_pipe = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_serve_mock_provider, args=(config, child_pipe), name="mock-provider", daemon=True)
+    process.start()
+    if not parent_pipe.poll(30):
+        process.terminate()
+        raise RuntimeError("Server provider tiruan tidak merespons.")
+    return process, parent_pipe.recv()
+
+
+def fetch_mock_stats(port):
+    from urllib.request import urlopen
+
+    with urlopen(f"http://127.0.0.1:{port}/_stats", timeout=10) as response:
+        return json.loads(response.read())
+
+
+# --- exiftool tiruan ---
+
+FAKE_EXIFTOOL_SOURCE = '''import sys, time
+# exiftool tiruan untuk benchmark: protokol -stay_open, -ver, tulis (tanpa mengubah file) dan baca -j
+WRITE_LATENCY = {latency!r}
+
+def run(args):
+    if "-ver" in args:
+        return "99.99-bench\\n"
+    if "-j" in args:
+        return "[]\\n"
+    files = [arg for arg in args if not arg.startswith("-") and "=" not in arg and arg not in ("UTF8", ",")]
+    time.sleep(WRITE_LATENCY * len(files))
+    return "    %d image files updated\\n" % len(files)
+
+if "-stay_open" in sys.argv:
+    args = []
+    for line in sys.stdin:
+        line = line.rstrip("\\n")
+        if line.startswith("-execute"):
+            sys.stdout.write(run(args) + "{{ready%s}}\\n" % line[len("-execute"):])
+            sys.stdout.flush()
+            args = []
+        elif line == "False":
+            break
+        elif line != "-stay_open":
+            args.append(line)
+else:
+    sys.stdout.write(run(sys.argv[1:]))
+'''
+
+
+def write_fake_exiftool(folder, write_latency):
+    """Menulis skrip exiftool tiruan dan mengembalikan path yang bisa dijalankan langsung oleh Popen."""
+    script_path = os.path.join(folder, "fake_exiftool.py")
+    with open(script_path, "w", encoding="utf-8") as f:
+        f.write(FAKE_EXIFTOOL_SOURCE.format(latency=write_latency))
+    if os.name == "nt":
+        launcher = os.path.join(folder, "fake_exiftool.cmd")
+        with open(launcher, "w", encoding="utf-8") as f:
+            f.write(f'@"{sys.executable}" "{script_path}" %*\n')
+        return launcher
+    launcher = os.path.join(folder, "fake_exiftool")
+    with open(launcher, "w", encoding="utf-8") as f:
+        f.write(f"#!{sys.executable}\n")
+        f.write(FAKE_EXIFTOOL_SOURCE.format(latency=write_latency))
+    os.chmod(launcher, 0o755)
+    return launcher
+
+
+# --- Pengukuran ---
+
+def peak_rss_mb():
+    """Peak RSS proses ini dalam MB, atau None jika modul resource tidak tersedia (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux melaporkan KB, macOS byte
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def run_engine_once(args, corpus_dir, work_dir, exiftool_path, api_base):
+    """Satu run engine penuh atas korpus. Mengembalikan dict hasil run."""
+    def log(message, level):
+        if log_level_enabled(level, args.verbosity):
+            print(f"  [{level}] {message}", file=sys.stderr)
+
+    engine = MetadataEngine(log=log)
+    keys = []
+    for provider in filter(None, {args.provider, args.secondary_provider}):
+        key_prefix = "AIzaBench" if provider == "Gemini" else "sk-bench-"
+        keys += [f"{key_prefix}{index:04d}" for index in range(args.keys)]
+    engine.set_api_keys(keys)
+    engine.provider = args.provider
+    engine.model_name = args.model or DEFAULT_MODELS[args.provider]
+    engine.secondary_provider = args.secondary_provider
+    engine.secondary_model_name = args.secondary_model
+    engine.hedge_percentile = args.hedge_percentile
+    engine.auto_model = args.auto_model
+    engine.api_base = api_base
+    engine.worker_count = args.workers
+    engine.max_in_flight_per_provider = args.max_in_flight or max(args.workers, args.concurrency)
+    engine.execution_mode = args.mode
+    engine.async_concurrency = args.concurrency
+    engine.images_per_request = args.images_per_request
+    engine.key_limits = {provider: {"rpm": args.rpm, "tpm": args.tpm} for provider in filter(None, {args.provider, args.secondary_provider})}
+    engine.upload_options = {"enabled": not args.no_downscale, "max_long_edge": args.long_edge, "output_format": args.upload_format}
+    engine.use_result_cache = False # Setiap run harus benar-benar memanggil provider
+    engine.resume_job = False
+    engine.job_manifest_dir = os.path.join(work_dir, "jobs")
+    engine.output_mode = args.output
+    engine.jsonl_path = os.path.join(work_dir, "output.jsonl")
+    engine.csv_path = os.path.join(work_dir, "output.csv")
+    engine.exiftool_writer = ExifToolWriter(use_wsl=False, executable=exiftool_path)
+    try:
+        if args.output == "exiftool" and not engine.check_exiftool():
+            raise RuntimeError("exiftool tiruan gagal dijalankan.")
+        started = time.perf_counter()
+        summary = engine.run(None, corpus_dir)
+        elapsed = time.perf_counter() - started
+    finally:
+        engine.close()
+
+    snapshot = engine.stats.snapshot()
+    completed = summary.get("successful", 0) + summary.get("failed", 0)
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "images_per_second": round(completed / elapsed, 3) if elapsed > 0 else 0.0,
+        "succeeded": summary.get("successful", 0),
+        "failed": summary.get("failed", 0),
+        "retries": snapshot["retries"],
+        "routing": snapshot["routing"],
+        "estimated_cost_usd": round(sum(snapshot["estimated_cost_usd"].values()), 6),
+        "bytes_uploaded": snapshot["bytes_uploaded"],
+        "stages": snapshot["stages"],
+    }
+
+
+def compare_with_baseline(report, baseline, max_regression):
+    """Mencetak selisih terhadap laporan sebelumnya. Mengembalikan False jika throughput turun melebihi batas (%)."""
+    def delta(current, previous):
+        if not previous:
+            return "n/a"
+        return f"{(current - previous) / previous * 100:+.1f}%"
+
+    print(f"\nDibandingkan dengan baseline ({baseline.get('created_at', '?')}):")
+    current_rate, previous_rate = report["images_per_second"], baseline.get("images_per_second", 0)
+    print(f"  gambar/detik : {previous_rate:.2f} -> {current_rate:.2f} ({delta(current_rate, previous_rate)})")
+    if report.get("peak_rss_mb") is not None and baseline.get("peak_rss_mb"):
+        print(f"  peak RSS MB  : {baseline['peak_rss_mb']:.1f} -> {report['peak_rss_mb']:.1f} ({delta(report['peak_rss_mb'], baseline['peak_rss_mb'])})")
+    for stage, current in report["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous:
+            print(f"  {stage:<12} p50: {previous['p50']:.4f} -> {current['p50']:.4f} s ({delta(current['p50'], previous['p50'])})")
+    if baseline.get("config") != report["config"]:
+        print("  Peringatan: konfigurasi benchmark berbeda dengan baseline; perbandingan mungkin tidak setara.")
+    if previous_rate and current_rate < previous_rate * (1 - max_regression / 100):
+        print(f"  REGRESI: throughput turun lebih dari {max_regression:.0f}%.")
+        return False
+    return True
+
+
+def print_report(report):
+    print(f"\nHasil benchmark ({report['config']['provider']}, mode {report['config']['mode']}, {report['images']} gambar):")
+    for index, run in enumerate(report["runs"], start=1):
+        print(f"  run {index}: {run['images_per_second']:.2f} gambar/detik dalam {run['elapsed_seconds']:.2f} s (berhasil {run['succeeded']}, gagal {run['failed']}, retry {run['retries']})")
+    print(f"  median       : {report['images_per_second']:.2f} gambar/detik")
+    routing = report["routing"]
+    if any(routing.values()):
+        print(f"  routing      : failover {routing['failover']}, hedge {routing['hedged']} (menang {routing['hedge_won']}), eskalasi model {routing['escalated']}")
+    print(f"  biaya        : ~${report['estimated_cost_usd']:.4f} (perkiraan dari token, run median)")
+    print(f"  peak RSS     : {report['peak_rss_mb']} MB" if report["peak_rss_mb"] is not None else "  peak RSS     : tidak tersedia di platform ini")
+    print("  waktu per tahap (run median):")
+    for stage, values in report["stages"].items():
+        print(f"    {stage:<10} n={values['count']:<6} total {values['sum_seconds']:>9.3f} s  p50 {values['p50']:.4f}  p95 {values['p95']:.4f}  p99 {values['p99']:.4f}  max {values['max']:.4f}")
+    server = report["mock_server"]
+    print(f"  server tiruan: {server['requests']} request, {server['rate_limited']} rate limit, {server['errors']} error, {server['slow']} lambat, {server['malformed']} JSON rusak, {server['weak']} jawaban model lemah, {server['request_bytes'] / (1024 * 1024):.1f} MB diterima")
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmark throughput pipeline metadata dengan provider dan exiftool tiruan.")
+    corpus = parser.add_argument_group("korpus")
+    corpus.add_argument("--images", type=int, default=100, help="Jumlah gambar sintetis")
+    corpus.add_argument("--formats", default="jpeg,png,tiff,psd", help=f"Format dipisah koma, bergiliran: {', '.join(CORPUS_FORMATS)}")
+    corpus.add_argument("--megapixels", type=float, default=12.0, help="Ukuran setiap gambar (megapiksel)")
+    corpus.add_argument("--seed", type=int, default=1, help="Seed korpus dan server tiruan (hasil bisa diulang)")
+    corpus.add_argument("--corpus-dir", help="Pakai/buat korpus di folder ini alih-alih folder sementara (dibuat ulang jika kosong)")
+
+    provider = parser.add_argument_group("provider tiruan")
+    provider.add_argument("--provider", choices=["Gemini", "OpenAI"], default="OpenAI")
+    provider.add_argument("--model", help="Nama model yang dilaporkan (default sama dengan aplikasi)")
+    provider.add_argument("--keys", type=int, default=3, help="Jumlah API Key palsu")
+    provider.add_argument("--latency-ms", type=float, default=500.0, help="Latensi rata-rata respons")
+    provider.add_argument("--jitter-ms", type=float, default=100.0, help="Variasi latensi (+/-)")
+    provider.add_argument("--error-rate", type=float, default=0.0, help="Peluang respons 500 (0-1)")
+    provider.add_argument("--rate-limit-rate", type=float, default=0.0, help="Peluang respons 429 dengan Retry-After (0-1)")
+    provider.add_argument("--retry-after", type=float, default=1.0, help="Nilai Retry-After pada respons 429 (detik)")
+    provider.add_argument("--malformed-rate", type=float, default=0.0, help="Peluang jawaban JSON terpotong (0-1), untuk menguji putaran perbaikan")
+    provider.add_argument("--weak-model", action="append", default=[], help="Model yang jawabannya kadang kekurangan keyword (boleh diulang), untuk menguji --auto-model")
+    provider.add_argument("--weak-rate", type=float, default=0.5, help="Peluang jawaban --weak-model gagal cek kualitas (0-1)")
+    provider.add_argument("--tail-rate", type=float, default=0.0, help="Peluang respons provider utama yang sangat lambat (0-1), untuk menguji hedging")
+    provider.add_argument("--tail-ms", type=float, default=10000.0, help="Tambahan latensi respons lambat")
+    provider.add_argument("--secondary-provider", choices=["Gemini", "OpenAI"], help="Provider cadangan engine (failover/hedging); dilayani server tiruan yang sama")
+    provider.add_argument("--secondary-model", help="Model provider cadangan")
+    provider.add_argument("--hedge-percentile", type=float, default=0, help="Persentil latensi untuk hedging (0 = mati)")
+    provider.add_argument("--rpm", type=int, default=100000, help="Batas RPM per kunci di scheduler engine")
+    provider.add_argument("--tpm", type=int, default=100000000, help="Batas TPM per kunci di scheduler engine")
+
+    engine = parser.add_argument_group("engine")
+    engine.add_argument("--mode", choices=EXECUTION_MODES, default="threads")
+    engine.add_argument("--workers", type=int, default=DEFAULT_WORKER_COUNT)
+    engine.add_argument("--max-in-flight", type=int, help="Maks request aktif per provider (default: workers/concurrency)")
+    engine.add_argument("--concurrency", type=int, default=DEFAULT_ASYNC_CONCURRENCY, help=f"Request bersamaan di mode asyncio (maks {MAX_ASYNC_CONCURRENCY})")
+    engine.add_argument("--images-per-request", type=int, default=1, help=f"Gambar per request (maks {MAX_IMAGES_PER_REQUEST})")
+    engine.add_argument("--long-edge", type=int, default=DEFAULT_UPLOAD_LONG_EDGE)
+    engine.add_argument("--upload-format", choices=list(UPLOAD_FORMATS), default=DEFAULT_UPLOAD_FORMAT)
+    engine.add_argument("--no-downscale", action="store_true", help="Kirim file asli tanpa diperkecil")
+    engine.add_argument("--auto-model", action="store_true", help="Router model hemat: mulai dari model termurah sampai --model")
+    engine.add_argument("--output", choices=OUTPUT_MODES, default="exiftool")
+    engine.add_argument("--exiftool-latency-ms", type=float, default=20.0, help="Lama exiftool tiruan menulis satu file")
+
+    run = parser.add_argument_group("laporan")
+    run.add_argument("--repeat", type=int, default=1, help="Jumlah run; laporan memakai run dengan throughput median")
+    run.add_argument("--report", help="Simpan laporan JSON ke file ini")
+    run.add_argument("--baseline", help="Bandingkan dengan laporan JSON sebelumnya")
+    run.add_argument("--max-regression", type=float, default=10.0, help="Exit code 1 jika gambar/detik turun lebih dari persentase ini dibanding baseline")
+    run.add_argument("--verbosity", choices=LOG_LEVELS, default=LOG_ERROR, help="Level log engine yang ditampilkan")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    formats = [name.strip().lower() for name in args.formats.split(",") if name.strip()]
+    unknown = [name for name in formats if name not in CORPUS_FORMATS]
+    if unknown or not formats:
+        print(f"Error: Format tidak dikenal: {', '.join(unknown) or '(kosong)'}", file=sys.stderr)
+        return 2
+    if "Gemini" in (args.provider, args.secondary_provider) and args.mode == "asyncio":
+        # Klien async Gemini memakai gRPC, server tiruan hanya berbicara REST
+        print("Error: Mode asyncio untuk Gemini belum didukung server tiruan (gRPC); pakai OpenAI atau mode threads.", file=sys.stderr)
+        return 2
+
+    work_dir = tempfile.mkdtemp(prefix="metadata_bench_")
+    corpus_dir = args.corpus_dir or os.path.join(work_dir, "corpus")
+    mock_process = None
+    try:
+        if not (os.path.isdir(corpus_dir) and os.listdir(corpus_dir)):
+            print(f"Membuat {args.images} gambar {args.megapixels:g} MP ({', '.join(formats)}) di {corpus_dir} ...")
+            started = time.perf_counter()
+            total_bytes = generate_corpus(corpus_dir, args.images, formats, args.megapixels, args.seed)
+            print(f"  selesai dalam {time.perf_counter() - started:.1f} s, total {total_bytes / (1024 * 1024):.1f} MB")
+        else:
+            print(f"Memakai korpus yang sudah ada di {corpus_dir}")
+
+        config = {
+            "latency": args.latency_ms / 1000,
+            "jitter": args.jitter_ms / 1000,
+            "error_rate": args.error_rate,
+            "rate_limit_rate": args.rate_limit_rate,
+            "retry_after": args.retry_after,
+            "tail_rate": args.tail_rate,
+            "malformed_rate": args.malformed_rate,
+            "weak_models": args.weak_model,
+            "weak_rate": args.weak_rate,
+            "tail_latency": args.tail_ms / 1000,
+            "tail_provider": args.provider,
+            "batch_polls": MOCK_BATCH_POLLS,
+            "model": args.model or DEFAULT_MODELS[args.provider],
+            "seed": args.seed,
+        }
+        mock_process, port = start_mock_provider(config)
+        api_base = f"http://127.0.0.1:{port}/v1" if args.provider == "OpenAI" else f"http://127.0.0.1:{port}"
+        exiftool_path = write_fake_exiftool(work_dir, args.exiftool_latency_ms / 1000)
+
+        runs = []
+        for index in range(max(1, args.repeat)):
+            print(f"Run {index + 1}/{max(1, args.repeat)} ...")
+            runs.append(run_engine_once(args, corpus_dir, work_dir, exiftool_path, api_base))
+        mock_stats = fetch_mock_stats(port)
+    finally:
+        if mock_process is not None:
+            mock_process.terminate()
+            mock_process.join(timeout=5)
+
+    try:
+        median_run = sorted(runs, key=lambda run: run["images_per_second"])[len(runs) // 2]
+        report = {
+            "version": REPORT_VERSION,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+            "config": {
+                "images": args.images, "formats": formats, "megapixels": args.megapixels, "seed": args.seed,
+                "provider": args.provider, "keys": args.keys, "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+                "error_rate": args.error_rate, "rate_limit_rate": args.rate_limit_rate, "tail_rate": args.tail_rate, "tail_ms": args.tail_ms, "malformed_rate": args.malformed_rate,
+                "model": args.model, "weak_models": args.weak_model, "weak_rate": args.weak_rate, "auto_model": args.auto_model,
+                "secondary_provider": args.secondary_provider, "hedge_percentile": args.hedge_percentile, "mode": args.mode,
+                "workers": args.workers, "concurrency": args.concurrency, "images_per_request": args.images_per_request, "long_edge": args.long_edge,
+                "upload_format": args.upload_format, "downscale": not args.no_downscale, "output": args.output,
+                "exiftool_latency_ms": args.exiftool_latency_ms,
+            },
+            "images": median_run["succeeded"] + median_run["failed"],
+            "images_per_second": median_run["images_per_second"],
+            "images_per_second_all_runs": [run["images_per_second"] for run in runs],
+            "images_per_second_stdev": round(statistics.stdev([run["images_per_second"] for run in runs]), 3) if len(runs) > 1 else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": median_run["stages"],
+            "routing": median_run["routing"],
+            "estimated_cost_usd": median_run["estimated_cost_usd"],
+            "runs": runs,
+            "mock_server": mock_stats,
+        }
+        print_report(report)
+        if args.report:
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"\nLaporan disimpan ke {args.report}")
+
+        if args.baseline:
+            try:
+                with open(args.baseline, encoding="utf-8") as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error: Baseline tidak bisa dibaca: {e}", file=sys.stderr)
+                return 2
+            if not compare_with_baseline(report, baseline, args.max_regression):
+                return 1
+        return 0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
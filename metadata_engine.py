@@ -0,0 +1,4912 @@
+import importlib.util
+import os
+import posixpath
+import json
+import re
+import base64
+import collections
+import contextlib
+import csv
+import fnmatch
+import functools
+import hashlib
+import io
+import itertools
+import logging.handlers
+import math
+import mmap
+import random
+import select
+import shutil
+import socket
+import sqlite3
+import struct
+import subprocess
+import tempfile
+import threading
+import queue
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+import argparse
+import asyncio
+import sys
+
+# SDK provider (google.generativeai, openai) dan Pillow baru diimpor saat pertama kali dipakai,
+# karena impor SDK memakan waktu beberapa detik dan memperlambat munculnya jendela GUI.
+# Di sini hanya dicek apakah library OpenAI terinstal, tanpa mengimpornya.
+OPENAI_AVAILABLE = importlib.util.find_spec("openai") is not None
+if not OPENAI_AVAILABLE:
+    print("Warning: OpenAI library not found. Install it with 'pip install openai' to enable OpenAI features.")
+
+# Default untuk pemrosesan paralel. Bisa diubah dari UI/CLI sebelum proses dimulai.
+DEFAULT_WORKER_COUNT = 4
+DEFAULT_MAX_IN_FLIGHT_PER_PROVIDER = 4
+MAX_WORKER_COUNT = 32
+# Mode asyncio: satu event loop menjalankan banyak request sekaligus tanpa satu thread per request
+EXECUTION_MODES = ("threads", "asyncio")
+DEFAULT_ASYNC_CONCURRENCY = 64
+MAX_ASYNC_CONCURRENCY = 512
+
+# Ekstensi yang diproses beserta MIME type-nya; filter pencarian file memakai daftar yang sama
+MIME_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".tif": "image/tiff",
+    ".tiff": "image/tiff",
+    ".psd": "image/vnd.adobe.photoshop",
+}
+IMAGE_EXTENSIONS = tuple(MIME_TYPES)
+MANIFEST_PENDING_FLUSH_EVERY = 500 # Status 'pending' ditulis ke manifest per batch, bukan per file
+
+# Level log. Callback log engine menerima (message, level); detail per gambar (respons mentah AI,
+# output exiftool) memakai LOG_DEBUG agar tampilan bisa difilter tanpa kehilangan detail di file log.
+LOG_DEBUG = "debug"
+LOG_INFO = "info"
+LOG_WARNING = "warning"
+LOG_ERROR = "error"
+LOG_LEVELS = (LOG_DEBUG, LOG_INFO, LOG_WARNING, LOG_ERROR)
+LOG_DIR = os.path.join(os.path.expanduser("~"), ".adobe_stock_metadata", "logs")
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 5
+
+
+def log_level_enabled(level, minimum_level):
+    return LOG_LEVELS.index(level) >= LOG_LEVELS.index(minimum_level)
+
+
+class JsonlLogWriter:
+    """Menulis semua log (termasuk debug) ke file JSON Lines yang dirotasi berdasarkan ukuran.
+
+    Setiap baris berisi time, session, level dan message. session membedakan run aplikasi
+    sehingga log satu sesi bisa diambil kembali (mis. untuk tombol Download Log).
+    """
+
+    def __init__(self, path=None, max_bytes=LOG_FILE_MAX_BYTES, backup_count=LOG_FILE_BACKUP_COUNT):
+        self.path = path or os.path.join(LOG_DIR, "metadata_log.jsonl")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.session = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.backup_count = backup_count
+        # RotatingFileHandler sudah menangani lock antar thread dan rotasi file
+        self._handler = logging.handlers.RotatingFileHandler(self.path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+
+    def write(self, message, level=LOG_INFO, timestamp=None):
+        record = {
+            "time": (timestamp or datetime.now()).isoformat(timespec="milliseconds"),
+            "session": self.session,
+            "level": level,
+            "message": message,
+        }
+        self._handler.emit(logging.makeLogRecord({"msg": json.dumps(record, ensure_ascii=False), "levelno": logging.INFO}))
+
+    def iter_records(self, session=None):
+        """Record dari file log (yang lama lebih dulu), hanya untuk session tertentu jika diberikan."""
+        self._handler.flush()
+        paths = [f"{self.path}.{index}" for index in range(self.backup_count, 0, -1)] + [self.path]
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if session is None or record.get("session") == session:
+                        yield record
+
+    def close(self):
+        self._handler.close()
+
+
+# Prompt yang sama dipakai untuk Gemini dan OpenAI (juga bagian dari kunci cache)
+METADATA_PROMPT = "Analyze this image for stock photography metadata. Provide a highly descriptive title (max 200 characters), a comprehensive description (max 200 characters), and exactly 49 relevant, comma-separated keywords (focus on specific nouns, action verbs, vivid adjectives, and relevant concepts). Format the output as a JSON object with keys: 'title', 'description', 'keywords'."
+
+
+def build_openai_messages(data_url):
+    """Pesan chat OpenAI (prompt + gambar base64 sebagai data URL); dipakai mode interaktif dan batch."""
+    # OpenAI Vision API requires data URL format
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": METADATA_PROMPT},
+                {"type": "image_url", "image_url": {"url": data_url}},
+            ],
+        }
+    ]
+
+
+def parse_metadata_response(response_text):
+    """Mengubah teks respons AI menjadi dict metadata (atau list untuk respons multi-gambar) secara toleran.
+
+    Markdown fence dan teks di luar JSON diabaikan, koma berlebih sebelum } atau ] dibuang, dan JSON yang
+    terpotong (output habis di tengah jalan) ditutup. Melempar json.JSONDecodeError jika tetap tidak terbaca.
+    """
+    response_text = response_text.strip()
+    # Membersihkan markdown JSON jika ada
+    fence = re.match(r"^```[A-Za-z]*\s*(.*?)\s*(?:```)?$", response_text, re.DOTALL)
+    if fence:
+        response_text = fence.group(1)
+    start = min((index for index in (response_text.find("{"), response_text.find("[")) if index >= 0), default=-1)
+    if start < 0:
+        return json.loads(response_text)
+    try:
+        return json.JSONDecoder().raw_decode(response_text, start)[0]
+    except json.JSONDecodeError as error:
+        for candidate in _repair_json_candidates(response_text[start:]):
+            try:
+                return json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
+        raise error
+
+
+def _repair_json_candidates(text):
+    """Membaca JSON karakter demi karakter lalu menghasilkan versi yang diperbaiki: koma berlebih dibuang dan
+    string/kurung yang belum ditutup ditutup; kandidat kedua memotong ke elemen lengkap terakhir."""
+    output, closers = [], []
+    in_string = escaped = False
+    last_complete = None # (panjang output, closers) sebelum koma terakhir di luar string
+    for char in text:
+        if in_string:
+            output.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char in "}]":
+            while output and output[-1] in " \t\r\n,":
+                output.pop()
+            if not closers or closers[-1] != char:
+                break # Kurung tidak seimbang: berhenti, sisanya dianggap sampah
+            closers.pop()
+            output.append(char)
+            if not closers:
+                break # Objek utama selesai
+            continue
+        if char == ",":
+            last_complete = (len(output), list(closers))
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            closers.append("}")
+        elif char == "[":
+            closers.append("]")
+        output.append(char)
+
+    text = "".join(output)
+    if in_string:
+        text += '"'
+    text = text.rstrip(" \t\r\n,")
+    if text.endswith(":"):
+        text += " null"
+    yield text + "".join(reversed(closers))
+    if last_complete is not None:
+        length, complete_closers = last_complete
+        yield "".join(output[:length]) + "".join(reversed(complete_closers))
+
+
+# Aturan Adobe Stock yang diminta di prompt; dicek setelah parsing agar jawaban yang melanggar diperbaiki
+REQUIRED_KEYWORD_COUNT = 49
+MAX_TITLE_LENGTH = 200
+MAX_DESCRIPTION_LENGTH = 200
+REPAIR_ESTIMATED_TOKENS = 800 # Putaran perbaikan hanya berisi teks jawaban sebelumnya
+MAX_REPAIR_ANSWER_CHARS = 8000
+
+
+def split_keywords(keywords):
+    if isinstance(keywords, list):
+        return [str(keyword).strip() for keyword in keywords if str(keyword).strip()]
+    return [keyword.strip() for keyword in str(keywords or "").split(",") if keyword.strip()]
+
+
+def validate_metadata(metadata):
+    """Mengembalikan daftar masalah metadata (kosong jika valid). Teksnya berbahasa Inggris karena
+    dikirim ke model pada putaran perbaikan."""
+    if not isinstance(metadata, dict):
+        return ["the answer must be a single JSON object with keys 'title', 'description', 'keywords'"]
+    problems = []
+    for field, max_length in (("title", MAX_TITLE_LENGTH), ("description", MAX_DESCRIPTION_LENGTH)):
+        value = metadata.get(field)
+        if not isinstance(value, str) or not value.strip():
+            problems.append(f"'{field}' is missing or empty")
+        elif len(value) > max_length:
+            problems.append(f"'{field}' has {len(value)} characters, the maximum is {max_length}")
+    keywords = split_keywords(metadata.get("keywords"))
+    if len(keywords) != REQUIRED_KEYWORD_COUNT:
+        problems.append(f"'keywords' has {len(keywords)} keywords, exactly {REQUIRED_KEYWORD_COUNT} are required")
+    duplicates = len(keywords) - len({keyword.lower() for keyword in keywords})
+    if duplicates:
+        problems.append(f"'keywords' contains {duplicates} duplicate keyword(s)")
+    return problems
+
+
+def build_repair_prompt(previous_answer, problems, image_count=None):
+    """Prompt teks saja untuk memperbaiki jawaban sebelumnya tanpa mengirim ulang gambar."""
+    if image_count:
+        expected = (
+            f"a JSON object with key 'images' holding an array of exactly {image_count} objects, each with keys "
+            "'index', 'title', 'description', 'keywords'"
+        )
+    else:
+        expected = "a JSON object with keys 'title', 'description', 'keywords'"
+    return (
+        "Your previous answer with stock photography metadata has these problems:\n- "
+        + "\n- ".join(problems)
+        + f"\n\nPrevious answer:\n{previous_answer[:MAX_REPAIR_ANSWER_CHARS]}\n\n"
+        f"Fix only these problems and keep describing the same image content. Titles and descriptions have at most "
+        f"{MAX_TITLE_LENGTH} characters; keywords are exactly {REQUIRED_KEYWORD_COUNT} unique, comma-separated keywords. "
+        f"Reply with {expected} and nothing else."
+    )
+
+
+# Structured output Gemini: jawaban dipaksa berupa JSON sesuai skema (OpenAI memakai response_format json_object)
+GEMINI_METADATA_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING"},
+        "description": {"type": "STRING"},
+        "keywords": {"type": "STRING"},
+    },
+    "required": ["title", "description", "keywords"],
+}
+GEMINI_MULTI_METADATA_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "images": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {"index": {"type": "INTEGER"}, **GEMINI_METADATA_SCHEMA["properties"]},
+                "required": ["index", "title", "description", "keywords"],
+            },
+        },
+    },
+    "required": ["images"],
+}
+
+
+def gemini_generation_config(image_count=None):
+    """generation_config Gemini untuk satu gambar, atau untuk request multi-gambar jika image_count diisi."""
+    return {
+        "response_mime_type": "application/json",
+        "response_schema": GEMINI_MULTI_METADATA_SCHEMA if image_count else GEMINI_METADATA_SCHEMA,
+    }
+
+
+# Request multi-gambar: beberapa gambar (sudah diperkecil) dikirim dalam satu panggilan API sehingga
+# prompt instruksi dan satu slot RPM dibagi ke semua gambar. Hasil dicocokkan ke file lewat 'index'.
+MAX_IMAGES_PER_REQUEST = 10
+METADATA_FIELDS = ("title", "description", "keywords")
+
+
+def build_multi_image_prompt(count):
+    return (
+        f"Analyze each of the {count} images above for stock photography metadata; every image is preceded by its label 'Image N'. "
+        "For each image provide a highly descriptive title (max 200 characters), a comprehensive description (max 200 characters), "
+        "and exactly 49 relevant, comma-separated keywords (focus on specific nouns, action verbs, vivid adjectives, and relevant concepts). "
+        f"Format the output as a JSON object with key 'images' holding an array of exactly {count} objects in image order, "
+        "each with keys: 'index' (the image number N), 'title', 'description', 'keywords'."
+    )
+
+
+def build_openai_multi_messages(data_urls):
+    """Pesan chat OpenAI untuk beberapa gambar; data_urls sesuai urutan 'Image N'."""
+    content = []
+    for number, data_url in enumerate(data_urls, start=1):
+        content.append({"type": "text", "text": f"Image {number}:"})
+        content.append({"type": "image_url", "image_url": {"url": data_url}})
+    content.append({"type": "text", "text": build_multi_image_prompt(len(data_urls))})
+    return [{"role": "user", "content": content}]
+
+
+def match_multi_image_response(response_text, count):
+    """Mencocokkan respons multi-gambar ke urutan gambar.
+
+    Menerima {"images": [...]} maupun array langsung. Mengembalikan list sepanjang count berisi dict metadata,
+    atau None untuk gambar yang hasilnya tidak ada/tidak lengkap (akan dikirim ulang satu per satu).
+    """
+    try:
+        data = parse_metadata_response(response_text)
+    except json.JSONDecodeError:
+        return [None] * count
+    if isinstance(data, dict):
+        data = data.get("images")
+    if not isinstance(data, list):
+        return [None] * count
+
+    matched = [None] * count
+    for position, item in enumerate(data):
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.get("index", position + 1)) - 1
+        except (TypeError, ValueError):
+            continue
+        if not 0 <= index < count or matched[index] is not None:
+            continue
+        if all(isinstance(item.get(field), (str, list)) and item.get(field) for field in METADATA_FIELDS):
+            metadata = {field: item[field] for field in METADATA_FIELDS}
+            if isinstance(metadata["keywords"], list):
+                metadata["keywords"] = ", ".join(str(keyword) for keyword in metadata["keywords"])
+            matched[index] = metadata
+    return matched
+
+
+# Pra-pemrosesan gambar sebelum upload: model vision hanya melihat ~1-2 megapiksel,
+# jadi file asli (PSD/TIFF besar) diperkecil dan di-encode ulang sebelum dikirim.
+DEFAULT_UPLOAD_LONG_EDGE = 1568
+DEFAULT_UPLOAD_FORMAT = "JPEG"
+UPLOAD_FORMATS = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+UPLOAD_QUALITY = 85
+
+
+def _to_8bit_grayscale(img):
+    """Gambar mode I;16*/I/F ke mode L, diskalakan sesuai rentang nilainya.
+
+    16-bit dibagi 256. Mode I yang nilainya di 0..255 atau 0..65535 dianggap 8/16-bit; selain itu (32-bit penuh,
+    nilai negatif) diskalakan dari rentang nilai gambar: 0..maks, atau min..maks jika ada nilai negatif.
+    Float 0..1 dikali 255; float di luar itu diskalakan dengan cara yang sama.
+    """
+    if img.mode.startswith("I;16"):
+        return img.convert("I").point(lambda value: value * (1 / 256)).convert("L")
+    if img.mode == "I":
+        low, high = img.getextrema()
+        if low >= 0 and high <= 255:
+            return img.convert("L")
+        if low >= 0 and high <= 65535:
+            return img.point(lambda value: value * (1 / 256)).convert("L")
+    else:
+        img = img.convert("F")
+        low, high = img.getextrema()
+        if low >= 0 and high <= 1:
+            return img.point(lambda value: value * 255).convert("L")
+    low = min(low, 0)
+    scale = 255 / (high - low) if high > low else 0
+    return img.point(lambda value: value * scale - low * scale).convert("L")
+
+
+def prepare_upload_image(image_path, max_long_edge=DEFAULT_UPLOAD_LONG_EDGE, output_format=DEFAULT_UPLOAD_FORMAT, quality=UPLOAD_QUALITY):
+    """Membuka gambar dengan Pillow, memperkecil sisi terpanjang ke max_long_edge lalu meng-encode ulang.
+
+    JPEG memakai draft() agar decoder langsung membaca pada skala yang lebih kecil; PSD/TIFF
+    memakai gambar komposit/halaman pertama tanpa membaca layer. Mengembalikan (bytes, mime_type).
+    """
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        # PSD dibuka pada gambar komposit dan TIFF multi-halaman pada halaman pertama,
+        # jadi layer/halaman lain tidak pernah dibaca selama tidak di-seek.
+        if img.format == "JPEG":
+            img.draft("RGB", (max_long_edge, max_long_edge))
+
+        if img.mode.startswith("I") or img.mode == "F":
+            # TIFF/PNG 16-bit, 32-bit integer atau float: turunkan ke 8-bit sebelum konversi ke RGB
+            img = _to_8bit_grayscale(img)
+        if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+
+        img.thumbnail((max_long_edge, max_long_edge), Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        img.save(buffer, format=output_format, quality=quality)
+        return buffer.getvalue(), UPLOAD_FORMATS[output_format]
+
+
+# Batas memori upload: payload dibuat sekali per gambar dan dipakai ulang di setiap percobaan.
+# File asli (tanpa downscale) dibaca lewat mmap sehingga isinya tidak disalin ke heap Python,
+# dan base64 di-encode langsung ke buffer berukuran pas tanpa salinan string perantara.
+DEFAULT_UPLOAD_MEMORY_BUDGET_MB = 1024 # Per run, untuk semua gambar yang sedang diproses; 0 = tanpa batas
+MMAP_MIN_BYTES = 1024 * 1024 # File lebih kecil dibaca biasa
+BASE64_CHUNK_BYTES = 3 * 256 * 1024 # Kelipatan 3 agar potongan base64 bisa langsung disambung
+REQUEST_SERIALIZATION_COPIES = 2 # SDK membuat body JSON (str lalu bytes) yang memuat base64 gambar
+
+
+def base64_length(byte_count):
+    return 4 * ((byte_count + 2) // 3)
+
+
+def estimate_upload_memory(image_path, upload_options):
+    """Perkiraan memori puncak (byte) untuk menyiapkan satu gambar, dipakai untuk reservasi MemoryBudget.
+
+    Dengan downscale, yang dominan adalah gambar hasil decode Pillow (JPEG memakai draft() sehingga
+    jauh lebih kecil); tanpa downscale, isi file (bytes, atau salinan mmap untuk Gemini), base64-nya
+    plus salinan body request di SDK.
+    """
+    from PIL import Image
+
+    file_size = os.path.getsize(image_path)
+    if not upload_options.get("enabled"):
+        return file_size + base64_length(file_size) * (1 + REQUEST_SERIALIZATION_COPIES)
+    max_long_edge = upload_options["max_long_edge"]
+    try:
+        with Image.open(image_path) as img: # Hanya membaca header
+            width, height = img.size
+            bands = max(3, len(img.getbands()))
+            if img.format == "JPEG":
+                scale = 1
+                while scale < 8 and width // (scale * 2) >= max_long_edge and height // (scale * 2) >= max_long_edge:
+                    scale *= 2
+                width, height = width // scale, height // scale
+    except Exception:
+        return file_size + base64_length(file_size)
+    # Gambar hasil decode plus salinan konversi mode (RGB/8-bit) sebelum thumbnail
+    return width * height * bands * 2
+
+
+class UploadPayload:
+    """Isi satu gambar yang siap diupload, dibuat sekali dan dipakai ulang di setiap percobaan.
+
+    data berupa bytes (hasil downscale) atau mmap file asli. Gemini menerima bytes mentah tanpa base64
+    (mmap disalin sekali ke bytes); data URL untuk OpenAI di-encode sekali. Keduanya disimpan untuk
+    percobaan berikutnya. close() wajib dipanggil (melepas mmap, terutama sebelum exiftool menulis
+    ke file yang sama di Windows).
+    """
+
+    def __init__(self, data, mime_type):
+        self.mime_type = mime_type
+        self._data = data
+        self._data_url = None
+        self._gemini_data = None
+
+    @classmethod
+    def from_file(cls, image_path, mime_type):
+        with open(image_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < MMAP_MIN_BYTES:
+                return cls(f.read(), mime_type)
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), mime_type)
+
+    @property
+    def size(self):
+        return len(self._data)
+
+    @property
+    def encoded_size(self):
+        return base64_length(len(self._data))
+
+    def memory_size(self, for_gemini=False):
+        """Perkiraan byte heap (bukan halaman file mmap) selama request berjalan: data payload, base64-nya,
+        dan salinan body request yang dibuat SDK. for_gemini: salinan bytes dari mmap untuk Gemini ikut dihitung."""
+        heap_size = len(self._data) if for_gemini or not isinstance(self._data, mmap.mmap) else 0
+        return heap_size + self.encoded_size * (1 + REQUEST_SERIALIZATION_COPIES)
+
+    def gemini_blob(self):
+        if self._gemini_data is None:
+            self._gemini_data = self._data if isinstance(self._data, bytes) else bytes(self._data)
+        return {"mime_type": self.mime_type, "data": self._gemini_data}
+
+    def base64_text(self, prefix=""):
+        """Base64 isi payload (diawali prefix) sebagai str, di-encode per potongan ke satu buffer."""
+        prefix = prefix.encode("ascii")
+        buffer = bytearray(len(prefix) + self.encoded_size)
+        buffer[:len(prefix)] = prefix
+        position = len(prefix)
+        with memoryview(self._data) as view:
+            for start in range(0, len(view), BASE64_CHUNK_BYTES):
+                chunk = base64.b64encode(view[start:start + BASE64_CHUNK_BYTES])
+                buffer[position:position + len(chunk)] = chunk
+                position += len(chunk)
+        return buffer.decode("ascii")
+
+    def data_url(self):
+        if self._data_url is None:
+            self._data_url = self.base64_text(f"data:{self.mime_type};base64,")
+        return self._data_url
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = b""
+        self._data_url = None
+        self._gemini_data = None
+
+
+# Deteksi near-duplicate (frame burst yang hampir sama): pHash 64-bit dari DCT gambar 32x32 grayscale.
+# Dua gambar dianggap duplikat jika jarak Hamming hash-nya <= threshold bit. NumPy opsional; tanpa
+# NumPy indeks jarak dihitung dengan Python biasa (cukup untuk folder kecil, lambat untuk puluhan ribu file).
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+DEFAULT_DUPLICATE_THRESHOLD = 6
+MAX_DUPLICATE_THRESHOLD = 20
+PHASH_IMAGE_SIZE = 32
+PHASH_LOW_FREQUENCIES = 8
+DUPLICATE_KEEP_LEADING_KEYWORDS = 10 # Variasi keyword tidak mengubah urutan 10 keyword pertama (paling berbobot di Adobe Stock)
+_PHASH_DCT_ROWS = [
+    [math.cos(math.pi * (2 * x + 1) * u / (2 * PHASH_IMAGE_SIZE)) for x in range(PHASH_IMAGE_SIZE)]
+    for u in range(PHASH_LOW_FREQUENCIES)
+]
+
+
+def perceptual_hash(image_path):
+    """pHash 64-bit (int) satu gambar: koefisien DCT frekuensi rendah dibandingkan dengan mediannya."""
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        if img.format == "JPEG":
+            img.draft("L", (PHASH_IMAGE_SIZE * 2, PHASH_IMAGE_SIZE * 2))
+        pixels = list(img.convert("L").resize((PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE), Image.BOX).getdata())
+
+    rows = [pixels[y * PHASH_IMAGE_SIZE:(y + 1) * PHASH_IMAGE_SIZE] for y in range(PHASH_IMAGE_SIZE)]
+    # DCT-II terpisah: baris dulu, lalu kolom, hanya untuk 8 frekuensi terendah
+    partial = [[sum(c * p for c, p in zip(basis, row)) for basis in _PHASH_DCT_ROWS] for row in rows]
+    coefficients = [
+        sum(basis[y] * partial[y][u] for y in range(PHASH_IMAGE_SIZE))
+        for basis in _PHASH_DCT_ROWS
+        for u in range(PHASH_LOW_FREQUENCIES)
+    ]
+    ac_coefficients = sorted(coefficients[1:]) # Koefisien DC tidak ikut menentukan median
+    median = ac_coefficients[len(ac_coefficients) // 2]
+    value = 0
+    for coefficient in coefficients:
+        value = (value << 1) | (coefficient > median)
+    return value
+
+
+def cluster_near_duplicates(hashes, threshold=DEFAULT_DUPLICATE_THRESHOLD):
+    """Mengelompokkan hash yang jarak Hamming-nya <= threshold.
+
+    Greedy sesuai urutan input: gambar pertama yang belum masuk cluster menjadi representatif dan
+    menarik semua gambar lain yang dekat dengannya. Hash None (gagal dibaca) selalu jadi cluster sendiri.
+    Mengembalikan list cluster berupa list indeks, representatif di posisi pertama.
+    """
+    candidates = [index for index, value in enumerate(hashes) if value is not None]
+    assigned = set()
+    if NUMPY_AVAILABLE and len(candidates) > 1:
+        import numpy as np
+
+        values = np.array([hashes[index] for index in candidates], dtype=np.uint64)
+        indices = np.array(candidates)
+        remaining = np.ones(len(candidates), dtype=bool)
+        distance_of = getattr(np, "bitwise_count", None)
+        members_of = {}
+        for position in range(len(candidates)):
+            if not remaining[position]:
+                continue
+            xor = np.bitwise_xor(values, values[position])
+            if distance_of is not None:
+                distances = distance_of(xor)
+            else: # NumPy < 2.0: hitung bit lewat unpackbits
+                distances = np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+            matches = np.flatnonzero(remaining & (distances <= threshold))
+            remaining[matches] = False
+            members_of[candidates[position]] = indices[matches].tolist()
+    else:
+        members_of = {}
+        for leader in candidates:
+            if leader in assigned:
+                continue
+            members = [index for index in candidates if index not in assigned and bin(hashes[leader] ^ hashes[index]).count("1") <= threshold]
+            assigned.update(members)
+            members_of[leader] = members
+
+    clusters = []
+    for index, value in enumerate(hashes):
+        if value is None:
+            clusters.append([index])
+        elif index in members_of:
+            clusters.append([index] + [member for member in members_of[index] if member != index])
+    return clusters
+
+
+def vary_keywords(keywords, seed_text):
+    """Variasi ringan untuk duplikat: urutan keyword setelah 10 pertama diacak (deterministik per file)."""
+    items = [keyword.strip() for keyword in str(keywords).split(",") if keyword.strip()]
+    leading, rest = items[:DUPLICATE_KEEP_LEADING_KEYWORDS], items[DUPLICATE_KEEP_LEADING_KEYWORDS:]
+    random.Random(seed_text).shuffle(rest)
+    return ", ".join(leading + rest)
+
+
+# Cache hasil AI di disk, dikunci dengan hash isi gambar + provider + model + prompt
+RESULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".adobe_stock_metadata", "metadata_cache.sqlite3")
+RESULT_CACHE_MAX_ENTRIES = 200000
+RESULT_CACHE_MAX_AGE_DAYS = 180
+RESULT_CACHE_EVICT_EVERY = 500 # Eviction dijalankan setiap N penyimpanan
+RESULT_CACHE_BUSY_TIMEOUT_SECONDS = 30 # Cache dipakai bersama banyak thread dan (dengan --queue) banyak proses
+
+
+class MetadataCache:
+    """Cache SQLite untuk respons metadata AI yang sudah di-parse.
+
+    Kunci adalah SHA-256 dari isi file ditambah provider, nama model dan teks prompt, sehingga
+    file yang disalin ke lokasi lain tetap kena cache. Entri lebih tua dari max_age_days dihapus,
+    dan jika jumlah entri melebihi max_entries, entri yang paling lama tidak dipakai dibuang.
+    """
+
+    def __init__(self, path=RESULT_CACHE_PATH, max_entries=RESULT_CACHE_MAX_ENTRIES, max_age_days=RESULT_CACHE_MAX_AGE_DAYS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=RESULT_CACHE_BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        self._conn.execute(f"PRAGMA busy_timeout={RESULT_CACHE_BUSY_TIMEOUT_SECONDS * 1000}")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                cache_key TEXT PRIMARY KEY,
+                metadata TEXT NOT NULL,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                total_tokens INTEGER,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_used ON results (last_used)")
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def hash_file(image_path, chunk_size=1024 * 1024):
+        digest = hashlib.sha256()
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(content_hash, provider, model_name, prompt):
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return f"{content_hash}:{provider}:{model_name}:{prompt_hash}"
+
+    @staticmethod
+    def rekey(cache_key, provider, model_name):
+        """Kunci untuk isi file dan prompt yang sama, tetapi provider/model lain (nama model boleh mengandung ':')."""
+        content_hash, prompt_hash = cache_key.split(":", 1)[0], cache_key.rsplit(":", 1)[1]
+        return f"{content_hash}:{provider}:{model_name}:{prompt_hash}"
+
+    def get(self, cache_key):
+        """Mengembalikan dict metadata (title/description/keywords + token) atau None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT metadata, prompt_tokens, completion_tokens, total_tokens FROM results WHERE cache_key = ?",
+                (cache_key,),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE results SET last_used = ? WHERE cache_key = ?", (time.time(), cache_key))
+            self._conn.commit()
+        metadata = json.loads(row[0])
+        metadata["usage"] = {"prompt_tokens": row[1], "completion_tokens": row[2], "total_tokens": row[3]}
+        return metadata
+
+    def put(self, cache_key, metadata, prompt_tokens=0, completion_tokens=0, total_tokens=0):
+        stored = {key: metadata.get(key) for key in ("title", "description", "keywords")}
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (cache_key, json.dumps(stored, ensure_ascii=False), prompt_tokens, completion_tokens, total_tokens, now, now),
+            )
+            self._conn.commit()
+            self._puts_since_evict += 1
+            should_evict = self._puts_since_evict >= RESULT_CACHE_EVICT_EVERY
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        with self._lock:
+            self._puts_since_evict = 0
+            cutoff = time.time() - self.max_age_days * 86400
+            self._conn.execute("DELETE FROM results WHERE created_at < ?", (cutoff,))
+            self._conn.execute(
+                "DELETE FROM results WHERE cache_key IN (SELECT cache_key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _matches_patterns(name, relative_path, include_patterns, exclude_patterns):
+    if include_patterns and not any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern) for pattern in include_patterns):
+        return False
+    if exclude_patterns and any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern) for pattern in exclude_patterns):
+        return False
+    return True
+
+
+def iter_image_files(folder, include_patterns=None, exclude_patterns=None, min_size=None, max_size=None):
+    """Generator path gambar di folder (rekursif) memakai os.scandir.
+
+    Path dikirim segera saat ditemukan, dalam urutan scandir (tidak diurutkan), sehingga pemrosesan bisa
+    dimulai sebelum seluruh folder selesai ditelusuri dan memori tetap konstan berapa pun jumlah file,
+    juga untuk satu folder datar yang sangat besar; yang disimpan hanya daftar subfolder. Manifest job
+    dan resume tidak bergantung pada urutan. Pola include/exclude adalah glob (fnmatch) yang dicocokkan
+    ke nama file maupun path relatif terhadap folder (dengan '/'); ukuran dalam byte.
+    """
+    pending_dirs = [folder]
+    while pending_dirs:
+        current_dir = pending_dirs.pop()
+        subdirs = []
+        try:
+            with os.scandir(current_dir) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                            continue
+                        if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                            continue
+                        relative_path = os.path.relpath(entry.path, folder).replace(os.sep, "/")
+                        if not _matches_patterns(entry.name, relative_path, include_patterns, exclude_patterns):
+                            continue
+                        if min_size is not None or max_size is not None:
+                            size = entry.stat().st_size
+                            if (min_size is not None and size < min_size) or (max_size is not None and size > max_size):
+                                continue
+                    except OSError:
+                        continue
+                    yield entry.path
+        except OSError:
+            pass # Folder tidak bisa dibaca (izin, share terputus); lanjutkan folder lain
+        # Subfolder diurutkan (hanya nama folder, bukan file) lalu dibalik untuk stack LIFO
+        pending_dirs.extend(sorted(subdirs, reverse=True))
+
+
+# Mode watch-folder: file baru di folder ingest diproses segera tanpa menelusuri ulang seluruh folder
+WATCH_STABLE_SECONDS = 2.0 # File baru diproses setelah size dan mtime-nya tidak berubah selama ini
+WATCH_POLL_INTERVAL_SECONDS = 2.0 # Fallback polling: jeda pemeriksaan mtime folder
+WATCH_RESCAN_SECONDS = 60.0 # Dengan inotify: pemeriksaan mtime folder berkala sebagai jaring pengaman (event hilang/overflow)
+WATCH_RECENT_LIMIT = 10000 # Jumlah file terakhir yang diingat agar event ganda tidak memproses file yang sama dua kali
+_INOTIFY_EVENT = struct.Struct("iIII") # wd, mask, cookie, len; diikuti nama sepanjang len byte
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+
+
+class _Inotify:
+    """Pembungkus minimal inotify Linux lewat ctypes (tanpa dependensi tambahan)."""
+
+    MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._get_errno = ctypes.get_errno
+        self._inotify_add_watch = libc.inotify_add_watch
+        self._inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = self._get_errno()
+            raise OSError(error, os.strerror(error))
+        self.folders = {} # watch descriptor -> folder
+
+    def add_watch(self, folder):
+        wd = self._inotify_add_watch(self.fd, os.fsencode(folder), self.MASK)
+        if wd < 0:
+            error = self._get_errno()
+            raise OSError(error, os.strerror(error), folder)
+        self.folders[wd] = folder
+
+    def read_events(self, timeout):
+        """Event yang tersedia dalam timeout detik, sebagai list (folder, nama, mask); folder None = overflow."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            wd, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\x00"))
+            offset += length
+            if mask & _IN_IGNORED: # Folder dihapus/dipindah, watch-nya dilepas kernel
+                self.folders.pop(wd, None)
+            elif mask & _IN_Q_OVERFLOW:
+                events.append((None, "", mask))
+            elif wd in self.folders:
+                events.append((self.folders[wd], name, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """Memantau folder (rekursif) dan menghasilkan path gambar baru atau berubah setelah penulisannya selesai.
+
+    Di Linux memakai inotify sehingga biaya per file baru tidak bergantung pada ukuran folder. Di sistem
+    lain, atau jika inotify gagal (mis. batas fs.inotify.max_user_watches), dipakai polling yang hanya
+    membaca ulang folder yang mtime-nya berubah. inotify tidak melihat file yang ditulis mesin lain ke
+    share jaringan; untuk itu paksa polling (use_inotify=False).
+
+    File kandidat baru diteruskan setelah size dan mtime-nya stabil selama stable_seconds, jadi salinan
+    yang masih berjalan tidak ikut diproses.
+    """
+
+    def __init__(self, folder, stop_event, include_patterns=None, exclude_patterns=None, min_size=None, max_size=None,
+                 stable_seconds=WATCH_STABLE_SECONDS, poll_interval=WATCH_POLL_INTERVAL_SECONDS, use_inotify=None, log=None):
+        self.folder = os.path.abspath(folder)
+        self.stop_event = stop_event
+        self.include_patterns = include_patterns
+        self.exclude_patterns = exclude_patterns
+        self.min_size = min_size
+        self.max_size = max_size
+        self.stable_seconds = max(0.0, stable_seconds)
+        self.poll_interval = max(0.2, poll_interval)
+        self.use_inotify = sys.platform.startswith("linux") if use_inotify is None else use_inotify
+        self._log = log or (lambda message, level=LOG_INFO: None)
+        self._inotify = None
+        self._dir_mtimes = {} # folder -> mtime saat terakhir dibaca
+        self._known = {} # folder -> {nama: (size, mtime)} gambar yang sudah terlihat
+        self._candidates = {} # path -> ((size, mtime), waktu monotonic sejak signature itu terlihat)
+        self._recent = collections.OrderedDict() # path -> signature yang sudah diteruskan
+
+    def iter_paths(self, include_existing=True):
+        """Generator sampai stop_event di-set. Gambar yang sudah ada diteruskan lebih dulu (include_existing),
+        lalu file baru begitu stabil."""
+        if self.use_inotify:
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError) as e: # AttributeError: libc tanpa fungsi inotify
+                self._log(f"inotify tidak tersedia ({e}); memakai polling.", LOG_WARNING)
+        try:
+            # Watch dipasang sambil menelusuri folder, jadi file yang datang selama penelusuran tidak terlewat
+            for image_path in self._add_tree(self.folder, new_files=False):
+                if include_existing:
+                    yield image_path
+            if self._inotify is not None:
+                self._log(f"Memantau {self.folder} dengan inotify ({len(self._inotify.folders)} folder).")
+            else:
+                self._log(f"Memantau {self.folder} dengan polling setiap {self.poll_interval:g} detik ({len(self._dir_mtimes)} folder).")
+
+            last_rescan = time.monotonic()
+            rescan_interval = WATCH_RESCAN_SECONDS if self._inotify is not None else self.poll_interval
+            while not self.stop_event.is_set():
+                timeout = min(0.5, self.stable_seconds) if self._candidates else 1.0
+                if self._inotify is not None:
+                    for folder, name, mask in self._inotify.read_events(timeout):
+                        self._handle_event(folder, name, mask)
+                else:
+                    self.stop_event.wait(min(timeout, self.poll_interval))
+                if time.monotonic() - last_rescan >= rescan_interval:
+                    self._rescan()
+                    last_rescan = time.monotonic()
+                yield from self._stable_candidates()
+        finally:
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+
+    def _add_tree(self, root, new_files):
+        """Memasang watch dan mencatat isi root beserta subfoldernya. Gambar yang sudah stabil di-yield
+        (kecuali new_files: semuanya menjadi kandidat yang ditunggu stabil)."""
+        pending_dirs = [root]
+        while pending_dirs and not self.stop_event.is_set():
+            current_dir = pending_dirs.pop()
+            if self._inotify is not None:
+                try:
+                    self._inotify.add_watch(current_dir)
+                except OSError as e:
+                    self._log(f"inotify tidak bisa memantau {current_dir} ({e}); memakai polling.", LOG_WARNING)
+                    self._inotify.close()
+                    self._inotify = None
+            subdirs, ready = self._scan_dir(current_dir, new_files)
+            yield from ready
+            pending_dirs.extend(reversed(subdirs))
+
+    def _scan_dir(self, folder, new_files):
+        """Membaca satu folder: mengembalikan (subfolder baru, gambar siap). File baru/berubah menjadi kandidat."""
+        try:
+            mtime = os.stat(folder).st_mtime
+            with os.scandir(folder) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError:
+            self._forget_dir(folder)
+            return [], []
+        self._dir_mtimes[folder] = mtime
+        known = self._known.get(folder, {})
+        current = {}
+        subdirs, ready = [], []
+        now = time.time()
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path not in self._dir_mtimes:
+                        subdirs.append(entry.path)
+                    continue
+                if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            signature = (stat.st_size, stat.st_mtime)
+            current[entry.name] = signature
+            if known.get(entry.name) == signature:
+                continue
+            if new_files or folder in self._known or now - stat.st_mtime < self.stable_seconds:
+                self._add_candidate(entry.path, signature)
+            elif self._accepts(entry.path, stat.st_size):
+                self._remember(entry.path, signature)
+                ready.append(entry.path)
+        self._known[folder] = current
+        return subdirs, ready
+
+    def _forget_dir(self, folder):
+        prefix = folder + os.sep
+        for path in [path for path in self._dir_mtimes if path == folder or path.startswith(prefix)]:
+            self._dir_mtimes.pop(path, None)
+            self._known.pop(path, None)
+
+    def _handle_event(self, folder, name, mask):
+        if folder is None: # Antrean event kernel penuh: baca ulang folder yang berubah
+            self._rescan()
+            return
+        path = os.path.join(folder, name)
+        if mask & _IN_ISDIR:
+            if mask & (_IN_CREATE | _IN_MOVED_TO) and path not in self._dir_mtimes:
+                # File yang disalin sebelum watch folder baru terpasang tetap ditemukan lewat penelusuran ini
+                for _ in self._add_tree(path, new_files=True):
+                    pass
+            return
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return
+            self._add_candidate(path, (stat.st_size, stat.st_mtime))
+
+    def _rescan(self):
+        """Membaca ulang hanya folder yang mtime-nya berubah (biaya sebanding jumlah folder, bukan file)."""
+        for folder, mtime in list(self._dir_mtimes.items()):
+            try:
+                changed = os.stat(folder).st_mtime != mtime
+            except OSError:
+                self._forget_dir(folder)
+                continue
+            if changed:
+                subdirs, _ = self._scan_dir(folder, new_files=True)
+                for subdir in subdirs:
+                    for _ in self._add_tree(subdir, new_files=True):
+                        pass
+
+    def _add_candidate(self, path, signature):
+        if self._recent.get(path) != signature:
+            self._candidates[path] = (signature, time.monotonic())
+
+    def _stable_candidates(self):
+        now = time.monotonic()
+        for path, (signature, since) in list(self._candidates.items()):
+            try:
+                stat = os.stat(path)
+            except OSError: # Dihapus atau diganti nama sebelum selesai (mis. file sementara)
+                del self._candidates[path]
+                continue
+            current = (stat.st_size, stat.st_mtime)
+            if current != signature:
+                self._candidates[path] = (current, now)
+                continue
+            if now - since < self.stable_seconds:
+                continue
+            del self._candidates[path]
+            self._known.setdefault(os.path.dirname(path), {})[os.path.basename(path)] = current
+            if self._recent.get(path) != current and self._accepts(path, stat.st_size):
+                self._remember(path, current)
+                yield path
+
+    def _accepts(self, path, size):
+        relative_path = os.path.relpath(path, self.folder).replace(os.sep, "/")
+        if not _matches_patterns(os.path.basename(path), relative_path, self.include_patterns, self.exclude_patterns):
+            return False
+        return not ((self.min_size is not None and size < self.min_size) or (self.max_size is not None and size > self.max_size))
+
+    def _remember(self, path, signature):
+        self._recent[path] = signature
+        self._recent.move_to_end(path)
+        while len(self._recent) > WATCH_RECENT_LIMIT:
+            self._recent.popitem(last=False)
+
+
+# Manifest job per folder agar proses yang dihentikan/crash bisa dilanjutkan
+JOB_MANIFEST_DIR = os.path.join(os.path.expanduser("~"), ".adobe_stock_metadata", "jobs")
+
+
+def folder_state_path(folder, state_dir, suffix=".sqlite3"):
+    """Path file status per folder (manifest, job batch) di state_dir, dinamai dengan hash path folder."""
+    folder_hash = hashlib.sha256(os.path.normcase(os.path.abspath(folder)).encode("utf-8")).hexdigest()[:16]
+    os.makedirs(state_dir, exist_ok=True)
+    return os.path.join(state_dir, f"{folder_hash}{suffix}")
+
+
+class JobManifest:
+    """Mencatat status setiap file dalam satu folder (pending, done, failed) beserta size/mtime.
+
+    File 'done' dilewati saat run berikutnya selama size dan mtime-nya belum berubah sejak
+    metadata ditulis. File 'failed' dan 'pending' diproses ulang.
+    """
+
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, folder, manifest_dir=JOB_MANIFEST_DIR):
+        self.folder = os.path.abspath(folder)
+        self.path = folder_state_path(self.folder, manifest_dir)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                size INTEGER,
+                mtime REAL,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def _key(self, image_path):
+        return os.path.relpath(os.path.abspath(image_path), self.folder)
+
+    def is_done(self, image_path):
+        """True jika file sudah selesai dan belum berubah sejak metadata ditulis."""
+        with self._lock:
+            row = self._conn.execute("SELECT state, size, mtime FROM files WHERE path = ?", (self._key(image_path),)).fetchone()
+        if row is None or row[0] != self.DONE:
+            return False
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return False
+        return stat.st_size == row[1] and stat.st_mtime == row[2]
+
+    def mark(self, image_path, state, error=None):
+        try:
+            stat = os.stat(image_path)
+            size, mtime = stat.st_size, stat.st_mtime
+        except OSError:
+            size, mtime = None, None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                (self._key(image_path), state, size, mtime, error, time.time()),
+            )
+            self._conn.commit()
+
+    def add_pending(self, image_paths):
+        """Mencatat file yang akan diproses sebagai 'pending' (status yang sudah ada tidak ditimpa)."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO files VALUES (?, ?, NULL, NULL, NULL, ?)",
+                ((self._key(image_path), self.PENDING, now) for image_path in image_paths),
+            )
+            self._conn.commit()
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM files GROUP BY state").fetchall()
+        return dict(rows)
+
+    def reset(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM files")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Antrean kerja bersama: beberapa proses (atau mesin yang me-mount share NAS yang sama) memproses
+# satu folder bersama-sama. File antrean diletakkan di folder itu sendiri.
+WORK_QUEUE_NAME = ".metadata_queue.sqlite3"
+WORK_QUEUE_LEASE_SECONDS = 300 # Lease yang tidak diperpanjang selama ini dianggap milik worker yang mati
+WORK_QUEUE_CLAIM_BATCH = 4
+WORK_QUEUE_MAX_ATTEMPTS = 3 # File yang ditinggalkan worker sebanyak ini (mis. selalu membuat crash) ditandai gagal
+WORK_QUEUE_IDLE_POLL_SECONDS = 5
+WORK_QUEUE_BUSY_TIMEOUT_SECONDS = 60
+WORK_QUEUE_STATUS_INTERVAL_SECONDS = 5
+
+
+class WorkQueue:
+    """Antrean kerja berbasis SQLite untuk beberapa proses/mesin yang memproses satu folder.
+
+    Worker mengklaim beberapa file sekaligus dengan lease berbatas waktu dan memperpanjangnya selama
+    masih hidup (renew). Lease yang kedaluwarsa diklaim ulang worker lain; file yang sudah ditinggalkan
+    WORK_QUEUE_MAX_ATTEMPTS kali ditandai gagal. Path disimpan relatif terhadap folder dengan pemisah '/',
+    jadi mesin dengan mount point berbeda memakai baris yang sama.
+
+    Journal mode DELETE dipakai karena WAL tidak bekerja di filesystem jaringan. Lease memakai jam
+    dinding, jadi jam antar mesin sebaiknya disinkronkan (NTP) dan lease jauh lebih lama dari selisihnya.
+    """
+
+    PENDING = "pending"
+    LEASED = "leased"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, path, folder, worker_id=None):
+        self.path = path
+        self.folder = os.path.abspath(folder)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{os.urandom(3).hex()}"
+        self._lock = threading.Lock()
+        # isolation_level=None: transaksi diatur sendiri dengan BEGIN IMMEDIATE agar klaim tidak bentrok
+        self._conn = sqlite3.connect(path, timeout=WORK_QUEUE_BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        with self._transaction() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS work (
+                    path TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    size INTEGER,
+                    mtime INTEGER,
+                    worker TEXT,
+                    lease_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS work_state ON work (state)")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS workers (
+                    worker TEXT PRIMARY KEY,
+                    processed INTEGER NOT NULL,
+                    successful INTEGER NOT NULL,
+                    failed INTEGER NOT NULL,
+                    started_at REAL NOT NULL,
+                    seen_at REAL NOT NULL,
+                    alive_until REAL NOT NULL,
+                    finished INTEGER NOT NULL DEFAULT 0
+                )"""
+            )
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _key(self, image_path):
+        return os.path.relpath(os.path.abspath(image_path), self.folder).replace(os.sep, "/")
+
+    def _image_path(self, key):
+        return os.path.join(self.folder, *key.split("/"))
+
+    @staticmethod
+    def _file_signature(image_path):
+        # mtime dibulatkan ke detik: presisi mtime dari klien NAS yang berbeda (SMB/NFS) tidak selalu sama
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None, None
+        return stat.st_size, int(stat.st_mtime)
+
+    def start_run(self, requeue_all=False):
+        """Dipanggil saat worker bergabung. Jika antrean sudah tuntas (tidak ada pending/lease), run baru
+        dimulai dan file gagal diantrekan lagi; requeue_all juga mengantrekan ulang file yang sudah selesai."""
+        with self._transaction() as conn:
+            states = (self.FAILED, self.DONE) if requeue_all else (self.FAILED,)
+            active = conn.execute("SELECT COUNT(*) FROM work WHERE state IN (?, ?)", (self.PENDING, self.LEASED)).fetchone()[0]
+            if active and not requeue_all:
+                return 0
+            placeholders = ", ".join("?" * len(states))
+            return conn.execute(
+                f"UPDATE work SET state = ?, attempts = 0, error = NULL, updated_at = ? WHERE state IN ({placeholders})",
+                (self.PENDING, time.time(), *states),
+            ).rowcount
+
+    def add(self, image_paths, state=PENDING):
+        """Menambahkan file ke antrean. File yang sudah ada tidak berubah, kecuali file selesai/gagal
+        yang size atau mtime-nya berubah sejak itu: file tersebut diantrekan lagi."""
+        now = time.time()
+        rows = [(self._key(image_path), state, *self._file_signature(image_path), now) for image_path in image_paths]
+        with self._transaction() as conn:
+            conn.executemany(
+                """INSERT INTO work (path, state, size, mtime, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (path) DO UPDATE SET state = 'pending', size = excluded.size, mtime = excluded.mtime,
+                    attempts = 0, error = NULL, updated_at = excluded.updated_at
+                WHERE work.state IN ('done', 'failed') AND (work.size IS NOT excluded.size OR work.mtime IS NOT excluded.mtime)""",
+                rows,
+            )
+
+    def claim(self, limit, lease_seconds):
+        """Mengklaim hingga limit file. Mengembalikan list (image_path, diambil_alih), di mana diambil_alih
+        berarti lease worker lain sudah kedaluwarsa."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE work SET state = ?, worker = NULL, lease_until = NULL, error = ?, updated_at = ? "
+                "WHERE state = ? AND lease_until < ? AND attempts >= ?",
+                (self.FAILED, f"Ditinggalkan worker {WORK_QUEUE_MAX_ATTEMPTS} kali", now, self.LEASED, now, WORK_QUEUE_MAX_ATTEMPTS),
+            )
+            rows = conn.execute(
+                "SELECT path, state FROM work WHERE state = ? OR (state = ? AND lease_until < ?) LIMIT ?",
+                (self.PENDING, self.LEASED, now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE work SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? WHERE path = ?",
+                ((self.LEASED, self.worker_id, now + lease_seconds, now, key) for key, _ in rows),
+            )
+        return [(self._image_path(key), state == self.LEASED) for key, state in rows]
+
+    def renew(self, lease_seconds, processed=0, successful=0, failed=0):
+        """Memperpanjang semua lease milik worker ini dan mencatat counter-nya (heartbeat)."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE work SET lease_until = ? WHERE state = ? AND worker = ?",
+                (now + lease_seconds, self.LEASED, self.worker_id),
+            )
+            self._update_worker(conn, processed, successful, failed, now + lease_seconds, finished=False)
+
+    def _update_worker(self, conn, processed, successful, failed, alive_until, finished):
+        now = time.time()
+        conn.execute(
+            """INSERT INTO workers VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (worker) DO UPDATE SET processed = excluded.processed, successful = excluded.successful,
+                failed = excluded.failed, seen_at = excluded.seen_at, alive_until = excluded.alive_until, finished = excluded.finished""",
+            (self.worker_id, processed, successful, failed, now, now, alive_until, int(finished)),
+        )
+
+    def complete(self, image_path, succeeded, error=None):
+        size, mtime = self._file_signature(image_path) # Setelah metadata ditulis, agar run berikutnya tidak menganggapnya berubah
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE work SET state = ?, size = ?, mtime = ?, worker = ?, lease_until = NULL, error = ?, updated_at = ? WHERE path = ?",
+                (self.DONE if succeeded else self.FAILED, size, mtime, self.worker_id, error, time.time(), self._key(image_path)),
+            )
+
+    def leave(self, processed, successful, failed):
+        """Worker berhenti: file yang masih diklaimnya (mis. karena Stop) dikembalikan ke pending dan
+        counter terakhirnya dicatat. Mengembalikan jumlah file yang dikembalikan."""
+        with self._transaction() as conn:
+            released = conn.execute(
+                "UPDATE work SET state = ?, worker = NULL, lease_until = NULL, attempts = MAX(attempts - 1, 0), updated_at = ? WHERE state = ? AND worker = ?",
+                (self.PENDING, time.time(), self.LEASED, self.worker_id),
+            ).rowcount
+            self._update_worker(conn, processed, successful, failed, time.time(), finished=True)
+        return released
+
+    def next_foreign_lease_expiry(self):
+        """Waktu kedaluwarsa lease terdekat milik worker lain, atau None jika tidak ada."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT MIN(lease_until) FROM work WHERE state = ? AND worker != ?", (self.LEASED, self.worker_id)
+            ).fetchone()[0]
+
+    def status(self):
+        """Ringkasan seluruh antrean untuk koordinator: jumlah per state dan counter setiap worker."""
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM work GROUP BY state").fetchall())
+            expired = self._conn.execute(
+                "SELECT COUNT(*) FROM work WHERE state = ? AND lease_until < ?", (self.LEASED, time.time())
+            ).fetchone()[0]
+            workers = self._conn.execute(
+                "SELECT worker, processed, successful, failed, seen_at, alive_until, finished FROM workers ORDER BY started_at"
+            ).fetchall()
+        return {"counts": counts, "expired_leases": expired, "workers": workers}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def format_queue_status(status):
+    """Teks ringkasan WorkQueue.status() dengan counter yang sama seperti label progres GUI."""
+    counts = status["counts"]
+    done, failed = counts.get(WorkQueue.DONE, 0), counts.get(WorkQueue.FAILED, 0)
+    text = (
+        f"Processed: {done + failed}, Success: {done}, Failed: {failed}, "
+        f"Pending: {counts.get(WorkQueue.PENDING, 0)}, Sedang diproses: {counts.get(WorkQueue.LEASED, 0)}"
+    )
+    if status["expired_leases"]:
+        text += f" ({status['expired_leases']} lease kedaluwarsa, menunggu diambil alih)"
+    return text
+
+
+# Batas kuota default per API Key (bisa diubah dari UI/CLI). Angka ini mengikuti tier gratis Gemini
+# dan tier 1 OpenAI; sesuaikan dengan kuota akun Anda.
+DEFAULT_KEY_LIMITS = {
+    "Gemini": {"rpm": 15, "tpm": 1000000},
+    "OpenAI": {"rpm": 500, "tpm": 200000},
+}
+ESTIMATED_TOKENS_PER_REQUEST = 1500 # Perkiraan awal token per gambar; dikoreksi dengan usage sebenarnya
+MAX_RETRIES = 5 # Percobaan per gambar (rate limit/kunci tidak valid memakai kunci lain)
+INITIAL_RETRY_DELAY = 2 # Detik; dilipatgandakan per percobaan jika respons tidak berisi Retry-After
+DEFAULT_BENCH_SECONDS = 30 # Lama kunci diistirahatkan setelah rate limit tanpa Retry-After
+INVALID_KEY_BENCH_SECONDS = 3600
+HEDGE_MIN_SAMPLES = 20 # Hedging baru aktif setelah latensi sekian request provider utama tercatat
+HEDGE_MAX_RATIO = 0.1 # Maks 10% request provider utama yang diduplikasi, agar biaya dan beban tambahan terbatas
+
+
+def create_gemini_model(api_key, model_name, use_async=False, api_base=None):
+    """Membuat GenerativeModel yang terikat ke satu API Key tanpa mengubah konfigurasi global genai.
+
+    Dengan use_async=True model dipakai lewat generate_content_async (klien gRPC asyncio).
+    api_base (mis. "http://127.0.0.1:8080") mengarahkan klien sinkron ke endpoint lain lewat transport REST.
+    """
+    import google.generativeai as genai
+    from google.ai import generativelanguage as glm
+
+    model = genai.GenerativeModel(model_name)
+    client_options = {"api_key": api_key}
+    if api_base:
+        client_options["api_endpoint"] = api_base.rstrip("/")
+    # genai.configure() bersifat global; dengan klien sendiri setiap kunci aman dipakai paralel
+    if use_async:
+        model._async_client = glm.GenerativeServiceAsyncClient(client_options=client_options)
+    elif api_base:
+        model._client = glm.GenerativeServiceClient(client_options=client_options, transport="rest")
+    else:
+        model._client = glm.GenerativeServiceClient(client_options=client_options)
+    return model
+
+
+def create_openai_client(api_key, base_url=None, max_retries=0, use_async=False):
+    from openai import AsyncOpenAI, OpenAI
+
+    # max_retries=0: retry ditangani oleh scheduler, bukan SDK
+    client_class = AsyncOpenAI if use_async else OpenAI
+    return client_class(api_key=api_key, base_url=base_url, max_retries=max_retries)
+
+
+def extract_retry_after(error):
+    """Mengambil jeda Retry-After (detik) dari error provider, atau None jika tidak ada."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        if headers.get("retry-after-ms"):
+            try:
+                return float(headers["retry-after-ms"]) / 1000
+            except ValueError:
+                pass
+        if headers.get("retry-after"):
+            try:
+                return float(headers["retry-after"])
+            except ValueError:
+                pass
+    # Gemini menyertakan RetryInfo di pesan error, mis. "retry_delay { seconds: 27 }" atau "retry in 27.5s"
+    match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", str(error)) or re.search(r"retry in (\d+(?:\.\d+)?)\s*s", str(error), re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+# Nama kelas exception SDK untuk HTTP 429 (dicek lewat nama agar SDK tidak perlu diimpor di sini)
+RATE_LIMIT_ERROR_TYPES = ("RateLimitError", "ResourceExhausted", "TooManyRequests")
+# "429" hanya dihitung jika menempel pada status/code; angka lepas bisa berupa nama file (IMG_4291.jpg) atau ukuran
+_RATE_LIMIT_STATUS_PATTERN = re.compile(r"\b(?:status|code|error)[\s:=\"']{0,4}429\b|\b429 too many requests\b")
+
+
+def is_rate_limit_error(error):
+    if type(error).__name__ in RATE_LIMIT_ERROR_TYPES:
+        return True
+    for attribute in ("status_code", "code", "status"):
+        status = getattr(error, attribute, None)
+        if isinstance(status, int) and not isinstance(status, bool):
+            if status == 429:
+                return True
+            break
+    message = str(error).lower()
+    if any(marker in message for marker in ("rate limit", "quota", "resource exhausted", "resource has been exhausted", "too many requests")):
+        return True
+    return _RATE_LIMIT_STATUS_PATTERN.search(message) is not None
+
+
+def is_invalid_key_error(error):
+    message = str(error).lower()
+    return any(marker in message for marker in ("invalid api key", "authentication", "bad api key", "api key not valid"))
+
+
+class TokenBucket:
+    """Token bucket sederhana dengan kapasitas per menit yang terisi ulang secara kontinu."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.capacity / 60.0)
+        self.updated_at = now
+
+    def available(self):
+        self._refill()
+        return self.tokens
+
+    def consume(self, amount):
+        self._refill()
+        self.tokens -= amount
+
+    def seconds_until(self, amount):
+        self._refill()
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.capacity
+
+
+class ApiKeyState:
+    """Status satu API Key: klien yang dipakai ulang, bucket RPM/TPM, dan waktu istirahat (bench)."""
+
+    def __init__(self, provider, index, api_key, rpm, tpm, api_base=None):
+        self.provider = provider
+        self.index = index
+        self.api_key = api_key
+        self.api_base = api_base
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self.benched_until = 0.0
+        self._clients = {}
+
+    @property
+    def label(self):
+        return f"index {self.index}: {self.api_key[:5]}..."
+
+    def get_client(self, model_name):
+        """Klien dibuat sekali per kunci (dan per model untuk Gemini) lalu dipakai ulang."""
+        cache_key = model_name if self.provider == "Gemini" else None
+        if cache_key not in self._clients:
+            if self.provider == "Gemini":
+                self._clients[cache_key] = create_gemini_model(self.api_key, model_name, api_base=self.api_base)
+            else:
+                self._clients[cache_key] = create_openai_client(self.api_key, base_url=self.api_base)
+        return self._clients[cache_key]
+
+    def create_async_client(self, model_name):
+        """Klien async baru untuk kunci ini. Tidak di-cache di sini karena terikat ke event loop yang membuatnya."""
+        if self.provider == "Gemini":
+            return create_gemini_model(self.api_key, model_name, use_async=True, api_base=self.api_base)
+        return create_openai_client(self.api_key, base_url=self.api_base, use_async=True)
+
+    def remaining_capacity(self, estimated_tokens):
+        if self.request_bucket.available() < 1 or self.token_bucket.available() < estimated_tokens:
+            return 0.0
+        return min(self.request_bucket.available() / self.request_bucket.capacity, self.token_bucket.available() / self.token_bucket.capacity)
+
+
+class KeyScheduler:
+    """Membagi request ke API Key dengan sisa kapasitas terbesar berdasarkan token bucket RPM/TPM.
+
+    Kunci yang terkena rate limit diistirahatkan (sesuai Retry-After jika ada) tanpa menghentikan
+    worker lain; acquire() hanya menunggu jika semua kunci sedang penuh atau diistirahatkan.
+    """
+
+    def __init__(self, provider, api_keys, rpm, tpm, api_base=None):
+        self.provider = provider
+        self.api_base = api_base
+        self.keys = [ApiKeyState(provider, index, key, rpm, tpm, api_base) for index, key in enumerate(api_keys)]
+        self._lock = threading.Lock()
+
+    def set_limits(self, rpm, tpm):
+        with self._lock:
+            for state in self.keys:
+                state.request_bucket.capacity = float(rpm)
+                state.token_bucket.capacity = float(tpm)
+
+    def try_acquire(self, estimated_tokens=ESTIMATED_TOKENS_PER_REQUEST):
+        """Satu percobaan tanpa menunggu. Mengembalikan (ApiKeyState atau None, detik sampai layak dicoba lagi)."""
+        with self._lock:
+            now = time.monotonic()
+            active = [state for state in self.keys if state.benched_until <= now]
+            best, best_capacity = None, 0.0
+            for state in active:
+                tokens_needed = min(estimated_tokens, state.token_bucket.capacity)
+                capacity = state.remaining_capacity(tokens_needed)
+                if capacity > best_capacity:
+                    best, best_capacity = state, capacity
+            if best is not None:
+                best.request_bucket.consume(1)
+                best.token_bucket.consume(min(estimated_tokens, best.token_bucket.capacity))
+                return best, 0.0
+
+            waits = [state.benched_until - now for state in self.keys if state.benched_until > now]
+            waits += [
+                max(state.request_bucket.seconds_until(1), state.token_bucket.seconds_until(min(estimated_tokens, state.token_bucket.capacity)))
+                for state in active
+            ]
+        return None, min(max(min(waits), 0.05), 1.0)
+
+    def acquire(self, stop_event, estimated_tokens=ESTIMATED_TOKENS_PER_REQUEST):
+        """Mengembalikan ApiKeyState yang kuotanya sudah dipotong, atau None jika Stop ditekan."""
+        while not stop_event.is_set():
+            state, wait_seconds = self.try_acquire(estimated_tokens)
+            if state is not None:
+                return state
+            stop_event.wait(wait_seconds)
+        return None
+
+    def report_usage(self, state, actual_tokens, estimated_tokens=ESTIMATED_TOKENS_PER_REQUEST):
+        """Mengoreksi bucket TPM dengan jumlah token sebenarnya dari respons."""
+        if not actual_tokens:
+            return
+        with self._lock:
+            state.token_bucket.consume(actual_tokens - min(estimated_tokens, state.token_bucket.capacity))
+
+    def bench(self, state, seconds):
+        with self._lock:
+            state.benched_until = max(state.benched_until, time.monotonic() + seconds)
+
+    def all_benched(self):
+        """True jika semua kunci sedang diistirahatkan (rate limit/kunci tidak valid), bukan sekadar bucket penuh."""
+        with self._lock:
+            now = time.monotonic()
+            return all(state.benched_until > now for state in self.keys)
+
+
+class MemoryBudget:
+    """Batas total byte payload upload yang boleh ada di memori bersamaan, dibagi oleh semua worker.
+
+    Satu gambar selalu boleh jalan walau lebih besar dari batas (jika tidak ada yang lain di memori),
+    supaya file raksasa tidak menggantung selamanya. limit_bytes <= 0 berarti tanpa batas.
+    """
+
+    def __init__(self, limit_bytes):
+        self.limit = limit_bytes
+        self.used = 0
+        self._condition = threading.Condition()
+
+    def _fits(self, amount):
+        return self.limit <= 0 or self.used == 0 or self.used + amount <= self.limit
+
+    def try_acquire(self, amount):
+        with self._condition:
+            if not self._fits(amount):
+                return False
+            self.used += amount
+            return True
+
+    def acquire(self, amount, stop_event):
+        """Menunggu sampai amount byte tersedia. Mengembalikan False jika Stop ditekan."""
+        with self._condition:
+            while not stop_event.is_set():
+                if self._fits(amount):
+                    self.used += amount
+                    return True
+                self._condition.wait(0.5)
+        return False
+
+    def release(self, amount):
+        if amount <= 0:
+            return
+        with self._condition:
+            self.used = max(0, self.used - amount)
+            self._condition.notify_all()
+
+
+EXIFTOOL_WRITE_BATCH_SIZE = 16 # Maks jumlah file yang dikirim ke exiftool dalam satu kali tulis ke stdin
+
+
+class ExifToolError(Exception):
+    pass
+
+
+class ExifToolWriter:
+    """Proses exiftool yang tetap hidup (-stay_open) dan dipakai ulang untuk semua file.
+
+    Perintah dimasukkan ke antrean tulis; thread penulis mengambil beberapa perintah sekaligus,
+    mengirim semuanya ke stdin exiftool (masing-masing diakhiri -execute{id}), lalu membaca
+    output per id sehingga hasil/kegagalan tetap tercatat untuk file yang benar.
+    Prefix 'wsl' hanya dipakai di Windows (atau jika diminta), di Linux exiftool dipanggil langsung.
+    """
+
+    def __init__(self, use_wsl=None, batch_size=EXIFTOOL_WRITE_BATCH_SIZE, executable="exiftool"):
+        self.use_wsl = (os.name == "nt") if use_wsl is None else use_wsl
+        self.executable = executable
+        self.batch_size = max(1, batch_size)
+        self.version = None
+        self._process = None
+        self._process_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._next_id = 0
+
+    @property
+    def command_prefix(self):
+        return ["wsl", self.executable] if self.use_wsl else [self.executable]
+
+    def to_exiftool_path(self, image_path):
+        """Mengubah path Windows (C:\\...) menjadi path WSL (/mnt/c/...) bila exiftool berjalan di WSL."""
+        if not self.use_wsl:
+            return image_path
+        if len(image_path) >= 2 and image_path[1] == ":":
+            image_path = f"/mnt/{image_path[0].lower()}{image_path[2:]}"
+        return image_path.replace("\\", "/")
+
+    def start(self):
+        """Menjalankan proses exiftool (jika belum) dan mengembalikan versinya. Aman dipanggil berulang."""
+        with self._process_lock:
+            if self._process is None or self._process.poll() is not None:
+                self._process = subprocess.Popen(
+                    self.command_prefix + ["-stay_open", "True", "-@", "-"],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT, # Error ikut masuk ke stdout sebelum penanda {ready}
+                    text=True,
+                    encoding="utf-8",
+                    errors="replace",
+                    creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+                )
+                self.version = None
+            if self.version is None:
+                output = self._run_batch([["-ver"]])[0]
+                self.version = output.strip()
+                if not self.version:
+                    raise ExifToolError("ExifTool tidak mengembalikan versi.")
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._writer_loop, name="exiftool-writer", daemon=True)
+                self._thread.start()
+            return self.version
+
+    def write_metadata(self, image_path, title, description, keywords):
+        """Mengantrekan penulisan XMP untuk satu file dan menunggu hasilnya. Mengembalikan output exiftool."""
+        args = [
+            f"-XMP-dc:Title={self._single_line(title)}",
+            f"-XMP-dc:Description={self._single_line(description)}",
+            # Satu item Subject per keyword, sama seperti penulis XMP langsung dan sidecar (rdf:li per keyword)
+            "-sep", ",",
+            f"-XMP-dc:Subject={self._single_line(','.join(split_keywords(keywords)))}",
+            "-overwrite_original",
+            "-charset", "UTF8",
+            "-m",
+            self.to_exiftool_path(image_path),
+        ]
+        output = self._submit(args)
+        if "weren't updated due to errors" in output or any(line.startswith("Error") for line in output.splitlines()):
+            raise ExifToolError(output.strip())
+        return output
+
+    def find_tagged_files(self, folder, extensions=IMAGE_EXTENSIONS):
+        """Membaca XMP-dc:Title/Subject semua gambar di folder (rekursif) dalam satu perintah exiftool.
+
+        Mengembalikan set path_key() dari file yang Title dan Subject-nya sudah terisi.
+        """
+        args = ["-j", "-q", "-q", "-fast", "-r", "-XMP-dc:Title", "-XMP-dc:Subject"]
+        for extension in extensions:
+            args += ["-ext", extension.lstrip(".")]
+        args.append(self.to_exiftool_path(folder))
+        output = self._submit(args)
+        start, end = output.find("["), output.rfind("]")
+        if start == -1 or end == -1:
+            return set()
+        tagged = set()
+        for entry in json.loads(output[start:end + 1]):
+            if entry.get("Title") and entry.get("Subject"):
+                tagged.add(self._normalize_path(entry["SourceFile"]))
+        return tagged
+
+    def path_key(self, image_path):
+        """Path yang bisa dibandingkan dengan hasil find_tagged_files()."""
+        return self._normalize_path(self.to_exiftool_path(image_path))
+
+    def _normalize_path(self, exiftool_path):
+        return posixpath.normpath(exiftool_path) if self.use_wsl else os.path.normpath(exiftool_path)
+
+    def _submit(self, args):
+        self.start()
+        future = Future()
+        self._queue.put((args, future))
+        return future.result()
+
+    def close(self):
+        with self._process_lock:
+            if self._process is not None and self._process.poll() is None:
+                try:
+                    self._process.stdin.write("-stay_open\nFalse\n")
+                    self._process.stdin.flush()
+                    self._process.wait(timeout=5)
+                except (OSError, subprocess.TimeoutExpired):
+                    self._process.kill()
+            self._process = None
+            self.version = None
+
+    def _writer_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._process_lock:
+                    if self._process is None or self._process.poll() is not None:
+                        raise ExifToolError("Proses ExifTool tidak berjalan.")
+                    outputs = self._run_batch([args for args, _ in batch])
+                for (_, future), output in zip(batch, outputs):
+                    future.set_result(output)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e if isinstance(e, ExifToolError) else ExifToolError(str(e)))
+
+    def _run_batch(self, arg_lists):
+        """Mengirim beberapa perintah sekaligus lalu membaca output masing-masing sampai penanda {readyN}."""
+        ids = []
+        lines = []
+        for args in arg_lists:
+            self._next_id += 1
+            ids.append(self._next_id)
+            lines.extend(args)
+            lines.append(f"-execute{self._next_id}")
+        self._process.stdin.write("\n".join(lines) + "\n")
+        self._process.stdin.flush()
+
+        outputs = []
+        for command_id in ids:
+            marker = f"{{ready{command_id}}}"
+            collected = []
+            while True:
+                line = self._process.stdout.readline()
+                if not line:
+                    raise ExifToolError("Proses ExifTool berhenti secara tak terduga.")
+                if line.strip() == marker:
+                    break
+                collected.append(line)
+            outputs.append("".join(collected))
+        return outputs
+
+    @staticmethod
+    def _single_line(value):
+        # Argfile exiftool membaca satu argumen per baris
+        return " ".join(str(value).splitlines())
+
+
+# Penulisan XMP tanpa exiftool: paket XMP dibangun di Python lalu disisipkan langsung ke JPEG
+# (segmen APP1) atau PNG (chunk iTXt). Jika paket lama punya cukup padding, paket baru ditulis
+# di tempat yang sama sehingga file asli tidak disalin ulang; selain itu file ditulis ulang lewat file sementara.
+XMP_PACKET_PADDING = 2048 # Byte spasi di akhir paket agar penulisan berikutnya bisa di tempat
+XMP_COPY_CHUNK_SIZE = 1024 * 1024
+XMP_JPEG_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+XMP_JPEG_EXTENDED_HEADER = b"http://ns.adobe.com/xmp/extension/\x00"
+XMP_JPEG_MAX_PACKET = 65533 - len(XMP_JPEG_HEADER) # Data segmen APP1 maks 65533 byte
+XMP_PNG_KEYWORD = b"XML:com.adobe.xmp"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+NATIVE_XMP_EXTENSIONS = (".jpg", ".jpeg", ".png")
+XMP_NAMESPACES = {
+    "x": "adobe:ns:meta/",
+    "rdf": "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "xmp": "http://ns.adobe.com/xap/1.0/",
+    "xmpMM": "http://ns.adobe.com/xap/1.0/mm/",
+    "stEvt": "http://ns.adobe.com/xap/1.0/sType/ResourceEvent#",
+    "photoshop": "http://ns.adobe.com/photoshop/1.0/",
+    "tiff": "http://ns.adobe.com/tiff/1.0/",
+    "exif": "http://ns.adobe.com/exif/1.0/",
+    "crs": "http://ns.adobe.com/camera-raw-settings/1.0/",
+    "Iptc4xmpCore": "http://iptc.org/std/Iptc4xmpCore/1.0/xmlns/",
+}
+_XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+for _prefix, _uri in XMP_NAMESPACES.items():
+    ET.register_namespace(_prefix, _uri) # Agar properti lain yang dipertahankan tetap memakai prefix aslinya
+
+
+class XmpError(Exception):
+    pass
+
+
+def _xmp_tag(prefix, name):
+    return f"{{{XMP_NAMESPACES[prefix]}}}{name}"
+
+
+def _xmp_padding(size):
+    # Padding XMP berupa baris spasi; ukurannya tepat size byte
+    lines, rest = divmod(size, 100)
+    return (" " * 99 + "\n") * lines + " " * rest
+
+
+def build_xmp_packet(title, description, keywords, existing=None, padding=XMP_PACKET_PADDING):
+    """Paket XMP (bytes UTF-8) berisi dc:title, dc:description dan dc:subject (satu rdf:li per keyword).
+
+    Jika existing (paket lama) diberikan, properti lain di dalamnya dipertahankan dan hanya ketiga
+    properti dc tersebut yang diganti, seperti yang dilakukan exiftool.
+    """
+    if existing:
+        try:
+            root = ET.fromstring(existing.rstrip(b"\x00 \r\n\t") if isinstance(existing, bytes) else existing)
+        except ET.ParseError as e:
+            raise XmpError(f"XMP yang sudah ada tidak bisa dibaca: {e}")
+        if root.tag == _xmp_tag("rdf", "RDF"): # Paket tanpa pembungkus x:xmpmeta
+            wrapper = ET.Element(_xmp_tag("x", "xmpmeta"))
+            wrapper.append(root)
+            root = wrapper
+    else:
+        root = ET.Element(_xmp_tag("x", "xmpmeta"))
+    rdf = root.find(_xmp_tag("rdf", "RDF"))
+    if rdf is None:
+        rdf = ET.SubElement(root, _xmp_tag("rdf", "RDF"))
+    descriptions = rdf.findall(_xmp_tag("rdf", "Description"))
+    for element in descriptions:
+        for name in ("title", "description", "subject"):
+            for child in element.findall(_xmp_tag("dc", name)):
+                element.remove(child)
+            element.attrib.pop(_xmp_tag("dc", name), None)
+    target = descriptions[0] if descriptions else ET.SubElement(rdf, _xmp_tag("rdf", "Description"), {_xmp_tag("rdf", "about"): ""})
+
+    for name, value in (("title", title), ("description", description)):
+        alternatives = ET.SubElement(ET.SubElement(target, _xmp_tag("dc", name)), _xmp_tag("rdf", "Alt"))
+        ET.SubElement(alternatives, _xmp_tag("rdf", "li"), {_XML_LANG: "x-default"}).text = str(value)
+    bag = ET.SubElement(ET.SubElement(target, _xmp_tag("dc", "subject")), _xmp_tag("rdf", "Bag"))
+    for keyword in split_keywords(keywords):
+        ET.SubElement(bag, _xmp_tag("rdf", "li")).text = keyword
+
+    body = ET.tostring(root, encoding="unicode")
+    packet = f'<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>\n{body}\n{_xmp_padding(padding)}<?xpacket end="w"?>'
+    return packet.encode("utf-8")
+
+
+def _fit_xmp_packet(title, description, keywords, existing, size):
+    """Paket baru dengan ukuran tepat size byte (padding disesuaikan), atau None jika tidak muat."""
+    packet = build_xmp_packet(title, description, keywords, existing, padding=0)
+    if len(packet) > size:
+        return None
+    return build_xmp_packet(title, description, keywords, existing, padding=size - len(packet))
+
+
+def _replace_file_range(path, start, end, data):
+    """Mengganti byte [start, end) file dengan data.
+
+    Hanya penggantian dengan panjang sama (paket XMP lama yang paddingnya cukup) ditulis langsung di file
+    yang ada. Setiap penulisan yang mengubah ukuran file, termasuk yang hanya menyentuh akhir file, disalin
+    ke file sementara di folder yang sama lalu menggantikan aslinya dengan os.replace, sehingga crash atau
+    disk penuh di tengah penulisan tidak merusak gambar asli.
+    """
+    if end - start == len(data):
+        with open(path, "r+b") as f:
+            f.seek(start)
+            f.write(data)
+        return
+    fd, temp_path = tempfile.mkstemp(prefix=".xmp-", suffix=".tmp", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as output, open(path, "rb") as source:
+            remaining = start
+            while remaining:
+                chunk = source.read(min(remaining, XMP_COPY_CHUNK_SIZE))
+                if not chunk:
+                    break
+                output.write(chunk)
+                remaining -= len(chunk)
+            output.write(data)
+            source.seek(end)
+            shutil.copyfileobj(source, output, XMP_COPY_CHUNK_SIZE)
+        shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp_path)
+        raise
+
+
+def write_jpeg_xmp(path, title, description, keywords):
+    """Menyisipkan atau mengganti segmen APP1 XMP di file JPEG. Hanya header file yang dibaca."""
+    insert_at = 2 # Setelah SOI, APP0 (JFIF) dan APP1 Exif di awal file, seperti exiftool
+    leading = True
+    existing = None
+    with open(path, "rb") as f:
+        if f.read(2) != b"\xff\xd8":
+            raise XmpError("Bukan file JPEG yang valid.")
+        while True:
+            position = f.tell()
+            header = f.read(4)
+            if len(header) < 4 or header[0] != 0xFF:
+                raise XmpError("Struktur segmen JPEG tidak dikenali.")
+            marker = header[1]
+            if marker in (0xDA, 0xD9): # Awal data gambar: segmen metadata sudah habis
+                break
+            length = int.from_bytes(header[2:4], "big")
+            if length < 2:
+                raise XmpError("Panjang segmen JPEG tidak valid.")
+            if marker == 0xE1:
+                data_start = position + 4
+                signature = f.read(len(XMP_JPEG_EXTENDED_HEADER))
+                if signature.startswith(XMP_JPEG_EXTENDED_HEADER):
+                    raise XmpError("File memakai Extended XMP.")
+                if signature.startswith(XMP_JPEG_HEADER) and existing is None:
+                    f.seek(data_start + len(XMP_JPEG_HEADER))
+                    existing = (position, position + 2 + length, f.read(length - 2 - len(XMP_JPEG_HEADER)))
+            if leading and marker in (0xE0, 0xE1):
+                insert_at = position + 2 + length
+            else:
+                leading = False
+            f.seek(position + 2 + length)
+
+    if existing is not None:
+        start, end, old_packet = existing
+        packet = _fit_xmp_packet(title, description, keywords, old_packet, len(old_packet))
+        if packet is None:
+            packet = build_xmp_packet(title, description, keywords, old_packet)
+    else:
+        start = end = insert_at
+        packet = build_xmp_packet(title, description, keywords)
+    if len(packet) > XMP_JPEG_MAX_PACKET:
+        raise XmpError("Paket XMP terlalu besar untuk satu segmen APP1.")
+    segment_data = XMP_JPEG_HEADER + packet
+    _replace_file_range(path, start, end, b"\xff\xe1" + (len(segment_data) + 2).to_bytes(2, "big") + segment_data)
+
+
+def _png_chunk(chunk_type, data):
+    return len(data).to_bytes(4, "big") + chunk_type + data + zlib.crc32(chunk_type + data).to_bytes(4, "big")
+
+
+def _png_xmp_chunk(packet):
+    # iTXt: keyword, tanpa kompresi, tanpa tag bahasa dan terjemahan
+    return _png_chunk(b"iTXt", XMP_PNG_KEYWORD + b"\x00\x00\x00\x00\x00" + packet)
+
+
+def write_png_xmp(path, title, description, keywords):
+    """Menyisipkan atau mengganti chunk iTXt XML:com.adobe.xmp di file PNG.
+
+    Chunk baru diletakkan sebelum IEND (posisi default exiftool). Ukuran file berubah, jadi file ditulis
+    ulang lewat file sementara (lihat _replace_file_range); berikutnya padding paket memungkinkan penulisan di tempat.
+    """
+    existing = None
+    with open(path, "rb") as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise XmpError("Bukan file PNG yang valid.")
+        while True:
+            position = f.tell()
+            header = f.read(8)
+            if len(header) < 8:
+                raise XmpError("Chunk IEND tidak ditemukan.")
+            length = int.from_bytes(header[:4], "big")
+            chunk_type = header[4:]
+            if chunk_type == b"IEND":
+                iend = position
+                break
+            if chunk_type == b"iTXt" and existing is None:
+                prefix = f.read(min(length, len(XMP_PNG_KEYWORD) + 1))
+                if prefix == XMP_PNG_KEYWORD + b"\x00":
+                    data = prefix + f.read(length - len(prefix))
+                    compressed = data[len(prefix)]
+                    text = data[len(prefix) + 2:].split(b"\x00", 2)[-1] # Lewati tag bahasa dan terjemahan
+                    existing = (position, position + 12 + length, zlib.decompress(text) if compressed else text, compressed)
+            f.seek(position + 12 + length)
+
+    if existing is not None:
+        start, end, old_packet, compressed = existing
+        packet = None if compressed else _fit_xmp_packet(title, description, keywords, old_packet, len(old_packet))
+        if packet is None:
+            packet = build_xmp_packet(title, description, keywords, old_packet)
+        chunk = _png_xmp_chunk(packet)
+    else:
+        start, end = iend, iend + 12
+        chunk = _png_xmp_chunk(build_xmp_packet(title, description, keywords)) + _png_chunk(b"IEND", b"")
+    _replace_file_range(path, start, end, chunk)
+
+
+def write_embedded_xmp(path, title, description, keywords):
+    """Menulis XMP langsung ke file JPEG/PNG tanpa exiftool. Format lain: XmpError."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jpg", ".jpeg"):
+        write_jpeg_xmp(path, title, description, keywords)
+    elif extension == ".png":
+        write_png_xmp(path, title, description, keywords)
+    else:
+        raise XmpError(f"Format {extension} tidak didukung penulis XMP internal.")
+
+
+def xmp_sidecar_path(image_path):
+    return os.path.splitext(image_path)[0] + ".xmp"
+
+
+def write_xmp_sidecar(image_path, title, description, keywords):
+    """Menulis (atau memperbarui) file .xmp di samping gambar; file gambar tidak disentuh."""
+    sidecar_path = xmp_sidecar_path(image_path)
+    existing = None
+    if os.path.exists(sidecar_path):
+        with open(sidecar_path, "rb") as f:
+            existing = f.read()
+    packet = build_xmp_packet(title, description, keywords, existing, padding=0)
+    fd, temp_path = tempfile.mkstemp(prefix=".xmp-", suffix=".tmp", dir=os.path.dirname(os.path.abspath(sidecar_path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(packet)
+        os.replace(temp_path, sidecar_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp_path)
+        raise
+    return sidecar_path
+
+
+ADOBE_STOCK_CSV_COLUMNS = ("Filename", "Title", "Keywords")
+ADOBE_STOCK_CSV_NAME = "adobe_stock_upload.csv"
+
+
+class AdobeStockCsvWriter:
+    """CSV bulk upload Adobe Stock (Filename, Title, Keywords) yang ditulis baris demi baris.
+
+    Setiap baris langsung di-flush sehingga hasil tidak hilang jika proses berhenti di tengah.
+    File yang sudah ada dilanjutkan tanpa header baru, jadi run lanjutan menambah baris.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        write_header = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._lock = threading.Lock()
+        if write_header:
+            self._writer.writerow(ADOBE_STOCK_CSV_COLUMNS)
+            self._file.flush()
+
+    def write_row(self, image_path, title, keywords):
+        row = (os.path.basename(image_path), " ".join(str(title).split())[:MAX_TITLE_LENGTH], ", ".join(split_keywords(keywords)))
+        with self._lock:
+            self._writer.writerow(row)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+# Mode batch offline: gambar dikirim sebagai job batch provider (lebih murah, kuota terpisah),
+# lalu hasilnya ditulis setelah job selesai. Status job disimpan per folder agar bisa dilanjutkan.
+BATCH_STATE_DIR = os.path.join(os.path.expanduser("~"), ".adobe_stock_metadata", "batches")
+BATCH_POLL_INTERVAL_SECONDS = 60
+OPENAI_API_BASE = "https://api.openai.com/v1"
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+# Batas ukuran satu job. Gemini menerima request inline sampai ~20 MB; file batch OpenAI bisa lebih
+# besar, tapi job dipecah lebih awal agar memori tetap wajar dan hasil pertama cepat tersedia.
+BATCH_LIMITS = {
+    "Gemini": {"max_requests": 1000, "max_bytes": 18 * 1024 * 1024},
+    "OpenAI": {"max_requests": 5000, "max_bytes": 50 * 1024 * 1024},
+}
+
+
+class BatchError(Exception):
+    """Kesalahan saat membuat, memeriksa atau mengambil hasil job batch."""
+
+
+class BatchJobStore:
+    """Menyimpan job batch yang sudah dikirim untuk satu folder beserta file di dalamnya.
+
+    Setiap job dicatat segera setelah dikirim, jadi jika proses dihentikan atau crash, run
+    berikutnya melanjutkan polling job yang sama tanpa mengirim ulang gambar.
+    """
+
+    SUBMITTED = "submitted"
+    APPLIED = "applied"
+    FAILED = "failed"
+
+    def __init__(self, folder, state_dir=BATCH_STATE_DIR):
+        self.folder = os.path.abspath(folder)
+        self.path = folder_state_path(self.folder, state_dir)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS batches (
+                remote_id TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                state TEXT NOT NULL,
+                remote_status TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS items (
+                remote_id TEXT NOT NULL,
+                custom_id TEXT NOT NULL,
+                path TEXT NOT NULL,
+                cache_key TEXT,
+                PRIMARY KEY (remote_id, custom_id)
+            )"""
+        )
+        self._conn.commit()
+
+    def add_batch(self, remote_id, provider, model_name, items):
+        """items: list (custom_id, image_path, cache_key)."""
+        now = time.time()
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO batches VALUES (?, ?, ?, ?, NULL, ?, ?)",
+                (remote_id, provider, model_name, self.SUBMITTED, now, now),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)",
+                ((remote_id, custom_id, os.path.relpath(os.path.abspath(image_path), self.folder), cache_key) for custom_id, image_path, cache_key in items),
+            )
+
+    def open_batches(self):
+        """Job yang belum selesai diterapkan: list (remote_id, provider, model)."""
+        return self._conn.execute(
+            "SELECT remote_id, provider, model FROM batches WHERE state = ? ORDER BY created_at", (self.SUBMITTED,)
+        ).fetchall()
+
+    def open_paths(self):
+        """Path absolut semua file yang masih menunggu di job yang belum diterapkan."""
+        rows = self._conn.execute(
+            "SELECT items.path FROM items JOIN batches USING (remote_id) WHERE batches.state = ?", (self.SUBMITTED,)
+        ).fetchall()
+        return {os.path.normcase(os.path.join(self.folder, row[0])) for row in rows}
+
+    def items(self, remote_id):
+        """Mengembalikan {custom_id: (image_path, cache_key)} untuk satu job."""
+        rows = self._conn.execute("SELECT custom_id, path, cache_key FROM items WHERE remote_id = ?", (remote_id,)).fetchall()
+        return {custom_id: (os.path.join(self.folder, path), cache_key) for custom_id, path, cache_key in rows}
+
+    def set_remote_status(self, remote_id, remote_status):
+        with self._conn:
+            self._conn.execute("UPDATE batches SET remote_status = ?, updated_at = ? WHERE remote_id = ?", (remote_status, time.time(), remote_id))
+
+    def finish(self, remote_id, state):
+        with self._conn:
+            self._conn.execute("UPDATE batches SET state = ?, updated_at = ? WHERE remote_id = ?", (state, time.time(), remote_id))
+
+    def close(self):
+        self._conn.close()
+
+
+class OpenAIBatchClient:
+    """Batch API OpenAI: file JSONL berisi request /v1/chat/completions, diunggah lalu diproses dalam 24 jam."""
+
+    RUNNING, SUCCEEDED, FAILED = "running", "succeeded", "failed"
+
+    def __init__(self, api_key, model_name, api_base=None):
+        self.model_name = model_name
+        self.client = create_openai_client(api_key, base_url=api_base or OPENAI_API_BASE, max_retries=2)
+
+    def build_request(self, custom_id, mime_type, encoded_image):
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": self.model_name,
+                "messages": build_openai_messages(f"data:{mime_type};base64,{encoded_image}"),
+                "response_format": {"type": "json_object"},
+            },
+        }
+
+    def submit(self, requests, display_name):
+        payload = "".join(json.dumps(request) + "\n" for request in requests).encode("utf-8")
+        input_file = self.client.files.create(file=(f"{display_name}.jsonl", payload), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            metadata={"description": display_name},
+        )
+        return batch.id
+
+    def poll(self, remote_id):
+        """Mengembalikan (status umum, status asli provider)."""
+        batch = self.client.batches.retrieve(remote_id)
+        if batch.status == "completed":
+            return self.SUCCEEDED, batch.status
+        if batch.status in ("failed", "expired", "cancelled"):
+            return self.FAILED, batch.status
+        return self.RUNNING, batch.status
+
+    def fetch_results(self, remote_id):
+        """Yield (custom_id, teks respons atau None, (prompt, completion, total token), error)."""
+        batch = self.client.batches.retrieve(remote_id)
+        # Job expired/cancelled tetap bisa punya output parsial
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                body = response.get("body") or {}
+                if record.get("error") or response.get("status_code") != 200:
+                    error = record.get("error") or body.get("error") or f"HTTP {response.get('status_code')}"
+                    yield record.get("custom_id"), None, (0, 0, 0), str(error)
+                    continue
+                usage = body.get("usage") or {}
+                tokens = (usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), usage.get("total_tokens", 0))
+                yield record.get("custom_id"), body["choices"][0]["message"]["content"], tokens, None
+
+
+class GeminiBatchClient:
+    """Batch API Gemini (models/{model}:batchGenerateContent) via REST dengan request inline.
+
+    google-generativeai belum mendukung batch, jadi endpoint dipanggil langsung dengan urllib.
+    """
+
+    RUNNING, SUCCEEDED, FAILED = "running", "succeeded", "failed"
+
+    def __init__(self, api_key, model_name, api_base=None):
+        self.api_key = api_key
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+        self.api_base = (api_base or GEMINI_API_BASE).rstrip("/")
+
+    def _request(self, method, path, body=None):
+        import urllib.error
+        import urllib.request
+
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(
+            f"{self.api_base}/{path}",
+            data=data,
+            method=method,
+            headers={"x-goog-api-key": self.api_key, "Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=300) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            raise BatchError(f"HTTP {e.code} dari Gemini Batch API: {e.read().decode('utf-8', 'replace')[:500]}")
+        except urllib.error.URLError as e:
+            raise BatchError(f"Gemini Batch API tidak bisa dihubungi: {e.reason}")
+
+    def build_request(self, custom_id, mime_type, encoded_image):
+        return {
+            "request": {
+                "contents": [
+                    {
+                        "role": "user",
+                        "parts": [
+                            {"inline_data": {"mime_type": mime_type, "data": encoded_image}},
+                            {"text": METADATA_PROMPT},
+                        ],
+                    }
+                ],
+                "generation_config": gemini_generation_config(),
+            },
+            "metadata": {"key": custom_id},
+        }
+
+    def submit(self, requests, display_name):
+        body = {"batch": {"display_name": display_name, "input_config": {"requests": {"requests": requests}}}}
+        operation = self._request("POST", f"{self.model_name}:batchGenerateContent", body)
+        return operation["name"]
+
+    def _state(self, operation):
+        # Nama status bisa berprefix BATCH_STATE_ atau JOB_STATE_ tergantung versi API
+        return (operation.get("metadata") or {}).get("state") or operation.get("state") or ""
+
+    def poll(self, remote_id):
+        operation = self._request("GET", remote_id)
+        state = self._state(operation)
+        if operation.get("error"):
+            return self.FAILED, state or str(operation["error"].get("message", "error"))
+        if state.endswith("SUCCEEDED"):
+            return self.SUCCEEDED, state
+        if state.endswith(("FAILED", "CANCELLED", "EXPIRED")):
+            return self.FAILED, state
+        return self.RUNNING, state
+
+    def fetch_results(self, remote_id):
+        operation = self._request("GET", remote_id)
+        output = operation.get("response") or (operation.get("metadata") or {}).get("output") or {}
+        inlined = output.get("inlinedResponses") or {}
+        if isinstance(inlined, dict):
+            inlined = inlined.get("inlinedResponses") or []
+        for entry in inlined:
+            custom_id = (entry.get("metadata") or {}).get("key")
+            if entry.get("error"):
+                yield custom_id, None, (0, 0, 0), str(entry["error"].get("message", entry["error"]))
+                continue
+            response = entry.get("response") or {}
+            candidates = response.get("candidates") or []
+            parts = ((candidates[0].get("content") or {}).get("parts") or []) if candidates else []
+            text = "".join(part.get("text", "") for part in parts)
+            if not text:
+                yield custom_id, None, (0, 0, 0), "Respons kosong (kemungkinan diblokir safety filter)."
+                continue
+            usage = response.get("usageMetadata") or {}
+            tokens = (usage.get("promptTokenCount", 0), usage.get("candidatesTokenCount", 0), usage.get("totalTokenCount", 0))
+            yield custom_id, text, tokens, None
+
+
+BATCH_CLIENTS = {"Gemini": GeminiBatchClient, "OpenAI": OpenAIBatchClient}
+
+
+GEMINI_MODELS = ["gemini-1.5-flash", "gemini-2.0-flash", "gemini-2.5-flash"]
+OPENAI_MODELS = ["gpt-4o-mini", "gpt-4o", "gpt-4-turbo", "gpt-4-vision-preview"]
+DEFAULT_MODELS = {"Gemini": "gemini-1.5-flash", "OpenAI": "gpt-4o-mini"}
+# exiftool = XMP ditulis exiftool; xmp = JPEG/PNG ditulis langsung tanpa subprocess (format lain tetap
+# lewat exiftool); sidecar dan csv tidak pernah menyentuh file asli; jsonl = hasil mentah per baris
+OUTPUT_MODES = ("exiftool", "xmp", "sidecar", "csv", "jsonl")
+
+
+def classify_api_keys(keys):
+    """Memisahkan API Key berdasarkan prefix. Mengembalikan (gemini_keys, openai_keys, unknown_keys)."""
+    gemini_keys, openai_keys, unknown_keys = [], [], []
+    for key in keys:
+        if key.startswith("sk-") and OPENAI_AVAILABLE:
+            openai_keys.append(key)
+        elif key.startswith("AIza"):
+            gemini_keys.append(key)
+        else:
+            unknown_keys.append(key)
+    return gemini_keys, openai_keys, unknown_keys
+
+
+# Perkiraan harga (USD per 1 juta token: input, output) untuk estimasi biaya di statistik run.
+# Harga bisa berubah; sesuaikan dengan halaman pricing provider. Job batch dihitung setengah harga.
+MODEL_PRICING = {
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4-vision-preview": (10.00, 30.00),
+}
+BATCH_PRICE_FACTOR = 0.5
+# Router model hemat (auto_model): model termurah dicoba dulu, naik ke model lebih kuat jika jawabannya gagal cek kualitas
+MODEL_ROUTER_COMPLETION_TOKENS = 400 # Perkiraan token jawaban untuk harga awal model sebelum ada data live
+MODEL_ROUTER_MIN_SAMPLES = 10 # Hasil per model sebelum tingkat gagal/latensi live dipakai
+MODEL_ROUTER_WINDOW = 50 # Hanya hasil terakhir per model yang dihitung agar router mengikuti perubahan selama run
+MODEL_ROUTER_EXPLORE_EVERY = 20 # Model termurah tetap dicoba sesekali walau sedang dilewati, agar statistiknya diperbarui
+MODEL_ROUTER_LATENCY_FACTOR = 2.0 # Titik mulai dilewati jika perkiraan latensinya lebih dari faktor ini x titik mulai tercepat
+# Tahap pipeline yang diukur per gambar
+STATS_STAGES = ("cache", "key_wait", "read", "encode", "api", "repair", "parse", "write", "image")
+
+
+def token_cost_usd(model_name, prompt_tokens, completion_tokens, price_factor=1.0):
+    """Perkiraan biaya (USD) dari jumlah token menurut MODEL_PRICING; model tanpa harga dihitung 0."""
+    input_price, output_price = MODEL_PRICING.get(model_name, (0.0, 0.0))
+    return ((prompt_tokens or 0) * input_price + (completion_tokens or 0) * output_price) / 1_000_000 * price_factor
+
+
+class LatencyHistogram:
+    """Histogram latensi dengan bucket geometris (1 ms sampai ~10 menit, faktor 1.25).
+
+    Memori tetap berapa pun jumlah sampel; persentil diperkirakan dari bucket (galat ~12%).
+    """
+
+    BUCKET_BOUNDS = tuple(0.001 * 1.25 ** index for index in range(61))
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKET_BOUNDS) + 1) # Bucket terakhir = +Inf
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def observe(self, seconds):
+        index = 0
+        while index < len(self.BUCKET_BOUNDS) and seconds > self.BUCKET_BOUNDS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target and bucket_count:
+                upper = self.BUCKET_BOUNDS[index] if index < len(self.BUCKET_BOUNDS) else self.maximum
+                return min(upper, self.maximum)
+        return self.maximum
+
+
+class RunStats:
+    """Statistik satu run: latensi per tahap, throughput, byte upload, retry, token dan perkiraan biaya.
+
+    Aman dipanggil dari banyak worker; snapshot() dipakai panel statistik GUI, to_json()/to_prometheus()
+    untuk ekspor di akhir run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self._started_monotonic = time.monotonic()
+        self.histograms = {stage: LatencyHistogram() for stage in STATS_STAGES}
+        self.images = {"success": 0, "failed": 0}
+        self.bytes_uploaded = 0
+        self.retries = 0
+        self.routing = {"failover": 0, "hedged": 0, "hedge_won": 0, "escalated": 0} # Request ke provider cadangan atau model lebih kuat
+        self.tokens = {} # model -> [prompt, completion]
+        self.cost_usd = {} # model -> perkiraan biaya
+
+    @contextlib.contextmanager
+    def time_stage(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.histograms[stage].observe(seconds)
+
+    def record_image(self, succeeded, seconds=None):
+        if succeeded is None: # Dilewati karena Stop
+            return
+        with self._lock:
+            self.images["success" if succeeded else "failed"] += 1
+            if seconds is not None:
+                self.histograms["image"].observe(seconds)
+
+    def record_upload(self, byte_count):
+        with self._lock:
+            self.bytes_uploaded += byte_count
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_routing(self, event):
+        """event: "failover" (semua kunci utama diistirahatkan), "hedged" (duplikat dikirim), "hedge_won" atau
+        "escalated" (router model mengirim ulang gambar ke model yang lebih kuat)."""
+        with self._lock:
+            self.routing[event] += 1
+
+    def record_tokens(self, model_name, prompt_tokens, completion_tokens, price_factor=1.0):
+        cost = token_cost_usd(model_name, prompt_tokens, completion_tokens, price_factor)
+        with self._lock:
+            model_tokens = self.tokens.setdefault(model_name, [0, 0])
+            model_tokens[0] += prompt_tokens or 0
+            model_tokens[1] += completion_tokens or 0
+            self.cost_usd[model_name] = self.cost_usd.get(model_name, 0.0) + cost
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = max(time.monotonic() - self._started_monotonic, 1e-9)
+            completed = self.images["success"] + self.images["failed"]
+            return {
+                "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+                "elapsed_seconds": round(elapsed, 3),
+                "images": dict(self.images),
+                "images_per_minute": round(completed / elapsed * 60, 2),
+                "bytes_uploaded": self.bytes_uploaded,
+                "retries": self.retries,
+                "routing": dict(self.routing),
+                "stages": {
+                    stage: {
+                        "count": histogram.count,
+                        "sum_seconds": round(histogram.total, 4),
+                        "p50": round(histogram.percentile(0.50), 4),
+                        "p95": round(histogram.percentile(0.95), 4),
+                        "p99": round(histogram.percentile(0.99), 4),
+                        "max": round(histogram.maximum, 4),
+                    }
+                    for stage, histogram in self.histograms.items()
+                    if histogram.count
+                },
+                "tokens": {model: {"prompt": counts[0], "completion": counts[1]} for model, counts in self.tokens.items()},
+                "estimated_cost_usd": {model: round(cost, 6) for model, cost in self.cost_usd.items()},
+            }
+
+    def summary_text(self):
+        """Ringkasan singkat satu-dua baris untuk panel statistik dan log akhir run."""
+        snapshot = self.snapshot()
+        stages = snapshot["stages"]
+        parts = [f"{snapshot['images_per_minute']:.1f} gambar/menit"]
+        for stage in ("api", "write"):
+            if stage in stages:
+                parts.append(f"{stage} p50/p95/p99 {stages[stage]['p50']:.2f}/{stages[stage]['p95']:.2f}/{stages[stage]['p99']:.2f} s")
+        prompt_tokens = sum(tokens["prompt"] for tokens in snapshot["tokens"].values())
+        completion_tokens = sum(tokens["completion"] for tokens in snapshot["tokens"].values())
+        parts.append(f"upload {snapshot['bytes_uploaded'] / (1024 * 1024):.1f} MB")
+        parts.append(f"retry {snapshot['retries']}")
+        routing = snapshot["routing"]
+        if routing["failover"] or routing["hedged"]:
+            parts.append(f"failover {routing['failover']}, hedge {routing['hedged']} (menang {routing['hedge_won']})")
+        if routing["escalated"]:
+            parts.append(f"eskalasi model {routing['escalated']}")
+        parts.append(f"token {prompt_tokens}+{completion_tokens}")
+        parts.append(f"biaya ~${sum(snapshot['estimated_cost_usd'].values()):.4f}")
+        return " | ".join(parts)
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2, ensure_ascii=False)
+
+    def to_prometheus(self, prefix="stock_metadata"):
+        """Format teks eksposisi Prometheus (mis. untuk node_exporter textfile collector)."""
+        def label_value(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+        lines = []
+        with self._lock:
+            elapsed = max(time.monotonic() - self._started_monotonic, 1e-9)
+            lines.append(f"# HELP {prefix}_stage_seconds Latensi per tahap pipeline per gambar.")
+            lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+            for stage, histogram in self.histograms.items():
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.BUCKET_BOUNDS, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            lines.append(f"# TYPE {prefix}_images_total counter")
+            for result, count in self.images.items():
+                lines.append(f'{prefix}_images_total{{result="{result}"}} {count}')
+            lines.append(f"# TYPE {prefix}_images_per_minute gauge")
+            lines.append(f"{prefix}_images_per_minute {sum(self.images.values()) / elapsed * 60:.4f}")
+            lines.append(f"# TYPE {prefix}_upload_bytes_total counter")
+            lines.append(f"{prefix}_upload_bytes_total {self.bytes_uploaded}")
+            lines.append(f"# TYPE {prefix}_retries_total counter")
+            lines.append(f"{prefix}_retries_total {self.retries}")
+            lines.append(f"# TYPE {prefix}_routing_total counter")
+            for event, count in self.routing.items():
+                lines.append(f'{prefix}_routing_total{{event="{event}"}} {count}')
+            lines.append(f"# TYPE {prefix}_tokens_total counter")
+            for model, (prompt_tokens, completion_tokens) in self.tokens.items():
+                lines.append(f'{prefix}_tokens_total{{model="{label_value(model)}",type="prompt"}} {prompt_tokens}')
+                lines.append(f'{prefix}_tokens_total{{model="{label_value(model)}",type="completion"}} {completion_tokens}')
+            lines.append(f"# TYPE {prefix}_estimated_cost_usd gauge")
+            for model, cost in self.cost_usd.items():
+                lines.append(f'{prefix}_estimated_cost_usd{{model="{label_value(model)}"}} {cost:.6f}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Menulis statistik ke path: format Prometheus jika berakhiran .prom, selain itu JSON."""
+        content = self.to_prometheus() if path.lower().endswith(".prom") else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+class ModelEscalation(Exception):
+    """Jawaban model router tetap gagal cek kualitas setelah perbaikan; gambar dikirim ulang ke model_name."""
+
+    def __init__(self, model_name, problems):
+        super().__init__(f"jawaban tidak lolos cek kualitas ({'; '.join(problems)}); naik ke model '{model_name}'")
+        self.model_name = model_name
+
+
+def model_request_price(model_name):
+    """Harga daftar satu request satu gambar (USD), dipakai sebelum ada biaya live; None jika model tanpa harga."""
+    if model_name not in MODEL_PRICING:
+        return None
+    return token_cost_usd(model_name, ESTIMATED_TOKENS_PER_REQUEST, MODEL_ROUTER_COMPLETION_TOKENS)
+
+
+def build_model_ladder(provider, model_name):
+    """Tangga model router: model provider yang lebih murah dari model_name, termurah dulu, diakhiri model_name
+    sebagai model terkuat (batas atas biaya). Model tanpa harga dianggap paling mahal."""
+    ceiling = model_request_price(model_name)
+    known_models = GEMINI_MODELS if provider == "Gemini" else OPENAI_MODELS
+    cheaper = [
+        candidate for candidate in known_models
+        if candidate != model_name and model_request_price(candidate) is not None
+        and (ceiling is None or model_request_price(candidate) < ceiling)
+    ]
+    return sorted(cheaper, key=model_request_price) + [model_name]
+
+
+class ModelRouter:
+    """Memilih model per gambar dari tangga model satu provider (lihat build_model_ladder).
+
+    Setiap gambar dimulai dari titik tangga dengan perkiraan biaya per jawaban diterima terendah: biaya
+    model itu ditambah peluang gagalnya dikali biaya naik ke model berikutnya. Tingkat gagal (jawaban yang
+    tetap melanggar aturan setelah perbaikan, atau error), latensi dan biaya token diukur live per model
+    dari MODEL_ROUTER_WINDOW hasil terakhir; sebelum ada cukup sampel dipakai harga daftar dan model
+    dianggap selalu berhasil. Aman dipanggil dari banyak worker.
+    """
+
+    def __init__(self, provider, models):
+        self.provider = provider
+        self.models = list(models)
+        self._lock = threading.Lock()
+        self._outcomes = {model: collections.deque(maxlen=MODEL_ROUTER_WINDOW) for model in self.models} # True = diterima
+        self._latencies = {model: collections.deque(maxlen=MODEL_ROUTER_WINDOW) for model in self.models}
+        self._costs = {model: collections.deque(maxlen=MODEL_ROUTER_WINDOW) for model in self.models}
+        self._totals = {model: [0, 0] for model in self.models} # model -> [request, ditolak] sepanjang run
+        self._picks = 0
+
+    def first_model(self):
+        """Model untuk percobaan pertama gambar berikutnya."""
+        with self._lock:
+            self._picks += 1
+            if len(self.models) > 1 and self._picks % MODEL_ROUTER_EXPLORE_EVERY == 0:
+                return self.models[0]
+            return self.models[self._best_start()]
+
+    def next_model(self, model_name):
+        """Model yang lebih kuat berikutnya di tangga, atau None jika model_name sudah yang terkuat."""
+        if model_name not in self.models:
+            return None
+        index = self.models.index(model_name) + 1
+        return self.models[index] if index < len(self.models) else None
+
+    def record_result(self, model_name, accepted, prompt_tokens=0, completion_tokens=0):
+        """Mencatat satu jawaban model (accepted = lolos cek kualitas) beserta biaya tokennya."""
+        if model_name not in self._outcomes:
+            return
+        with self._lock:
+            self._outcomes[model_name].append(accepted)
+            self._costs[model_name].append(token_cost_usd(model_name, prompt_tokens, completion_tokens))
+            self._totals[model_name][0] += 1
+            self._totals[model_name][1] += not accepted
+
+    def record_error(self, model_name):
+        """Request yang gagal tanpa jawaban (bukan rate limit/kunci tidak valid) dihitung sebagai kegagalan model."""
+        if model_name not in self._outcomes:
+            return
+        with self._lock:
+            self._outcomes[model_name].append(False)
+            self._totals[model_name][0] += 1
+            self._totals[model_name][1] += 1
+
+    def observe_latency(self, model_name, seconds):
+        if model_name in self._latencies:
+            with self._lock:
+                self._latencies[model_name].append(seconds)
+
+    def _model_estimates(self, model_name):
+        """(biaya per request, peluang gagal, latensi rata-rata atau None) dari data live atau harga daftar."""
+        outcomes = self._outcomes[model_name]
+        costs = self._costs[model_name]
+        latencies = self._latencies[model_name]
+        cost = sum(costs) / len(costs) if len(costs) >= MODEL_ROUTER_MIN_SAMPLES else model_request_price(model_name) or 0.0
+        failure_rate = outcomes.count(False) / len(outcomes) if len(outcomes) >= MODEL_ROUTER_MIN_SAMPLES else 0.0
+        latency = sum(latencies) / len(latencies) if len(latencies) >= MODEL_ROUTER_MIN_SAMPLES else None
+        return cost, failure_rate, latency
+
+    def _best_start(self):
+        """Indeks titik mulai dengan perkiraan biaya per jawaban diterima terendah, di antara titik mulai yang
+        perkiraan latensinya tidak lebih dari MODEL_ROUTER_LATENCY_FACTOR x titik mulai tercepat."""
+        expected = [] # (biaya, latensi atau None) jika mulai dari indeks ini, dihitung dari model terkuat
+        next_cost, next_latency = 0.0, 0.0
+        for model_name in reversed(self.models):
+            cost, failure_rate, latency = self._model_estimates(model_name)
+            if not expected: # Model terkuat: jawabannya dipakai walau gagal cek kualitas
+                failure_rate = 0.0
+            next_cost = cost + failure_rate * next_cost
+            next_latency = None if latency is None or next_latency is None else latency + failure_rate * next_latency
+            expected.append((next_cost, next_latency))
+        expected.reverse()
+        known_latencies = [latency for _, latency in expected if latency is not None]
+        fastest = min(known_latencies) if known_latencies else None
+        candidates = [
+            index for index, (_, latency) in enumerate(expected)
+            if fastest is None or latency is None or latency <= fastest * MODEL_ROUTER_LATENCY_FACTOR
+        ]
+        return min(candidates, key=lambda index: expected[index][0])
+
+    def summary_text(self):
+        """Satu baris per model untuk log akhir run: request, tingkat tolak, latensi dan biaya rata-rata live."""
+        with self._lock:
+            lines = []
+            for model_name in self.models:
+                requests, rejected = self._totals[model_name]
+                if not requests:
+                    continue
+                latencies = self._latencies[model_name]
+                costs = self._costs[model_name]
+                latency = f"{sum(latencies) / len(latencies):.2f} s" if latencies else "-"
+                cost = f"${sum(costs) / len(costs):.5f}" if costs else "-"
+                lines.append(f"{model_name}: {requests} request, ditolak {rejected / requests * 100:.0f}%, latensi {latency}, biaya {cost}/request")
+            return lines
+
+
+class MetadataEngine:
+    """Pipeline pemrosesan tanpa UI: pencarian file, panggilan AI, parsing dan penulisan metadata.
+
+    Dipakai oleh GUI Tkinter (metanew.py) maupun CLI (main() di bawah). Semua pengaturan berupa
+    atribut biasa yang diisi sebelum run(); log dan progres dikirim lewat callback.
+    """
+
+    def __init__(self, log=None, on_progress=None):
+        self._log = log or (lambda message, level=LOG_INFO: None)
+        self.on_progress = on_progress or (lambda current_file_name=None: None)
+
+        self.gemini_api_keys = []
+        self.openai_api_keys = []
+        self.key_schedulers = {} # Satu KeyScheduler per provider, dipakai ulang antar run
+        self.key_scheduler = None
+
+        self.provider = "Gemini"
+        self.model_name = DEFAULT_MODELS["Gemini"]
+        self.worker_count = DEFAULT_WORKER_COUNT
+        self.max_in_flight_per_provider = DEFAULT_MAX_IN_FLIGHT_PER_PROVIDER
+        self.execution_mode = "threads" # Salah satu EXECUTION_MODES
+        self.async_concurrency = DEFAULT_ASYNC_CONCURRENCY # Jumlah request bersamaan di mode asyncio
+        self.images_per_request = 1 # >1 = beberapa gambar dikirim dalam satu request (maks MAX_IMAGES_PER_REQUEST)
+        self.upload_memory_budget_mb = DEFAULT_UPLOAD_MEMORY_BUDGET_MB # Batas memori payload upload per run; 0 = tanpa batas
+        self.dedupe_enabled = False # Pre-pass pHash: hanya satu gambar per cluster near-duplicate yang dikirim ke AI
+        self.dedupe_threshold = DEFAULT_DUPLICATE_THRESHOLD # Jarak Hamming maksimum (bit dari 64)
+        self.dedupe_vary_keywords = False # Acak urutan keyword (setelah 10 pertama) untuk anggota cluster
+        self.dedupe_dry_run = False # Hanya laporkan cluster dan penghematan, tanpa memproses
+        self.secondary_provider = None # Provider cadangan untuk failover/hedging; None = tanpa routing
+        self.secondary_model_name = None # None = DEFAULT_MODELS provider cadangan
+        self.hedge_percentile = 0 # Mis. 95: request yang belum dijawab setelah p95 latensi diduplikasi ke provider cadangan; 0 = mati
+        self.auto_model = False # Mulai dari model termurah provider, naik sampai model_name jika jawaban gagal cek kualitas
+        self.key_limits = {} # Per provider: {"Gemini": {"rpm": ..., "tpm": ...}}; provider yang tidak diisi memakai DEFAULT_KEY_LIMITS
+        self.upload_options = {"enabled": True, "max_long_edge": DEFAULT_UPLOAD_LONG_EDGE, "output_format": DEFAULT_UPLOAD_FORMAT}
+        self.use_result_cache = True
+        self.resume_job = True
+        self.skip_tagged_files = False
+        self.include_patterns = [] # Glob file yang diproses (kosong = semua gambar)
+        self.exclude_patterns = []
+        self.min_file_size = None # Byte; None = tanpa batas
+        self.max_file_size = None
+        self.output_mode = "exiftool"
+        self.jsonl_path = "-" # Dipakai jika output_mode == "jsonl"; "-" berarti stdout
+        self.csv_path = None # Dipakai jika output_mode == "csv"; None = ADOBE_STOCK_CSV_NAME di folder yang diproses
+        self.api_base = None # URL dasar API provider; None = endpoint resmi (diisi server tiruan saat benchmark)
+        self.result_cache_path = RESULT_CACHE_PATH
+        self.job_manifest_dir = JOB_MANIFEST_DIR
+        self.batch_state_dir = BATCH_STATE_DIR
+        self.work_queue_path = None # Jika diisi, file folder diambil dari antrean kerja bersama ini (beberapa proses/mesin)
+        self.lease_seconds = WORK_QUEUE_LEASE_SECONDS
+        self.watch_mode = False # Folder terus dipantau dan file baru diproses sampai stop()
+        self.watch_stable_seconds = WATCH_STABLE_SECONDS
+        self.watch_use_inotify = None # None = inotify di Linux; False = paksa polling (share jaringan yang diisi mesin lain)
+
+        self.total_processed_files = 0
+        self.successful_files = 0
+        self.failed_files = 0
+        self.stop_event = threading.Event()
+        self.counter_lock = threading.Lock() # Counter progres diubah dari beberapa worker sekaligus
+        self.provider_semaphores = {}
+        self.secondary_scheduler = None
+        self._secondary_route = None # (provider, model) cadangan untuk run ini, diisi _setup_routing
+        self.model_router = None # ModelRouter run ini jika auto_model aktif
+        self._route_latency = {} # (provider, model) -> LatencyHistogram latensi API, dasar ambang hedging
+        self._routing_lock = threading.Lock()
+        self._failover_active = False
+        self._hedge_executor = None # Mode threads: thread untuk request yang sedang di-hedge
+        self.exiftool_writer = ExifToolWriter() # Satu proses exiftool -stay_open untuk seluruh sesi
+        self._reported_exiftool_version = None
+        self.result_cache = None
+        self.job_manifest = None
+        self.work_queue = None
+        self._watching = False
+        self.stats = RunStats() # Diganti baru setiap run
+        self.memory_budget = MemoryBudget(0) # Diganti per run sesuai upload_memory_budget_mb
+        self.stats_export_path = None # Jika diisi, statistik ditulis ke file ini di akhir run (.prom = Prometheus, lainnya JSON)
+        self._duplicates = {} # Representatif -> anggota cluster near-duplicate yang menunggu metadatanya
+        self._cluster_metadata = {} # Representatif -> (title, description, keywords, provider, model) yang sudah ditulis
+        self._jsonl_file = None
+        self._jsonl_lock = threading.Lock()
+        self._csv_writer = None
+
+    def log_message(self, message, level=LOG_INFO):
+        """Meneruskan log ke callback; level salah satu LOG_LEVELS (respons mentah dan output exiftool = debug)."""
+        self._log(message, level)
+
+    def set_api_keys(self, keys):
+        """Mengatur ulang API Key. Mengembalikan daftar kunci yang tidak dikenali."""
+        self.gemini_api_keys, self.openai_api_keys, unknown_keys = classify_api_keys(keys)
+        self.key_schedulers = {} # Kunci berubah: klien dan bucket lama dibuang
+        for key in unknown_keys:
+            self.log_message(f"Peringatan: Kunci '{key[:10]}...' tidak dikenali sebagai Gemini atau OpenAI, atau OpenAI tidak diinstal.", LOG_WARNING)
+        return unknown_keys
+
+    def check_exiftool(self):
+        # Proses exiftool -stay_open dipakai ulang, jadi pemeriksaan berikutnya tidak menjalankan proses baru
+        location = "WSL" if self.exiftool_writer.use_wsl else "sistem"
+        try:
+            version = self.exiftool_writer.start()
+            if version != self._reported_exiftool_version: # Cukup dicatat sekali per sesi/proses exiftool
+                self.log_message(f"ExifTool {version} ditemukan dan berfungsi di {location}.")
+                self._reported_exiftool_version = version
+            return True
+        except FileNotFoundError:
+            if self.exiftool_writer.use_wsl:
+                self.log_message(f"Error: Perintah 'wsl' tidak ditemukan.", LOG_ERROR)
+                self.log_message("Harap pastikan WSL terinstal dan fitur 'Windows Subsystem for Linux' sudah diaktifkan.", LOG_ERROR)
+            else:
+                self.log_message("Error: Perintah 'exiftool' tidak ditemukan. Harap instal 'libimage-exiftool-perl'.", LOG_ERROR)
+            return False
+        except ExifToolError as e:
+            self.log_message(f"Error saat menjalankan ExifTool di {location}: {e}", LOG_ERROR)
+            self.log_message("Harap pastikan 'libimage-exiftool-perl' sudah terinstal di lingkungan WSL Anda (mis. Ubuntu).", LOG_ERROR)
+            return False
+        except Exception as e:
+            self.log_message(f"Terjadi kesalahan tak terduga saat memeriksa ExifTool di {location}: {e}", LOG_ERROR)
+            return False
+
+    def stop(self):
+        self.stop_event.set()
+
+    def close(self):
+        self.exiftool_writer.close()
+        if self.result_cache is not None:
+            self.result_cache.close()
+            self.result_cache = None
+
+    def discover_images(self, selected_file=None, selected_folder=None):
+        """Generator path gambar yang akan diproses (satu file, atau isi folder secara streaming)."""
+        if selected_file:
+            yield selected_file
+        elif selected_folder:
+            yield from iter_image_files(
+                selected_folder,
+                include_patterns=self.include_patterns,
+                exclude_patterns=self.exclude_patterns,
+                min_size=self.min_file_size,
+                max_size=self.max_file_size,
+            )
+
+    def run(self, selected_file=None, selected_folder=None):
+        """Memproses satu file atau seluruh folder. Mengembalikan ringkasan counter.
+
+        stop_event tidak di-reset di sini; pemanggil meng-clear-nya sebelum memulai run baru.
+        """
+        self.total_processed_files = 0
+        self.successful_files = 0
+        self.failed_files = 0
+        self._discovered_count = 0
+        self._skipped_count = 0
+        self.stats = RunStats()
+        self.model_router = None # Dibuat ulang oleh _setup_routing saat pool dimulai
+        self.memory_budget = MemoryBudget(max(0, int(self.upload_memory_budget_mb)) * 1024 * 1024)
+        self._open_result_cache()
+        self.on_progress()
+
+        self._watching = bool(self.watch_mode and selected_folder and not selected_file)
+        if self._watching:
+            image_paths = self._count_discovered(self._iter_watched_images(selected_folder))
+        else:
+            image_paths = self._count_discovered(self.discover_images(selected_file, selected_folder))
+        use_queue = bool(self.work_queue_path) and selected_folder and not selected_file
+        if use_queue and self._watching:
+            # Antrean mengisi dan mengklaim per batch besar, sedangkan mode watch mengalirkan file satu per satu
+            self.log_message("Antrean kerja bersama tidak dipakai dalam mode watch; hasil dicatat di manifest job.", LOG_WARNING)
+            use_queue = False
+        if use_queue:
+            image_paths = self._iter_queue_paths(selected_folder, image_paths)
+        elif selected_folder and not selected_file:
+            image_paths = self._iter_resumable_paths(selected_folder, image_paths)
+        if self.output_mode == "xmp":
+            image_paths = self._iter_writable_paths(image_paths)
+        self._duplicates = {}
+        self._cluster_metadata = {}
+        dedupe_prepass = False
+        if self.dedupe_enabled and use_queue:
+            # Anggota cluster bisa diklaim worker lain, jadi pre-pass duplikat tidak bisa dipakai bersama antrean
+            self.log_message("Deteksi duplikat tidak dipakai dalam mode antrean bersama.", LOG_WARNING)
+        elif self.dedupe_enabled and self._watching:
+            # Pre-pass duplikat membaca seluruh daftar file dulu, sedangkan daftar file mode watch tidak pernah selesai
+            self.log_message("Deteksi duplikat tidak dipakai dalam mode watch.", LOG_WARNING)
+        elif self.dedupe_enabled and selected_folder and not selected_file:
+            image_paths = self._iter_cluster_representatives(image_paths)
+            dedupe_prepass = True
+
+        try:
+            if self.dedupe_enabled and self.dedupe_dry_run:
+                if dedupe_prepass:
+                    for _ in image_paths: # Hanya pre-pass; laporan cluster ditulis ke log
+                        pass
+                else:
+                    # Tanpa pre-pass tidak ada cluster yang dilaporkan, dan menguras iterator antrean akan mengklaim file tanpa memprosesnya
+                    self.log_message("Dry-run deteksi duplikat hanya untuk folder tanpa antrean atau mode watch; tidak ada file yang diproses.", LOG_WARNING)
+            else:
+                self._open_output(selected_folder or os.path.dirname(os.path.abspath(selected_file)))
+                if self.execution_mode == "asyncio":
+                    asyncio.run(self._run_async_pool(image_paths))
+                else:
+                    self._run_pool(image_paths)
+        finally:
+            image_paths.close() # Menjalankan finally generator (flush manifest) walau proses dihentikan
+            self._close_job_manifest()
+            self._close_work_queue()
+            self._close_output()
+
+        if self.dedupe_enabled and self.dedupe_dry_run and not dedupe_prepass:
+            pass # Daftar file memang tidak dibaca; peringatan sudah ditulis di atas
+        elif self._discovered_count == 0:
+            self.log_message("Tidak ada file gambar yang ditemukan di lokasi yang dipilih.")
+        elif self._skipped_count == self._discovered_count:
+            self.log_message("Semua file di folder ini sudah selesai diproses sebelumnya.")
+        if self.stop_event.is_set():
+            self.log_message("Proses dihentikan oleh pengguna.")
+        self._report_stats()
+        return self.summary()
+
+    def _iter_watched_images(self, folder):
+        """Sumber file mode watch: gambar yang sudah ada lebih dulu (yang selesai dilewati manifest job),
+        lalu file baru segera setelah penulisannya selesai, sampai stop()."""
+        watcher = FolderWatcher(
+            folder,
+            self.stop_event,
+            include_patterns=self.include_patterns,
+            exclude_patterns=self.exclude_patterns,
+            min_size=self.min_file_size,
+            max_size=self.max_file_size,
+            stable_seconds=self.watch_stable_seconds,
+            use_inotify=self.watch_use_inotify,
+            log=self.log_message,
+        )
+        for image_path in watcher.iter_paths():
+            self.log_message(f"File siap diproses: {os.path.basename(image_path)}", LOG_DEBUG)
+            yield image_path
+
+    def _report_stats(self):
+        self.log_message(f"Statistik: {self.stats.summary_text()}")
+        if self.model_router is not None:
+            for line in self.model_router.summary_text():
+                self.log_message(f"Router model - {line}")
+        if self.stats_export_path:
+            try:
+                self.stats.export(self.stats_export_path)
+                self.log_message(f"Statistik run disimpan ke {self.stats_export_path}")
+            except OSError as e:
+                self.log_message(f"Gagal menyimpan statistik ke {self.stats_export_path}: {e}", LOG_WARNING)
+
+    def _count_discovered(self, image_paths):
+        for image_path in image_paths:
+            self._discovered_count += 1
+            yield image_path
+
+    def summary(self):
+        return {
+            "processed": self.total_processed_files,
+            "successful": self.successful_files,
+            "failed": self.failed_files,
+            "stopped": self.stop_event.is_set(),
+        }
+
+    def _run_pool(self, image_paths):
+        selected_provider = self.provider
+        selected_model_name = self.model_name
+        self.key_scheduler = self._get_key_scheduler(selected_provider)
+        self._setup_routing(selected_provider, selected_model_name)
+
+        worker_count = min(MAX_WORKER_COUNT, max(1, int(self.worker_count)))
+        in_flight_cap = min(MAX_WORKER_COUNT, max(1, int(self.max_in_flight_per_provider)))
+        # Satu semaphore per provider agar jumlah request aktif ke satu API tetap terbatas
+        self.provider_semaphores = {
+            "Gemini": threading.BoundedSemaphore(in_flight_cap),
+            "OpenAI": threading.BoundedSemaphore(in_flight_cap),
+        }
+        self.log_message(f"Menjalankan {worker_count} worker paralel (maks {in_flight_cap} request aktif per provider).")
+        if self.upload_options.get("enabled"):
+            self.log_message(f"Gambar diperkecil ke sisi terpanjang {self.upload_options['max_long_edge']}px ({self.upload_options['output_format']}) sebelum upload.")
+        group_size = self._get_images_per_request()
+
+        # Dengan hedging, request utama dan duplikatnya berjalan di sini agar worker bisa menunggu yang lebih dulu selesai
+        self._hedge_executor = ThreadPoolExecutor(max_workers=worker_count * 3, thread_name_prefix="metadata-hedge") if self._hedging_enabled() else None
+
+        # Hanya N gambar (atau N grup gambar) yang diantrekan sekaligus supaya Stop tetap responsif
+        path_iter = iter(image_paths)
+        pending = set()
+        with ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix="metadata-worker") as executor, self._hedge_executor or contextlib.nullcontext():
+            while True:
+                while len(pending) < worker_count and not self.stop_event.is_set():
+                    group = self._next_image_group(path_iter, group_size)
+                    if not group:
+                        break
+                    # Dikirim hanya saat ada worker kosong, jadi waktu di worker = waktu proses gambar
+                    pending.add(executor.submit(self._process_and_record_group, group, selected_provider, selected_model_name))
+
+                if not pending:
+                    break
+
+                _, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    def _process_and_record_group(self, group, selected_provider, selected_model_name):
+        """Memproses satu grup lalu langsung mencatat hasilnya (manifest/antrean kerja, statistik) di thread worker.
+
+        Hasil tidak menunggu thread utama, yang bisa sedang tertahan menunggu path berikutnya
+        (mis. antrean kerja yang menunggu lease worker lain).
+        """
+        started = time.perf_counter()
+        try:
+            results = self._process_image_group(group, selected_provider, selected_model_name)
+        except Exception as e:
+            self.log_message(f"Worker berhenti dengan error tak terduga: {e}", LOG_ERROR)
+            for image_path in group:
+                self._record_job_state(image_path, False, str(e))
+                self.stats.record_image(False)
+            return
+        for image_path, succeeded in results:
+            self._record_job_state(image_path, succeeded)
+            self.stats.record_image(succeeded, time.perf_counter() - started)
+
+    def _get_images_per_request(self):
+        group_size = min(MAX_IMAGES_PER_REQUEST, max(1, int(self.images_per_request)))
+        if group_size > 1 and self._watching:
+            self.log_message("Mode watch: satu gambar per request agar file baru tidak menunggu grupnya penuh.")
+            return 1
+        if group_size > 1:
+            self.log_message(f"Mengirim hingga {group_size} gambar per request; hasil yang tidak valid dikirim ulang satu per satu.")
+            if not self.upload_options.get("enabled"):
+                self.log_message("Peringatan: gambar tidak diperkecil, request multi-gambar bisa sangat besar.", LOG_WARNING)
+        return group_size
+
+    @staticmethod
+    def _next_image_group(path_iter, group_size):
+        """Mengambil hingga group_size path berikutnya dari iterator (list kosong jika sudah habis)."""
+        group = []
+        while len(group) < group_size:
+            image_path = next(path_iter, None)
+            if image_path is None:
+                break
+            group.append(image_path)
+        return group
+
+    def run_batch(self, selected_folder, api_base=None, poll_interval=BATCH_POLL_INTERVAL_SECONDS):
+        """Mode batch offline: mengirim gambar folder sebagai job batch, menunggu selesai, lalu menulis metadata.
+
+        Job yang sudah dikirim disimpan di BatchJobStore; memanggil run_batch lagi untuk folder yang sama
+        melanjutkan polling job tersebut dan hanya mengirim file yang belum pernah masuk job.
+        Jawaban divalidasi dengan aturan yang sama seperti mode biasa, tetapi tanpa putaran perbaikan: jawaban
+        yang melanggar aturan tetap ditulis dengan peringatan di log.
+        api_base mengganti endpoint provider (mis. server lokal untuk pengujian); default self.api_base.
+        """
+        api_base = api_base or self.api_base
+        self.total_processed_files = 0
+        self.successful_files = 0
+        self.failed_files = 0
+        self._discovered_count = 0
+        self._skipped_count = 0
+        self.stats = RunStats()
+        self.model_router = None # Job batch memakai satu model; router hanya untuk mode biasa
+        self._open_result_cache()
+        self.on_progress()
+
+        store = BatchJobStore(selected_folder, self.batch_state_dir)
+        batch_clients = {}
+        try:
+            self._open_output(selected_folder)
+            open_paths = store.open_paths()
+            if open_paths:
+                self.log_message(f"Melanjutkan {len(store.open_batches())} job batch yang sudah dikirim ({len(open_paths)} file).")
+            self._submit_batches(selected_folder, store, batch_clients, api_base, open_paths)
+            self._poll_batches(store, batch_clients, api_base, poll_interval)
+        except Exception as e:
+            self.log_message(f"Mode batch berhenti karena error: {e}", LOG_ERROR)
+        finally:
+            store.close()
+            self._close_job_manifest()
+            self._close_output()
+
+        if self.stop_event.is_set():
+            self.log_message("Proses dihentikan. Job batch yang sudah dikirim tetap berjalan dan akan dilanjutkan pada run berikutnya.")
+        self._report_stats()
+        return self.summary()
+
+    def _get_batch_client(self, batch_clients, provider, model_name, api_base):
+        client = batch_clients.get((provider, model_name))
+        if client is None:
+            keys = self.gemini_api_keys if provider == "Gemini" else self.openai_api_keys
+            if not keys:
+                raise BatchError(f"Tidak ada API Key {provider} untuk mode batch.")
+            # Job batch tidak memakai kuota RPM interaktif, jadi cukup kunci pertama
+            client = BATCH_CLIENTS[provider](keys[0], model_name, api_base)
+            batch_clients[(provider, model_name)] = client
+        return client
+
+    def _submit_batches(self, folder, store, batch_clients, api_base, open_paths):
+        provider, model_name = self.provider, self.model_name
+        client = self._get_batch_client(batch_clients, provider, model_name, api_base)
+        limits = BATCH_LIMITS[provider]
+        requests, items, request_bytes = [], [], 0
+
+        def flush():
+            display_name = f"adobe-stock-metadata-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{len(store.open_batches()) + 1}"
+            try:
+                remote_id = client.submit(requests, display_name)
+            except Exception as e:
+                self.log_message(f"Gagal mengirim job batch ({len(items)} file): {e}", LOG_ERROR)
+                for _, image_path, _ in items:
+                    self._fail_file(image_path, str(e))
+                return
+            store.add_batch(remote_id, provider, model_name, items)
+            self.log_message(f"Job batch {remote_id} dikirim ke {provider} '{model_name}' berisi {len(items)} gambar.")
+
+        image_paths = self._iter_resumable_paths(folder, self._count_discovered(self.discover_images(None, folder)))
+        if self.output_mode == "xmp":
+            image_paths = self._iter_writable_paths(image_paths)
+        try:
+            for image_path in image_paths:
+                if self.stop_event.is_set():
+                    break
+                if os.path.normcase(os.path.abspath(image_path)) in open_paths:
+                    continue # Sudah ada di job yang sedang berjalan
+                cache_key, cached, _ = self._lookup_cache(image_path, [(provider, model_name)])
+                if cached is not None:
+                    self.log_message(f"Cache hit untuk {os.path.basename(image_path)}, tidak dimasukkan ke job batch.")
+                    self._apply_batch_result(image_path, provider, model_name, cached, None, (0, 0, 0), None)
+                    continue
+                try:
+                    payload = self._prepare_image_payload(image_path)
+                except OSError as e:
+                    self.log_message(f"Gagal membaca {os.path.basename(image_path)}: {e}", LOG_WARNING)
+                    self._fail_file(image_path, str(e))
+                    continue
+                try:
+                    mime_type, encoded_image = payload.mime_type, payload.base64_text()
+                finally:
+                    payload.close()
+                self.stats.record_upload(len(encoded_image))
+                if requests and (len(requests) >= limits["max_requests"] or request_bytes + len(encoded_image) > limits["max_bytes"]):
+                    flush()
+                    requests, items, request_bytes = [], [], 0
+                custom_id = str(len(items))
+                requests.append(client.build_request(custom_id, mime_type, encoded_image))
+                items.append((custom_id, image_path, cache_key))
+                request_bytes += len(encoded_image)
+            if requests and not self.stop_event.is_set():
+                flush()
+        finally:
+            image_paths.close()
+
+    def _poll_batches(self, store, batch_clients, api_base, poll_interval):
+        while not self.stop_event.is_set():
+            open_batches = store.open_batches()
+            if not open_batches:
+                return
+            for remote_id, provider, model_name in open_batches:
+                client = self._get_batch_client(batch_clients, provider, model_name, api_base)
+                try:
+                    status, remote_status = client.poll(remote_id)
+                except Exception as e:
+                    self.log_message(f"Gagal memeriksa status job {remote_id}: {e}", LOG_WARNING)
+                    continue
+                store.set_remote_status(remote_id, remote_status)
+                if status == client.RUNNING:
+                    self.log_message(f"Job batch {remote_id}: {remote_status}")
+                    continue
+                self._apply_batch(store, client, remote_id, provider, model_name, status)
+            if store.open_batches():
+                self.stop_event.wait(poll_interval)
+
+    def _apply_batch(self, store, client, remote_id, provider, model_name, status):
+        items = store.items(remote_id)
+        self.log_message(f"Job batch {remote_id} selesai ({status}). Menerapkan hasil untuk {len(items)} gambar...")
+        for custom_id, response_text, tokens, error in client.fetch_results(remote_id):
+            if custom_id not in items:
+                continue
+            image_path, cache_key = items.pop(custom_id)
+            if error is not None:
+                self.log_message(f"Gagal memproses {os.path.basename(image_path)} di job batch: {error}", LOG_ERROR)
+                self._fail_file(image_path, error)
+                continue
+            try:
+                metadata = parse_metadata_response(response_text)
+            except json.JSONDecodeError as jde:
+                self.log_message(f"Error parsing JSON dari {provider}: {jde}. Respon mentah: {response_text}", LOG_ERROR)
+                self._fail_file(image_path, f"Gagal parsing JSON dari {provider}.")
+                continue
+            if not isinstance(metadata, dict):
+                self.log_message(f"Jawaban {provider} untuk {os.path.basename(image_path)} bukan objek JSON: {response_text}", LOG_ERROR)
+                self._fail_file(image_path, f"Jawaban {provider} bukan objek JSON.")
+                continue
+            problems = validate_metadata(metadata)
+            if isinstance(metadata.get("keywords"), list):
+                metadata["keywords"] = ", ".join(split_keywords(metadata["keywords"]))
+            if problems:
+                # Job batch tidak punya putaran perbaikan; seperti mode biasa setelah perbaikan gagal, jawaban tetap dipakai
+                self.log_message(f"Metadata {os.path.basename(image_path)} tetap dipakai walau tidak sesuai aturan: {'; '.join(problems)}", LOG_WARNING)
+            self._apply_batch_result(image_path, provider, model_name, metadata, cache_key, tokens, remote_id)
+        # File tanpa hasil (job gagal/expired sebelum diproses) ditandai gagal agar dikirim ulang nanti
+        for image_path, _ in items.values():
+            self.log_message(f"Tidak ada hasil untuk {os.path.basename(image_path)} di job {remote_id}.", LOG_WARNING)
+            self._fail_file(image_path, f"Tidak ada hasil di job batch {remote_id}")
+        store.finish(remote_id, BatchJobStore.APPLIED if status == client.SUCCEEDED else BatchJobStore.FAILED)
+
+    def _fail_file(self, image_path, error):
+        """Mencatat file yang gagal di luar alur proses per gambar (mode batch, exiftool tidak tersedia)."""
+        self.stats.record_image(False)
+        with self.counter_lock:
+            self.total_processed_files += 1
+        self._increment_counter("failed_files")
+        self._record_job_state(image_path, False, error)
+
+    def _apply_batch_result(self, image_path, provider, model_name, metadata, cache_key, tokens, remote_id):
+        file_name_only = os.path.basename(image_path)
+        with self.counter_lock:
+            self.total_processed_files += 1
+        self.on_progress(current_file_name=file_name_only)
+        title = metadata.get('title', 'Untitled')
+        description = metadata.get('description', 'No description available.')
+        keywords = metadata.get('keywords', '')
+        if remote_id is not None:
+            self.log_message(f"AI Metadata ({file_name_only}) - Title: {title}", LOG_DEBUG)
+        if remote_id is not None:
+            self.stats.record_tokens(model_name, tokens[0], tokens[1], BATCH_PRICE_FACTOR)
+        if cache_key is not None and self.result_cache is not None:
+            self._store_in_cache(image_path, cache_key, metadata, tokens)
+        try:
+            self._write_metadata(image_path, title, description, keywords)
+        except Exception as e:
+            self.log_message(f"Gagal memproses {file_name_only}: {e}", LOG_ERROR)
+            self._increment_counter("failed_files")
+            self._record_job_state(image_path, False, str(e))
+            self.stats.record_image(False)
+            return
+        self._remember_written_file(image_path, provider, model_name, metadata, tokens)
+        self._increment_counter("successful_files")
+        self._record_job_state(image_path, True)
+        self.stats.record_image(True)
+
+    async def _run_async_pool(self, image_paths):
+        """Menjalankan gambar di satu event loop asyncio dengan async_concurrency request bersamaan."""
+        selected_provider = self.provider
+        selected_model_name = self.model_name
+        self.key_scheduler = self._get_key_scheduler(selected_provider)
+        self._setup_routing(selected_provider, selected_model_name)
+        concurrency = min(MAX_ASYNC_CONCURRENCY, max(1, int(self.async_concurrency)))
+        self.log_message(f"Menjalankan mode asyncio dengan maks {concurrency} request bersamaan.")
+        if self.upload_options.get("enabled"):
+            self.log_message(f"Gambar diperkecil ke sisi terpanjang {self.upload_options['max_long_edge']}px ({self.upload_options['output_format']}) sebelum upload.")
+        group_size = self._get_images_per_request()
+
+        loop = asyncio.get_running_loop()
+        # Baca file, Pillow, hashing dan exiftool tetap blocking; dijalankan di thread pool kecil terpisah
+        io_executor = ThreadPoolExecutor(max_workers=min(MAX_WORKER_COUNT, (os.cpu_count() or 1) + 4), thread_name_prefix="metadata-io")
+        async_clients = {} # (provider, indeks kunci, model) -> klien async, hanya berlaku di event loop ini
+        path_iter = iter(image_paths)
+        path_lock = asyncio.Lock()
+
+        async def worker():
+            while not self.stop_event.is_set():
+                # Pencarian file ikut blocking (scandir, manifest), jadi diambil lewat executor satu per satu
+                async with path_lock:
+                    group = await loop.run_in_executor(io_executor, self._next_image_group, path_iter, group_size)
+                if not group:
+                    return
+                started = time.perf_counter()
+                try:
+                    results = await self._process_image_group_async(group, selected_provider, selected_model_name, io_executor, async_clients)
+                except Exception as e:
+                    self.log_message(f"Worker berhenti dengan error tak terduga: {e}", LOG_ERROR)
+                    for image_path in group:
+                        self._record_job_state(image_path, False, str(e))
+                        self.stats.record_image(False)
+                else:
+                    for image_path, succeeded in results:
+                        self._record_job_state(image_path, succeeded)
+                        self.stats.record_image(succeeded, time.perf_counter() - started)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        finally:
+            for (client_provider, _, _), ai_client in async_clients.items():
+                if client_provider == "Gemini":
+                    # GenerativeModel tidak punya close() publik; transport gRPC internalnya ditutup hanya jika
+                    # atribut itu masih ada di versi SDK yang terpasang, selain itu dibiarkan ditutup SDK sendiri
+                    transport = getattr(getattr(ai_client, "_async_client", None), "transport", None)
+                    close = getattr(transport, "close", None)
+                else:
+                    close = getattr(ai_client, "close", None)
+                if close is None:
+                    self.log_message(f"Klien async {client_provider} tanpa close(); koneksinya ditutup oleh SDK.", LOG_DEBUG)
+                    continue
+                try:
+                    await close()
+                except Exception as e:
+                    self.log_message(f"Gagal menutup klien async {client_provider}: {e}", LOG_DEBUG)
+            io_executor.shutdown(wait=True)
+
+    def _open_result_cache(self):
+        if not self.use_result_cache:
+            if self.result_cache is not None:
+                self.result_cache.close()
+            self.result_cache = None
+            return
+        if self.result_cache is None:
+            try:
+                self.result_cache = MetadataCache(self.result_cache_path)
+            except (OSError, sqlite3.Error) as e:
+                self.log_message(f"Cache hasil AI tidak bisa dibuka, proses berjalan tanpa cache: {e}", LOG_WARNING)
+                return
+        self.result_cache.reset_stats()
+
+    def _get_key_scheduler(self, provider):
+        """Mengembalikan KeyScheduler untuk provider; klien per kunci dibuat sekali dan dipakai ulang antar run."""
+        keys = self.gemini_api_keys if provider == "Gemini" else self.openai_api_keys
+        if provider == "OpenAI" and not OPENAI_AVAILABLE:
+            keys = []
+        if not keys:
+            return None
+
+        # Kuota per provider: provider cadangan tidak mewarisi RPM/TPM provider utama
+        limits = (self.key_limits or {}).get(provider) or DEFAULT_KEY_LIMITS[provider]
+        rpm = max(1, int(limits["rpm"]))
+        tpm = max(1000, int(limits["tpm"]))
+
+        scheduler = self.key_schedulers.get(provider)
+        if scheduler is None or scheduler.api_base != self.api_base:
+            scheduler = KeyScheduler(provider, keys, rpm, tpm, self.api_base)
+            self.key_schedulers[provider] = scheduler
+        else:
+            scheduler.set_limits(rpm, tpm)
+        self.log_message(f"Scheduler {provider}: {len(keys)} kunci, masing-masing {rpm} RPM / {tpm} TPM.")
+        return scheduler
+
+    def _setup_routing(self, provider, model_name):
+        """Menyiapkan provider cadangan run ini: failover saat semua kunci utama diistirahatkan, dan hedging
+        jika hedge_percentile diisi. Tanpa secondary_provider (atau tanpa kuncinya) routing tidak aktif."""
+        self.secondary_scheduler = None
+        self._secondary_route = None
+        self._route_latency = {}
+        self._failover_active = False
+        self._setup_model_router(provider, model_name)
+        if not self.secondary_provider:
+            return
+        secondary_model_name = self.secondary_model_name or DEFAULT_MODELS[self.secondary_provider]
+        if (self.secondary_provider, secondary_model_name) == (provider, model_name):
+            self.log_message("Provider/model cadangan sama dengan yang utama; failover dan hedging tidak aktif.", LOG_WARNING)
+            return
+        self.secondary_scheduler = self._get_key_scheduler(self.secondary_provider)
+        if self.secondary_scheduler is None:
+            self.log_message(f"Tidak ada API Key {self.secondary_provider} untuk provider cadangan; failover dan hedging tidak aktif.", LOG_WARNING)
+            return
+        self._secondary_route = (self.secondary_provider, secondary_model_name)
+        self.log_message(f"Provider cadangan: {self.secondary_provider} '{secondary_model_name}' (dipakai saat semua kunci {provider} diistirahatkan).")
+        if self._hedging_enabled():
+            self.log_message(f"Hedging aktif: request yang belum dijawab setelah p{self.hedge_percentile:g} latensi {provider} diduplikasi ke provider cadangan.")
+
+    def _setup_model_router(self, provider, model_name):
+        self.model_router = None
+        if not self.auto_model:
+            return
+        ladder = build_model_ladder(provider, model_name)
+        if len(ladder) < 2:
+            self.log_message(f"Router model tidak aktif: '{model_name}' sudah model {provider} termurah.", LOG_WARNING)
+            return
+        self.model_router = ModelRouter(provider, ladder)
+        self.log_message(f"Router model: mulai dari model termurah, naik jika jawaban gagal cek kualitas ({' -> '.join(ladder)}).")
+
+    def _first_model(self, provider, model_name):
+        """Model percobaan pertama untuk gambar/grup berikutnya: pilihan router jika aktif, selain itu model_name."""
+        if self.model_router is None or provider != self.model_router.provider:
+            return model_name
+        return self.model_router.first_model()
+
+    def _hedging_enabled(self):
+        return bool(self.hedge_percentile) and self._secondary_route is not None
+
+    def _scheduler_for(self, key_state):
+        return self.key_schedulers[key_state.provider]
+
+    def _check_route_available(self, provider):
+        if self.key_scheduler is None and self._secondary_route is None:
+            raise Exception(f"Tidak ada API Key valid untuk provider {provider} yang dapat digunakan.")
+
+    def _try_acquire_route(self, provider, model_name, estimated_tokens):
+        """Satu percobaan tanpa menunggu: kunci provider utama, atau kunci provider cadangan jika semua kunci
+        utama sedang diistirahatkan (bukan sekadar bucket RPM/TPM penuh).
+
+        Mengembalikan ((provider, model), ApiKeyState) atau (None, detik sampai layak dicoba lagi).
+        """
+        wait_seconds = 1.0
+        if self.key_scheduler is not None:
+            key_state, wait_seconds = self.key_scheduler.try_acquire(estimated_tokens)
+            if key_state is not None:
+                if self._failover_active:
+                    self._failover_active = False
+                    self.log_message(f"Kunci {provider} tersedia lagi; request kembali ke provider utama.")
+                return (provider, model_name), key_state
+        if self._secondary_route is None or (self.key_scheduler is not None and not self.key_scheduler.all_benched()):
+            return None, wait_seconds
+
+        key_state, secondary_wait = self.secondary_scheduler.try_acquire(estimated_tokens)
+        if key_state is None:
+            return None, min(wait_seconds, secondary_wait)
+        if not self._failover_active and self.key_scheduler is not None:
+            self._failover_active = True
+            self.log_message(f"Semua kunci {provider} sedang diistirahatkan; request dialihkan ke {self._secondary_route[0]} '{self._secondary_route[1]}'.", LOG_WARNING)
+        self.stats.record_routing("failover")
+        return self._secondary_route, key_state
+
+    def _observe_route_latency(self, route, seconds):
+        with self._routing_lock:
+            self._route_latency.setdefault(route, LatencyHistogram()).observe(seconds)
+        if self.model_router is not None and route[0] == self.model_router.provider:
+            self.model_router.observe_latency(route[1], seconds)
+
+    def _hedge_delay(self, route):
+        """Detik sebelum request ke route diduplikasi ke provider cadangan, atau None jika tidak di-hedge
+        (hedging mati, route sudah provider cadangan, sampel latensi belum cukup, atau jatah hedging habis)."""
+        if not self._hedging_enabled() or route == self._secondary_route:
+            return None
+        with self._routing_lock:
+            histogram = self._route_latency.get(route)
+            if histogram is None or histogram.count < HEDGE_MIN_SAMPLES:
+                return None
+            if self.stats.routing["hedged"] >= histogram.count * HEDGE_MAX_RATIO:
+                return None
+            return histogram.percentile(min(float(self.hedge_percentile), 99.9) / 100)
+
+    def _iter_resumable_paths(self, folder, image_paths):
+        """Membuka manifest job folder dan melewati file yang sudah selesai (atau sudah bertag jika diminta).
+
+        Berupa generator agar file pertama bisa langsung diproses selagi folder masih ditelusuri.
+        """
+        try:
+            self.job_manifest = JobManifest(folder, self.job_manifest_dir)
+        except (OSError, sqlite3.Error) as e:
+            self.log_message(f"Manifest job tidak bisa dibuka, proses berjalan tanpa resume: {e}", LOG_WARNING)
+            self.job_manifest = None
+            yield from image_paths
+            return
+
+        if not self.resume_job:
+            self.job_manifest.reset()
+
+        tagged_keys = set()
+        if self.skip_tagged_files:
+            # Satu panggilan exiftool untuk seluruh folder; ini satu-satunya langkah yang menunggu sebelum file pertama
+            self.log_message("Memeriksa XMP Title/Subject yang sudah ada (satu kali panggilan exiftool)...")
+            try:
+                tagged_keys = self.exiftool_writer.find_tagged_files(folder)
+            except Exception as e:
+                self.log_message(f"Pra-pemindaian metadata gagal, semua file akan diproses: {e}", LOG_WARNING)
+
+        pending_batch = []
+        resumed_count = 0
+        tagged_count = 0
+        try:
+            for image_path in image_paths:
+                if self.job_manifest.is_done(image_path):
+                    resumed_count += 1
+                    self._skipped_count += 1
+                    continue
+                if tagged_keys and self.exiftool_writer.path_key(image_path) in tagged_keys:
+                    self.job_manifest.mark(image_path, JobManifest.DONE)
+                    tagged_count += 1
+                    self._skipped_count += 1
+                    continue
+                pending_batch.append(image_path)
+                if len(pending_batch) >= MANIFEST_PENDING_FLUSH_EVERY:
+                    self.job_manifest.add_pending(pending_batch)
+                    pending_batch = []
+                yield image_path
+        finally:
+            if pending_batch:
+                self.job_manifest.add_pending(pending_batch)
+            if resumed_count:
+                self.log_message(f"Resume: {resumed_count} file sudah selesai pada run sebelumnya dan dilewati.")
+            if tagged_count:
+                self.log_message(f"{tagged_count} file sudah memiliki Title/Keywords dan dilewati.")
+
+    def _iter_queue_paths(self, folder, image_paths):
+        """Mengambil file dari antrean kerja bersama (WorkQueue) alih-alih langsung dari penelusuran folder.
+
+        Hasil penelusuran hanya dipakai mengisi antrean (idempoten, jadi setiap worker boleh ikut mengisi);
+        yang diproses adalah file yang berhasil diklaim proses ini. Generator baru selesai setelah tidak ada
+        file pending maupun lease worker lain, sehingga file milik worker yang berhenti tetap diambil alih.
+        """
+        lease_seconds = max(30, int(self.lease_seconds))
+        try:
+            self.work_queue = WorkQueue(self.work_queue_path, folder)
+            requeued = self.work_queue.start_run(requeue_all=not self.resume_job)
+        except (OSError, sqlite3.Error) as e:
+            self.log_message(f"Antrean kerja {self.work_queue_path} tidak bisa dibuka: {e}", LOG_ERROR)
+            self.work_queue = None
+            return
+        self.log_message(f"Bergabung ke antrean kerja {self.work_queue_path} sebagai worker {self.work_queue.worker_id} (lease {lease_seconds} s).")
+        if requeued:
+            self.log_message(f"{requeued} file dari run sebelumnya diantrekan ulang.")
+
+        tagged_keys = set()
+        if self.skip_tagged_files:
+            self.log_message("Memeriksa XMP Title/Subject yang sudah ada (satu kali panggilan exiftool)...")
+            try:
+                tagged_keys = self.exiftool_writer.find_tagged_files(folder)
+            except Exception as e:
+                self.log_message(f"Pra-pemindaian metadata gagal, semua file akan diproses: {e}", LOG_WARNING)
+
+        # Lease diperpanjang di thread terpisah selama proses ini hidup; worker yang crash berhenti memperpanjang
+        heartbeat_stop = threading.Event()
+
+        def heartbeat():
+            while not heartbeat_stop.wait(lease_seconds / 3):
+                try:
+                    self.work_queue.renew(lease_seconds, self.total_processed_files, self.successful_files, self.failed_files)
+                except sqlite3.Error as e:
+                    self.log_message(f"Lease antrean kerja gagal diperpanjang: {e}", LOG_WARNING)
+
+        heartbeat_thread = threading.Thread(target=heartbeat, name="work-queue-heartbeat", daemon=True)
+        heartbeat_thread.start()
+        discovered = iter(image_paths)
+        seeding = True
+        try:
+            self.work_queue.renew(lease_seconds)
+            while not self.stop_event.is_set():
+                if seeding:
+                    batch = list(itertools.islice(discovered, MANIFEST_PENDING_FLUSH_EVERY))
+                    seeding = bool(batch)
+                    tagged = {image_path for image_path in batch if tagged_keys and self.exiftool_writer.path_key(image_path) in tagged_keys}
+                    if len(batch) > len(tagged):
+                        self.work_queue.add([image_path for image_path in batch if image_path not in tagged])
+                    if tagged:
+                        self.work_queue.add(tagged, WorkQueue.DONE)
+                claimed = self.work_queue.claim(WORK_QUEUE_CLAIM_BATCH, lease_seconds)
+                if not claimed:
+                    if seeding:
+                        continue
+                    expiry = self.work_queue.next_foreign_lease_expiry()
+                    if expiry is None:
+                        break
+                    # Worker lain masih memegang file; tunggu selesai atau lease-nya kedaluwarsa lalu ambil alih
+                    self.stop_event.wait(min(WORK_QUEUE_IDLE_POLL_SECONDS, max(0.1, expiry - time.time())))
+                    continue
+                for image_path, reclaimed in claimed:
+                    if reclaimed:
+                        self.log_message(f"{os.path.basename(image_path)} ditinggalkan worker lain (lease kedaluwarsa); diproses ulang.", LOG_WARNING)
+                    yield image_path
+        except sqlite3.Error as e:
+            self.log_message(f"Antrean kerja error, worker berhenti mengambil file: {e}", LOG_ERROR)
+        finally:
+            heartbeat_stop.set()
+            heartbeat_thread.join()
+
+    def _close_work_queue(self):
+        if self.work_queue is None:
+            return
+        try:
+            released = self.work_queue.leave(self.total_processed_files, self.successful_files, self.failed_files)
+            if released:
+                self.log_message(f"{released} file yang belum diproses dikembalikan ke antrean.")
+            status = self.work_queue.status()
+            self.log_message(f"Antrean kerja: {format_queue_status(status)}")
+        except sqlite3.Error as e:
+            self.log_message(f"Gagal memperbarui antrean kerja: {e}", LOG_WARNING)
+        self.work_queue.close()
+        self.work_queue = None
+
+    def _iter_writable_paths(self, image_paths):
+        """Mode xmp: format selain JPEG/PNG tetap ditulis lewat exiftool. exiftool diperiksa sekali saat file seperti
+        itu pertama ditemukan; jika tidak tersedia, file tersebut ditandai gagal sebelum panggilan AI dibayar
+        (dan dicoba lagi pada run berikutnya)."""
+        exiftool_ready = None
+        for image_path in image_paths:
+            if os.path.splitext(image_path)[1].lower() not in NATIVE_XMP_EXTENSIONS:
+                if exiftool_ready is None:
+                    exiftool_ready = self.check_exiftool()
+                    if not exiftool_ready:
+                        self.log_message(
+                            "ExifTool tidak tersedia: file selain JPEG/PNG dilewati tanpa panggilan AI. Instal ExifTool, "
+                            "atau pakai output sidecar/CSV untuk TIFF/PSD.", LOG_WARNING
+                        )
+                if not exiftool_ready:
+                    self.log_message(f"{os.path.basename(image_path)} dilewati: ExifTool tidak tersedia untuk format ini.", LOG_WARNING)
+                    self._fail_file(image_path, "ExifTool tidak tersedia untuk menulis XMP ke format ini.")
+                    continue
+            yield image_path
+
+    def _iter_cluster_representatives(self, image_paths):
+        """Pre-pass near-duplicate: menghitung pHash semua gambar lalu hanya meneruskan representatif tiap cluster.
+
+        Anggota cluster disimpan di self._duplicates dan ditulis setelah representatifnya berhasil
+        (lihat _apply_to_duplicates). Berbeda dengan alur biasa, pre-pass ini harus membaca seluruh folder dulu.
+        """
+        paths = []
+        for image_path in image_paths:
+            if self.stop_event.is_set():
+                return
+            paths.append(image_path)
+        if not paths:
+            return
+
+        threshold = min(MAX_DUPLICATE_THRESHOLD, max(0, int(self.dedupe_threshold)))
+        self.log_message(f"Menghitung perceptual hash {len(paths)} gambar untuk deteksi duplikat (threshold {threshold} bit)...")
+        started = time.perf_counter()
+        hash_workers = min(MAX_WORKER_COUNT, (os.cpu_count() or 1) + 4)
+        with ThreadPoolExecutor(max_workers=hash_workers, thread_name_prefix="metadata-phash") as executor:
+            hashes = list(executor.map(self._safe_perceptual_hash, paths))
+        if self.stop_event.is_set():
+            return
+        clusters = cluster_near_duplicates(hashes, threshold)
+        if not NUMPY_AVAILABLE and len(paths) > 5000:
+            self.log_message("NumPy tidak terinstal; pengelompokan duplikat untuk folder besar akan lambat ('pip install numpy').", LOG_WARNING)
+
+        self._duplicates = {paths[cluster[0]]: [paths[index] for index in cluster[1:]] for cluster in clusters if len(cluster) > 1}
+        reused = sum(len(members) for members in self._duplicates.values())
+        self.log_message(
+            f"Deteksi duplikat selesai dalam {time.perf_counter() - started:.1f} s: {len(paths)} gambar -> {len(clusters)} request "
+            f"({len(self._duplicates)} cluster duplikat, {reused} gambar memakai ulang metadata, hemat {reused / len(paths) * 100:.0f}%)."
+        )
+        for representative, members in sorted(self._duplicates.items(), key=lambda item: -len(item[1])):
+            self.log_message(f"Cluster {os.path.basename(representative)}: {', '.join(os.path.basename(member) for member in members)}", LOG_DEBUG)
+        for cluster in clusters:
+            yield paths[cluster[0]]
+
+    def _safe_perceptual_hash(self, image_path):
+        if self.stop_event.is_set():
+            return None
+        try:
+            return perceptual_hash(image_path)
+        except Exception as e:
+            self.log_message(f"pHash {os.path.basename(image_path)} gagal ({e}); gambar diproses sendiri.", LOG_WARNING)
+            return None
+
+    def _apply_to_duplicates(self, results):
+        """Menulis metadata representatif ke anggota cluster-nya. Mengembalikan results ditambah hasil anggota.
+
+        Jika representatif gagal, anggota tidak ditandai di manifest sehingga diproses lagi pada run berikutnya.
+        """
+        if not self._duplicates:
+            return results
+        extended = list(results)
+        for image_path, succeeded in results:
+            members = self._duplicates.pop(image_path, None)
+            metadata = self._cluster_metadata.pop(image_path, None)
+            if not members:
+                continue
+            if not succeeded or metadata is None:
+                self.log_message(f"{os.path.basename(image_path)} tidak berhasil; {len(members)} duplikatnya ditunda ke run berikutnya.", LOG_WARNING)
+                extended += [(member, None) for member in members]
+                continue
+            for member in members:
+                extended.append((member, None if self.stop_event.is_set() else self._write_duplicate(member, image_path, metadata)))
+        return extended
+
+    def _write_duplicate(self, image_path, representative, metadata):
+        title, description, keywords, provider, model_name = metadata
+        file_name_only = os.path.basename(image_path)
+        self._start_image(image_path)
+        self.log_message(f"{file_name_only} near-duplicate dari {os.path.basename(representative)}; metadata dipakai ulang tanpa panggilan AI.")
+        if self.dedupe_vary_keywords:
+            keywords = vary_keywords(keywords, file_name_only)
+        try:
+            self._write_metadata(image_path, title, description, keywords)
+        except Exception as e:
+            self.log_message(f"Gagal memproses {file_name_only}: {e}", LOG_ERROR)
+            self._increment_counter("failed_files")
+            return False
+        self._remember_written_file(image_path, provider, model_name, {"title": title, "description": description, "keywords": keywords})
+        self._increment_counter("successful_files")
+        return True
+
+    def _record_job_state(self, image_path, succeeded, error=None):
+        if succeeded is None: # None = tidak dijalankan karena Stop
+            return
+        if self.work_queue is not None:
+            try:
+                self.work_queue.complete(image_path, succeeded, error)
+            except sqlite3.Error as e:
+                self.log_message(f"Gagal memperbarui antrean kerja untuk {os.path.basename(image_path)}: {e}", LOG_WARNING)
+            return
+        if self.job_manifest is None:
+            return
+        try:
+            self.job_manifest.mark(image_path, JobManifest.DONE if succeeded else JobManifest.FAILED, error)
+        except sqlite3.Error as e:
+            self.log_message(f"Gagal memperbarui manifest job untuk {os.path.basename(image_path)}: {e}", LOG_WARNING)
+
+    def _close_job_manifest(self):
+        if self.job_manifest is not None:
+            counts = self.job_manifest.counts()
+            self.log_message(f"Manifest job: selesai {counts.get(JobManifest.DONE, 0)}, gagal {counts.get(JobManifest.FAILED, 0)}, pending {counts.get(JobManifest.PENDING, 0)}.")
+            self.job_manifest.close()
+            self.job_manifest = None
+
+    def _increment_counter(self, counter_name):
+        """Menaikkan counter progres secara thread-safe lalu memperbarui label progres."""
+        with self.counter_lock:
+            setattr(self, counter_name, getattr(self, counter_name) + 1)
+        self.on_progress()
+
+    def _process_single_image(self, image_path, selected_provider, selected_model_name):
+        """Memproses satu gambar (panggilan AI + penulisan metadata). Dijalankan di thread worker.
+
+        Mengembalikan True/False untuk berhasil/gagal, atau None jika dilewati karena Stop.
+        """
+        if self.stop_event.is_set():
+            return None
+
+        self._start_image(image_path)
+        cache_key, cached_result = self._apply_cached_metadata(image_path, selected_provider, selected_model_name)
+        if cached_result is not None:
+            return cached_result
+        return self._request_single_image(image_path, selected_provider, selected_model_name, cache_key)
+
+    def _request_single_image(self, image_path, selected_provider, selected_model_name, cache_key):
+        """Panggilan AI satu gambar dengan retry lintas kunci, lalu tulis metadata. Mengembalikan True/False/None."""
+        payloads, reserved = None, 0
+        request_model_name = self._first_model(selected_provider, selected_model_name)
+        try:
+            for attempt in range(MAX_RETRIES):
+                key_state = None
+                route_model_name = request_model_name
+                try:
+                    self._check_route_available(selected_provider)
+                    # Menunggu hanya jika semua kunci sedang penuh/diistirahatkan; None berarti Stop ditekan
+                    with self.stats.time_stage("key_wait"):
+                        route, key_state = self._acquire_route(selected_provider, request_model_name)
+                    if key_state is None:
+                        self.log_message(f"{os.path.basename(image_path)} tidak diproses karena proses dihentikan.")
+                        return None
+                    route_provider, route_model_name = route
+                    try:
+                        ai_client = key_state.get_client(route_model_name)
+                    except Exception as e:
+                        self.log_message(f"Gagal inisialisasi {route_provider} dengan kunci {key_state.label} Error: {e}", LOG_WARNING)
+                        self._scheduler_for(key_state).bench(key_state, INVALID_KEY_BENCH_SECONDS)
+                        continue
+
+                    # Payload dibuat sekali (dengan reservasi memori) dan dipakai ulang di percobaan berikutnya
+                    if payloads is None:
+                        payloads, reserved = self._load_payloads([image_path])
+                        if payloads is None:
+                            self.log_message(f"{os.path.basename(image_path)} tidak diproses karena proses dihentikan.")
+                            return None
+                    self._encode_payloads(route_provider, payloads)
+
+                    self.log_message(f"Mengirim gambar ke {route_provider} AI '{route_model_name}' (Percobaan {attempt + 1}/{MAX_RETRIES})...", LOG_DEBUG)
+                    route, key_state, response_text, tokens = self._call_single_image_hedged(image_path, route, key_state, ai_client, payloads, reserved)
+                    payloads = None # Sudah dilepas (atau diserahkan ke request hedging yang belum selesai) sebelum file ditulis exiftool
+
+                    return self._finish_response(image_path, selected_provider, selected_model_name, route, key_state, response_text, tokens, cache_key)
+
+                except ModelEscalation as escalation:
+                    self.log_message(f"{os.path.basename(image_path)}: {escalation}.", LOG_WARNING)
+                    request_model_name = escalation.model_name
+                except Exception as e:
+                    if not self._handle_attempt_error(e, image_path, route_model_name, key_state, attempt):
+                        return False
+        finally:
+            self._release_payloads(payloads, reserved)
+
+        # Semua percobaan gagal (atau dihentikan saat menunggu retry)
+        self.log_message(f"Gagal memproses {os.path.basename(image_path)} setelah {attempt + 1} percobaan.", LOG_ERROR)
+        self._increment_counter("failed_files")
+        return False
+
+    async def _process_single_image_async(self, image_path, selected_provider, selected_model_name, io_executor, async_clients):
+        """Versi asyncio dari _process_single_image: panggilan AI memakai klien async provider,
+        sedangkan baca file, hashing dan penulisan exiftool dijalankan di io_executor.
+        """
+        if self.stop_event.is_set():
+            return None
+        loop = asyncio.get_running_loop()
+
+        self._start_image(image_path)
+        cache_key, cached_result = await loop.run_in_executor(io_executor, self._apply_cached_metadata, image_path, selected_provider, selected_model_name)
+        if cached_result is not None:
+            return cached_result
+        return await self._request_single_image_async(image_path, selected_provider, selected_model_name, io_executor, async_clients, cache_key)
+
+    async def _request_single_image_async(self, image_path, selected_provider, selected_model_name, io_executor, async_clients, cache_key):
+        loop = asyncio.get_running_loop()
+        payloads, reserved = None, 0
+        request_model_name = self._first_model(selected_provider, selected_model_name)
+        try:
+            for attempt in range(MAX_RETRIES):
+                key_state = None
+                route_model_name = request_model_name
+                try:
+                    self._check_route_available(selected_provider)
+                    with self.stats.time_stage("key_wait"):
+                        route, key_state = await self._acquire_route_async(selected_provider, request_model_name)
+                    if key_state is None:
+                        self.log_message(f"{os.path.basename(image_path)} tidak diproses karena proses dihentikan.")
+                        return None
+                    route_provider, route_model_name = route
+                    try:
+                        ai_client = self._get_async_client(async_clients, key_state, route_model_name)
+                    except Exception as e:
+                        self.log_message(f"Gagal inisialisasi {route_provider} dengan kunci {key_state.label} Error: {e}", LOG_WARNING)
+                        self._scheduler_for(key_state).bench(key_state, INVALID_KEY_BENCH_SECONDS)
+                        continue
+
+                    if payloads is None:
+                        payloads, reserved = await self._load_payloads_async([image_path], io_executor)
+                        if payloads is None:
+                            self.log_message(f"{os.path.basename(image_path)} tidak diproses karena proses dihentikan.")
+                            return None
+                    self._encode_payloads(route_provider, payloads)
+
+                    self.log_message(f"Mengirim gambar ke {route_provider} AI '{route_model_name}' (Percobaan {attempt + 1}/{MAX_RETRIES})...", LOG_DEBUG)
+                    route, key_state, response_text, tokens = await self._call_single_image_hedged_async(image_path, route, key_state, ai_client, payloads, async_clients)
+                    payloads = self._release_payloads(payloads, reserved)
+
+                    return await loop.run_in_executor(
+                        io_executor, self._finish_response, image_path, selected_provider, selected_model_name, route, key_state, response_text, tokens, cache_key
+                    )
+
+                except ModelEscalation as escalation:
+                    self.log_message(f"{os.path.basename(image_path)}: {escalation}.", LOG_WARNING)
+                    request_model_name = escalation.model_name
+                except Exception as e:
+                    if not self._handle_attempt_error(e, image_path, route_model_name, key_state, attempt):
+                        return False
+        finally:
+            self._release_payloads(payloads, reserved)
+
+        self.log_message(f"Gagal memproses {os.path.basename(image_path)} setelah {attempt + 1} percobaan.", LOG_ERROR)
+        self._increment_counter("failed_files")
+        return False
+
+    @staticmethod
+    def _get_async_client(async_clients, key_state, model_name):
+        client_key = (key_state.provider, key_state.index, model_name)
+        ai_client = async_clients.get(client_key)
+        if ai_client is None:
+            ai_client = key_state.create_async_client(model_name)
+            async_clients[client_key] = ai_client
+        return ai_client
+
+    def _call_single_image(self, route, key_state, ai_client, payload):
+        """Satu panggilan API untuk satu gambar. Mengembalikan (teks respons, tokens)."""
+        provider, model_name = route
+        started = time.perf_counter() # Termasuk antre semaphore, sama seperti waktu tunggu hedging
+        with self.provider_semaphores[provider]:
+            with self.stats.time_stage("api"):
+                if provider == "Gemini":
+                    response = ai_client.generate_content(self._gemini_prompt_parts(payload), generation_config=gemini_generation_config())
+                else:
+                    response = ai_client.chat.completions.create(**self._openai_request_kwargs(model_name, payload))
+        self._observe_route_latency(route, time.perf_counter() - started)
+        return self._read_response(provider, response)
+
+    async def _call_single_image_async(self, route, key_state, ai_client, payload):
+        provider, model_name = route
+        started = time.perf_counter()
+        with self.stats.time_stage("api"):
+            if provider == "Gemini":
+                response = await ai_client.generate_content_async(self._gemini_prompt_parts(payload), generation_config=gemini_generation_config())
+            else:
+                response = await ai_client.chat.completions.create(**self._openai_request_kwargs(model_name, payload))
+        self._observe_route_latency(route, time.perf_counter() - started)
+        return self._read_response(provider, response)
+
+    def _call_single_image_hedged(self, image_path, route, key_state, ai_client, payloads, reserved):
+        """Panggilan API satu gambar dengan hedging (jika aktif): bila belum dijawab setelah persentil latensi
+        route, duplikatnya dikirim ke provider cadangan dan jawaban valid pertama yang dipakai.
+
+        Mengembalikan (route, key_state, teks respons, tokens) milik jawaban yang dipakai; payload sudah dilepas,
+        atau akan dilepas saat request yang kalah selesai (di mode threads request tidak bisa dibatalkan).
+        Jika melempar Exception (error request utama), payload tetap milik pemanggil untuk percobaan berikutnya.
+        """
+        delay = self._hedge_delay(route)
+        if delay is None or self._hedge_executor is None:
+            response_text, tokens = self._call_single_image(route, key_state, ai_client, payloads[0])
+            self._release_payloads(payloads, reserved)
+            return route, key_state, response_text, tokens
+
+        primary = self._hedge_executor.submit(self._call_single_image, route, key_state, ai_client, payloads[0])
+        legs = {primary: (route, key_state)}
+        done, _ = wait(legs, timeout=delay)
+        if not done:
+            hedge = self._start_hedge(image_path, route, delay, payloads, lambda hedge_key, model_name: hedge_key.get_client(model_name))
+            if hedge is not None:
+                hedge_route, hedge_key, hedge_client = hedge
+                legs[self._hedge_executor.submit(self._call_single_image, hedge_route, hedge_key, hedge_client, payloads[0])] = (hedge_route, hedge_key)
+
+        pending, completed = set(legs), []
+        while pending and not any(self._is_valid_leg(future) for future in completed):
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            completed += sorted(done, key=lambda future: future is not primary)
+        result = self._settle_hedge(legs, primary, completed)
+        if pending:
+            for future in pending:
+                future.add_done_callback(functools.partial(self._finish_hedge_loser, legs[future], payloads, reserved))
+        else:
+            self._release_payloads(payloads, reserved)
+        return result
+
+    async def _call_single_image_hedged_async(self, image_path, route, key_state, ai_client, payloads, async_clients):
+        """Versi asyncio dari _call_single_image_hedged. Request yang kalah dibatalkan, jadi payload tetap
+        milik pemanggil dan dilepas olehnya."""
+        delay = self._hedge_delay(route)
+        if delay is None:
+            return (route, key_state, *await self._call_single_image_async(route, key_state, ai_client, payloads[0]))
+
+        primary = asyncio.ensure_future(self._call_single_image_async(route, key_state, ai_client, payloads[0]))
+        legs = {primary: (route, key_state)}
+        pending, completed = set(legs), []
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            completed += done
+            if not done:
+                hedge = self._start_hedge(
+                    image_path, route, delay, payloads, lambda hedge_key, model_name: self._get_async_client(async_clients, hedge_key, model_name)
+                )
+                if hedge is not None:
+                    hedge_route, hedge_key, hedge_client = hedge
+                    hedge_task = asyncio.ensure_future(self._call_single_image_async(hedge_route, hedge_key, hedge_client, payloads[0]))
+                    legs[hedge_task] = (hedge_route, hedge_key)
+                    pending.add(hedge_task)
+            while pending and not any(self._is_valid_leg(future) for future in completed):
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                completed += sorted(done, key=lambda future: future is not primary)
+        finally:
+            for future in pending:
+                future.cancel()
+        return self._settle_hedge(legs, primary, completed)
+
+    def _start_hedge(self, image_path, route, delay, payloads, get_client):
+        """Mengambil kunci provider cadangan tanpa menunggu untuk request duplikat.
+
+        Mengembalikan (route cadangan, ApiKeyState, klien), atau None jika tidak ada kunci cadangan yang siap.
+        """
+        key_state, _ = self.secondary_scheduler.try_acquire()
+        if key_state is None:
+            return None
+        hedge_provider, hedge_model_name = self._secondary_route
+        try:
+            ai_client = get_client(key_state, hedge_model_name)
+        except Exception as e:
+            self.log_message(f"Gagal inisialisasi {hedge_provider} dengan kunci {key_state.label} Error: {e}", LOG_WARNING)
+            self.secondary_scheduler.bench(key_state, INVALID_KEY_BENCH_SECONDS)
+            return None
+        self._encode_payloads(hedge_provider, payloads)
+        self.stats.record_routing("hedged")
+        self.log_message(
+            f"{os.path.basename(image_path)} belum dijawab {route[0]} setelah {delay:.1f} s (p{self.hedge_percentile:g}); "
+            f"request duplikat dikirim ke {hedge_provider} '{hedge_model_name}'."
+        )
+        return self._secondary_route, key_state, ai_client
+
+    def _is_valid_leg(self, future):
+        if future.exception() is not None:
+            return False
+        try:
+            return not validate_metadata(parse_metadata_response(future.result()[0]))
+        except json.JSONDecodeError:
+            return False
+
+    def _settle_hedge(self, legs, primary, completed):
+        """Memilih hasil dari request hedging yang sudah selesai: jawaban valid pertama; jika tidak ada, jawaban
+        utama yang tidak valid (agar ditangani seperti biasa); jika semuanya error, error request utama dilempar.
+
+        Jawaban lain yang sudah selesai dicatat tokennya, error request cadangan dicatat pada kuncinya.
+        """
+        winner = next((future for future in completed if self._is_valid_leg(future)), None)
+        if winner is None:
+            winner = next((future for future in completed if future.exception() is None), None)
+        for future in completed:
+            # Error utama yang akan dilempar ditangani pemanggil (_handle_attempt_error), bukan di sini
+            if future is not winner and (winner is not None or future is not primary):
+                self._discard_hedge_leg(legs[future], future)
+        if winner is None:
+            raise primary.exception()
+        if winner is not primary:
+            self.stats.record_routing("hedge_won")
+        route, key_state = legs[winner]
+        return (route, key_state, *winner.result())
+
+    def _discard_hedge_leg(self, leg, future):
+        """Request hedging yang tidak dipakai: token jawabannya tetap dicatat (ditagih provider), dan kunci
+        yang terkena rate limit/tidak valid diistirahatkan."""
+        route, key_state = leg
+        error = future.exception()
+        if error is None:
+            prompt_tokens, completion_tokens, total_tokens = future.result()[1]
+            self._scheduler_for(key_state).report_usage(key_state, total_tokens)
+            self.stats.record_tokens(route[1], prompt_tokens, completion_tokens)
+        elif is_rate_limit_error(error):
+            self._scheduler_for(key_state).bench(key_state, extract_retry_after(error) or DEFAULT_BENCH_SECONDS)
+        elif is_invalid_key_error(error):
+            self._scheduler_for(key_state).bench(key_state, INVALID_KEY_BENCH_SECONDS)
+
+    def _finish_hedge_loser(self, leg, payloads, reserved, future):
+        """Callback request hedging yang kalah di mode threads: dicatat lalu payload-nya baru dilepas."""
+        try:
+            if not future.cancelled():
+                self._discard_hedge_leg(leg, future)
+        finally:
+            self._release_payloads(payloads, reserved)
+
+    def _process_image_group(self, image_paths, selected_provider, selected_model_name):
+        """Memproses beberapa gambar dengan satu request multi-gambar. Dijalankan di thread worker.
+
+        Gambar yang ada di cache tidak ikut dikirim; hasil yang hilang/tidak valid, atau request grup yang
+        gagal, dikirim ulang satu per satu. Mengembalikan list (image_path, True/False/None), termasuk
+        anggota cluster near-duplicate dari gambar grup ini.
+        """
+        if len(image_paths) == 1:
+            results = [(image_paths[0], self._process_single_image(image_paths[0], selected_provider, selected_model_name))]
+            return self._apply_to_duplicates(results)
+
+        results, uncached = self._start_image_group(image_paths, selected_provider, selected_model_name)
+        fallback = uncached
+        if len(uncached) > 1:
+            group_results, fallback = self._request_image_group(uncached, selected_provider, selected_model_name)
+            results.update(group_results)
+        for image_path, cache_key in fallback:
+            results[image_path] = self._request_single_image(image_path, selected_provider, selected_model_name, cache_key)
+        return self._apply_to_duplicates([(image_path, results.get(image_path)) for image_path in image_paths])
+
+    async def _process_image_group_async(self, image_paths, selected_provider, selected_model_name, io_executor, async_clients):
+        """Versi asyncio dari _process_image_group."""
+        loop = asyncio.get_running_loop()
+        if len(image_paths) == 1:
+            results = [(image_paths[0], await self._process_single_image_async(image_paths[0], selected_provider, selected_model_name, io_executor, async_clients))]
+        else:
+            results, uncached = await loop.run_in_executor(io_executor, self._start_image_group, image_paths, selected_provider, selected_model_name)
+            fallback = uncached
+            if len(uncached) > 1:
+                group_results, fallback = await self._request_image_group_async(uncached, selected_provider, selected_model_name, io_executor, async_clients)
+                results.update(group_results)
+            for image_path, cache_key in fallback:
+                results[image_path] = await self._request_single_image_async(image_path, selected_provider, selected_model_name, io_executor, async_clients, cache_key)
+            results = [(image_path, results.get(image_path)) for image_path in image_paths]
+        if not self._duplicates:
+            return results
+        return await loop.run_in_executor(io_executor, self._apply_to_duplicates, results)
+
+    def _start_image_group(self, image_paths, provider, model_name):
+        """Menandai gambar grup mulai diproses dan menangani cache hit.
+
+        Mengembalikan (hasil per path untuk gambar yang sudah selesai/dilewati, list (path, cache_key) yang perlu AI).
+        """
+        results, uncached = {}, []
+        for image_path in image_paths:
+            if self.stop_event.is_set():
+                results[image_path] = None
+                continue
+            self._start_image(image_path)
+            cache_key, cached_result = self._apply_cached_metadata(image_path, provider, model_name)
+            if cached_result is None:
+                uncached.append((image_path, cache_key))
+            else:
+                results[image_path] = cached_result
+        return results, uncached
+
+    def _request_image_group(self, group, selected_provider, selected_model_name):
+        """Satu request multi-gambar dengan retry lintas kunci. Mengembalikan (hasil per path, list (path, cache_key) untuk fallback)."""
+        estimated_tokens = ESTIMATED_TOKENS_PER_REQUEST * len(group)
+        group_label = self._group_label(group)
+        payloads, reserved = None, 0
+        try:
+            request_model_name = self._first_model(selected_provider, selected_model_name)
+            for attempt in range(MAX_RETRIES):
+                key_state = None
+                route_model_name = request_model_name
+                try:
+                    self._check_route_available(selected_provider)
+                    with self.stats.time_stage("key_wait"):
+                        route, key_state = self._acquire_route(selected_provider, request_model_name, estimated_tokens)
+                    if key_state is None:
+                        return {image_path: None for image_path, _ in group}, []
+                    route_provider, route_model_name = route
+                    try:
+                        ai_client = key_state.get_client(route_model_name)
+                    except Exception as e:
+                        self.log_message(f"Gagal inisialisasi {route_provider} dengan kunci {key_state.label} Error: {e}", LOG_WARNING)
+                        self._scheduler_for(key_state).bench(key_state, INVALID_KEY_BENCH_SECONDS)
+                        continue
+
+                    if payloads is None:
+                        payloads, reserved = self._load_payloads([image_path for image_path, _ in group])
+                        if payloads is None:
+                            return {image_path: None for image_path, _ in group}, []
+                    self._encode_payloads(route_provider, payloads)
+                    self.log_message(f"Mengirim {group_label} ke {route_provider} AI '{route_model_name}' (Percobaan {attempt + 1}/{MAX_RETRIES})...", LOG_DEBUG)
+                    with self.provider_semaphores[route_provider], self.stats.time_stage("api"):
+                        if route_provider == "Gemini":
+                            response = ai_client.generate_content(self._gemini_multi_prompt_parts(payloads), generation_config=gemini_generation_config(len(payloads)))
+                        else:
+                            response = ai_client.chat.completions.create(**self._openai_multi_request_kwargs(route_model_name, payloads))
+                    response_text, tokens = self._read_response(route_provider, response)
+                    payloads = self._release_payloads(payloads, reserved)
+
+                    return self._finish_group_response(group, selected_provider, selected_model_name, route, key_state, response_text, tokens, estimated_tokens)
+
+                except Exception as e:
+                    if not self._handle_attempt_error(e, group[0][0], route_model_name, key_state, attempt, subject=group_label, fail_image=False):
+                        break
+        finally:
+            self._release_payloads(payloads, reserved)
+        self.log_message(f"Request multi-gambar gagal; {group_label} dikirim ulang satu per satu.", LOG_WARNING)
+        return {}, group
+
+    async def _request_image_group_async(self, group, selected_provider, selected_model_name, io_executor, async_clients):
+        loop = asyncio.get_running_loop()
+        estimated_tokens = ESTIMATED_TOKENS_PER_REQUEST * len(group)
+        group_label = self._group_label(group)
+        payloads, reserved = None, 0
+        try:
+            request_model_name = self._first_model(selected_provider, selected_model_name)
+            for attempt in range(MAX_RETRIES):
+                key_state = None
+                route_model_name = request_model_name
+                try:
+                    self._check_route_available(selected_provider)
+                    with self.stats.time_stage("key_wait"):
+                        route, key_state = await self._acquire_route_async(selected_provider, request_model_name, estimated_tokens)
+                    if key_state is None:
+                        return {image_path: None for image_path, _ in group}, []
+                    route_provider, route_model_name = route
+                    try:
+                        ai_client = self._get_async_client(async_clients, key_state, route_model_name)
+                    except Exception as e:
+                        self.log_message(f"Gagal inisialisasi {route_provider} dengan kunci {key_state.label} Error: {e}", LOG_WARNING)
+                        self._scheduler_for(key_state).bench(key_state, INVALID_KEY_BENCH_SECONDS)
+                        continue
+
+                    if payloads is None:
+                        payloads, reserved = await self._load_payloads_async([image_path for image_path, _ in group], io_executor)
+                        if payloads is None:
+                            return {image_path: None for image_path, _ in group}, []
+                    self._encode_payloads(route_provider, payloads)
+                    self.log_message(f"Mengirim {group_label} ke {route_provider} AI '{route_model_name}' (Percobaan {attempt + 1}/{MAX_RETRIES})...", LOG_DEBUG)
+                    with self.stats.time_stage("api"):
+                        if route_provider == "Gemini":
+                            response = await ai_client.generate_content_async(self._gemini_multi_prompt_parts(payloads), generation_config=gemini_generation_config(len(payloads)))
+                        else:
+                            response = await ai_client.chat.completions.create(**self._openai_multi_request_kwargs(route_model_name, payloads))
+                    response_text, tokens = self._read_response(route_provider, response)
+                    payloads = self._release_payloads(payloads, reserved)
+
+                    return await loop.run_in_executor(
+                        io_executor, self._finish_group_response, group, selected_provider, selected_model_name, route, key_state, response_text, tokens, estimated_tokens
+                    )
+
+                except Exception as e:
+                    if not self._handle_attempt_error(e, group[0][0], route_model_name, key_state, attempt, subject=group_label, fail_image=False):
+                        break
+        finally:
+            self._release_payloads(payloads, reserved)
+        self.log_message(f"Request multi-gambar gagal; {group_label} dikirim ulang satu per satu.", LOG_WARNING)
+        return {}, group
+
+    @staticmethod
+    def _group_label(group):
+        return f"{len(group)} gambar ({', '.join(os.path.basename(image_path) for image_path, _ in group)})"
+
+    def _load_payloads(self, image_paths):
+        """Mereservasi memori dari memory_budget lalu menyiapkan payload upload.
+
+        Mengembalikan (list UploadPayload, byte yang tetap direservasi) atau (None, 0) jika Stop ditekan
+        saat menunggu memori. Reservasi dilepas dengan _release_payloads.
+        """
+        estimate = self._estimate_upload_memory(image_paths)
+        if not self.memory_budget.acquire(estimate, self.stop_event):
+            return None, 0
+        return self._prepare_payloads(image_paths, estimate)
+
+    async def _load_payloads_async(self, image_paths, io_executor):
+        loop = asyncio.get_running_loop()
+        estimate = await loop.run_in_executor(io_executor, self._estimate_upload_memory, image_paths)
+        while not self.memory_budget.try_acquire(estimate):
+            if self.stop_event.is_set():
+                return None, 0
+            await asyncio.sleep(0.05)
+        return await loop.run_in_executor(io_executor, self._prepare_payloads, image_paths, estimate)
+
+    def _estimate_upload_memory(self, image_paths):
+        return sum(estimate_upload_memory(image_path, self.upload_options) for image_path in image_paths)
+
+    def _prepare_payloads(self, image_paths, estimate):
+        """Membuat payload setelah reservasi; reservasi lalu diperkecil ke ukuran payload sebenarnya."""
+        payloads = []
+        try:
+            for image_path in image_paths:
+                with self.stats.time_stage("read"):
+                    payloads.append(self._prepare_image_payload(image_path))
+        except BaseException:
+            self._release_payloads(payloads, estimate)
+            raise
+        for_gemini = "Gemini" in (self.provider, self.secondary_provider)
+        reserved = min(estimate, sum(payload.memory_size(for_gemini) for payload in payloads))
+        self.memory_budget.release(estimate - reserved)
+        return payloads, reserved
+
+    def _encode_payloads(self, provider, payloads):
+        """OpenAI butuh data URL base64, Gemini bytes mentah; keduanya dibuat sekali per payload."""
+        with self.stats.time_stage("encode"):
+            for payload in payloads:
+                if provider == "OpenAI":
+                    payload.data_url()
+                else:
+                    payload.gemini_blob()
+        self.stats.record_upload(sum(payload.encoded_size for payload in payloads))
+
+    def _release_payloads(self, payloads, reserved):
+        """Menutup payload dan mengembalikan reservasi memorinya. Selalu mengembalikan None."""
+        if payloads is None:
+            return None
+        for payload in payloads:
+            payload.close()
+        self.memory_budget.release(reserved)
+        return None
+
+    def _finish_group_response(self, group, provider, model_name, route, key_state, response_text, tokens, estimated_tokens):
+        """Mencocokkan respons multi-gambar ke file lalu menulis metadata yang valid.
+
+        route = (provider, model) yang benar-benar menjawab; provider/model_name = pilihan run (kunci cache).
+        Mengembalikan (hasil per path, list (path, cache_key) yang hasilnya tidak valid untuk dikirim ulang).
+        """
+        prompt_tokens, completion_tokens, total_tokens = tokens
+        self._scheduler_for(key_state).report_usage(key_state, total_tokens, estimated_tokens)
+        self.stats.record_tokens(route[1], prompt_tokens, completion_tokens)
+        self.log_message(f"Respon {route[0]} (kunci {key_state.label}, {len(group)} gambar): {response_text}", LOG_DEBUG)
+        self.log_message(f"Penggunaan Token: Prompt={prompt_tokens}, Completion={completion_tokens}, Total={total_tokens}", LOG_DEBUG)
+
+        try:
+            with self.stats.time_stage("parse"):
+                parse_metadata_response(response_text)
+        except json.JSONDecodeError as jde:
+            # Seluruh jawaban rusak: satu putaran perbaikan teks untuk semua gambar, bukan upload ulang per gambar
+            repaired = self._request_repair(route, key_state, self._group_label(group), response_text, [f"the answer is not valid JSON ({jde.msg})"], len(group))
+            if repaired is not None:
+                response_text = repaired
+        with self.stats.time_stage("parse"):
+            matched = match_multi_image_response(response_text, len(group))
+        # Token dibagi rata hanya untuk catatan cache; tagihan sebenarnya sudah dicatat sekali di atas
+        share = tuple(count // len(group) for count in tokens)
+        results, fallback = {}, []
+        next_model_name = self._escalation_model(route)
+        for (image_path, cache_key), metadata in zip(group, matched):
+            problems = []
+            if metadata is not None and validate_metadata(metadata):
+                metadata, problems = self._parse_with_repair(
+                    route, key_state, os.path.basename(image_path), json.dumps(metadata, ensure_ascii=False), warn_invalid=next_model_name is None
+                )
+            self._record_model_result(route, metadata is not None and not problems, share)
+            if metadata is None or (problems and next_model_name is not None):
+                fallback.append((image_path, cache_key))
+                continue
+            try:
+                results[image_path] = self._apply_ai_metadata(image_path, *route, metadata, share, cache_key)
+            except Exception as e:
+                self.log_message(f"Gagal memproses {os.path.basename(image_path)}: {e}", LOG_ERROR)
+                self._increment_counter("failed_files")
+                results[image_path] = False
+        if fallback:
+            self.log_message(f"{len(fallback)} dari {len(group)} hasil multi-gambar tidak ada/tidak valid; dikirim ulang satu per satu.", LOG_WARNING)
+        return results, fallback
+
+    def _acquire_route(self, provider, model_name, estimated_tokens=ESTIMATED_TOKENS_PER_REQUEST):
+        """Seperti KeyScheduler.acquire, tetapi bisa dialihkan ke provider cadangan (lihat _try_acquire_route).
+
+        Mengembalikan ((provider, model), ApiKeyState), atau (None, None) jika Stop ditekan.
+        """
+        while not self.stop_event.is_set():
+            route, result = self._try_acquire_route(provider, model_name, estimated_tokens)
+            if route is not None:
+                return route, result
+            self.stop_event.wait(result)
+        return None, None
+
+    async def _acquire_route_async(self, provider, model_name, estimated_tokens=ESTIMATED_TOKENS_PER_REQUEST):
+        """Versi asyncio dari _acquire_route: menunggu dengan asyncio.sleep agar event loop tidak terblokir."""
+        while not self.stop_event.is_set():
+            route, result = self._try_acquire_route(provider, model_name, estimated_tokens)
+            if route is not None:
+                return route, result
+            await asyncio.sleep(result)
+        return None, None
+
+    def _start_image(self, image_path):
+        file_name_only = os.path.basename(image_path)
+        with self.counter_lock:
+            self.total_processed_files += 1
+        self.log_message(f"\nMemproses gambar: {file_name_only}")
+        self.on_progress(current_file_name=file_name_only)
+
+    def _apply_cached_metadata(self, image_path, provider, model_name):
+        """Menulis metadata dari cache jika ada. Mengembalikan (cache_key, True/False jika ditangani cache, atau None)."""
+        with self.stats.time_stage("cache"):
+            cache_key, cached, cached_route = self._lookup_cache(image_path, self._cache_routes(provider, model_name))
+        if cached is None:
+            return cache_key, None
+        file_name_only = os.path.basename(image_path)
+        self.log_message(f"Cache hit untuk {file_name_only}, panggilan AI dilewati.")
+        try:
+            self._write_metadata(image_path, cached.get('title', 'Untitled'), cached.get('description', 'No description available.'), cached.get('keywords', ''))
+        except Exception as e:
+            self.log_message(f"Gagal memproses {file_name_only}: {e}", LOG_ERROR)
+            self._increment_counter("failed_files")
+            return cache_key, False
+        self._remember_written_file(image_path, *cached_route, cached)
+        self._increment_counter("successful_files")
+        return cache_key, True
+
+    @staticmethod
+    def _gemini_prompt_parts(payload):
+        return [payload.gemini_blob(), METADATA_PROMPT]
+
+    @staticmethod
+    def _openai_request_kwargs(model_name, payload):
+        if not OPENAI_AVAILABLE:
+            raise Exception("OpenAI library tidak terinstal.")
+        return {
+            "model": model_name,
+            "messages": build_openai_messages(payload.data_url()),
+            "response_format": {"type": "json_object"}, # Meminta JSON object langsung
+        }
+
+    @staticmethod
+    def _gemini_multi_prompt_parts(payloads):
+        parts = []
+        for number, payload in enumerate(payloads, start=1):
+            parts += [f"Image {number}:", payload.gemini_blob()]
+        parts.append(build_multi_image_prompt(len(payloads)))
+        return parts
+
+    @staticmethod
+    def _openai_multi_request_kwargs(model_name, payloads):
+        if not OPENAI_AVAILABLE:
+            raise Exception("OpenAI library tidak terinstal.")
+        return {
+            "model": model_name,
+            "messages": build_openai_multi_messages([payload.data_url() for payload in payloads]),
+            "response_format": {"type": "json_object"}, # Array dibungkus object {"images": [...]}
+        }
+
+    @staticmethod
+    def _read_response(provider, response):
+        """Mengembalikan (teks respons, (prompt_tokens, completion_tokens, total_tokens))."""
+        if provider == "Gemini":
+            usage = response.usage_metadata
+            tokens = (usage.prompt_token_count, usage.candidates_token_count, usage.total_token_count) if usage else (0, 0, 0)
+            return response.text.strip(), tokens
+        usage = response.usage
+        tokens = (usage.prompt_tokens, usage.completion_tokens, usage.total_tokens) if usage else (0, 0, 0)
+        return response.choices[0].message.content.strip(), tokens
+
+    def _finish_response(self, image_path, provider, model_name, route, key_state, response_text, tokens, cache_key):
+        """Parsing respons AI, simpan ke cache lalu tulis metadata. Melempar Exception jika JSON tidak valid.
+
+        route = (provider, model) yang benar-benar menjawab (bisa provider cadangan atau model router yang lebih
+        murah); metadata disimpan di cache di bawah route itu, bukan di bawah provider/model_name pilihan run.
+        """
+        route_provider, route_model_name = route
+        prompt_tokens, completion_tokens, total_tokens = tokens
+        self._scheduler_for(key_state).report_usage(key_state, total_tokens)
+        self.stats.record_tokens(route_model_name, prompt_tokens, completion_tokens)
+        self.log_message(f"Respon {route_provider} (kunci {key_state.label}): {response_text}", LOG_DEBUG)
+        self.log_message(f"Penggunaan Token: Prompt={prompt_tokens}, Completion={completion_tokens}, Total={total_tokens}", LOG_DEBUG)
+
+        next_model_name = self._escalation_model(route)
+        metadata, problems = self._parse_with_repair(route, key_state, os.path.basename(image_path), response_text, warn_invalid=next_model_name is None)
+        if metadata is not None or next_model_name is not None: # JSON rusak di model terkuat dicatat _handle_attempt_error
+            self._record_model_result(route, metadata is not None and not problems, tokens)
+        if (metadata is None or problems) and next_model_name is not None:
+            self.stats.record_routing("escalated")
+            raise ModelEscalation(next_model_name, problems or ["the answer is not a JSON object"])
+        if metadata is None:
+            self.log_message(f"Error parsing JSON dari {route_provider}. Respon mentah: {response_text}", LOG_ERROR)
+            raise Exception(f"Gagal parsing JSON dari {route_provider}.")
+
+        if not self._is_primary_route(route, provider, model_name):
+            self.log_message(f"{os.path.basename(image_path)} dijawab oleh provider cadangan {route_provider} '{route_model_name}'.")
+        return self._apply_ai_metadata(image_path, route_provider, route_model_name, metadata, tokens, cache_key)
+
+    def _parse_with_repair(self, route, key_state, subject, response_text, warn_invalid=True):
+        """Parsing dan validasi jawaban; jika rusak atau melanggar aturan, satu putaran perbaikan teks saja
+        (tanpa gambar). Mengembalikan (dict metadata atau None jika tetap bukan JSON object, daftar masalah).
+
+        Jawaban yang masih melanggar aturan setelah perbaikan tetap dipakai (dengan peringatan jika warn_invalid),
+        kecuali router model menaikkannya ke model yang lebih kuat.
+        """
+        try:
+            with self.stats.time_stage("parse"):
+                metadata = parse_metadata_response(response_text)
+            problems = validate_metadata(metadata)
+        except json.JSONDecodeError as jde:
+            metadata, problems = None, [f"the answer is not valid JSON ({jde.msg})"]
+        if not problems:
+            return metadata, problems
+
+        repaired_text = self._request_repair(route, key_state, subject, response_text, problems)
+        if repaired_text is not None:
+            try:
+                with self.stats.time_stage("parse"):
+                    repaired = parse_metadata_response(repaired_text)
+                repaired_problems = validate_metadata(repaired)
+                if isinstance(repaired, dict) and (metadata is None or len(repaired_problems) <= len(problems)):
+                    metadata, problems = repaired, repaired_problems
+            except json.JSONDecodeError:
+                pass
+        if not isinstance(metadata, dict):
+            return None, problems
+        if isinstance(metadata.get("keywords"), list):
+            metadata["keywords"] = ", ".join(split_keywords(metadata["keywords"]))
+        if problems and warn_invalid:
+            self.log_message(f"Metadata {subject} tetap dipakai walau tidak sesuai aturan: {'; '.join(problems)}", LOG_WARNING)
+        return metadata, problems
+
+    def _escalation_model(self, route):
+        """Model router yang lebih kuat untuk dicoba jika jawaban route gagal cek kualitas, atau None."""
+        if self.model_router is None or route[0] != self.model_router.provider or route == self._secondary_route:
+            return None
+        return self.model_router.next_model(route[1])
+
+    def _record_model_result(self, route, accepted, tokens):
+        if self.model_router is not None and route[0] == self.model_router.provider:
+            self.model_router.record_result(route[1], accepted, tokens[0], tokens[1])
+
+    def _is_primary_route(self, route, provider, model_name):
+        """False jika route adalah provider cadangan; model lain dari tangga router tetap dianggap route utama."""
+        if route == (provider, model_name):
+            return True
+        return self.model_router is not None and route[0] == provider and route != self._secondary_route and route[1] in self.model_router.models
+
+    def _request_repair(self, route, key_state, subject, previous_answer, problems, image_count=None):
+        """Putaran perbaikan teks saja: model diminta memperbaiki jawabannya sendiri tanpa gambar, jadi token
+        gambar tidak dibayar ulang. Mengembalikan teks jawaban baru, atau None jika gagal.
+
+        Di mode asyncio dipanggil dari io_executor dengan klien sinkron; perbaikan jarang terjadi.
+        """
+        provider, model_name = route
+        scheduler = self._scheduler_for(key_state)
+        self.log_message(f"Jawaban {provider} untuk {subject} tidak valid ({'; '.join(problems)}); meminta perbaikan tanpa mengirim ulang gambar.", LOG_WARNING)
+        repair_key = scheduler.acquire(self.stop_event, REPAIR_ESTIMATED_TOKENS)
+        if repair_key is None:
+            return None
+        prompt = build_repair_prompt(previous_answer, problems, image_count)
+        try:
+            ai_client = repair_key.get_client(model_name)
+            with self.provider_semaphores.get(provider) or contextlib.nullcontext(), self.stats.time_stage("repair"):
+                if provider == "Gemini":
+                    response = ai_client.generate_content(prompt, generation_config=gemini_generation_config(image_count))
+                else:
+                    response = ai_client.chat.completions.create(
+                        model=model_name, messages=[{"role": "user", "content": prompt}], response_format={"type": "json_object"}
+                    )
+            response_text, (prompt_tokens, completion_tokens, total_tokens) = self._read_response(provider, response)
+        except Exception as e:
+            self.log_message(f"Perbaikan jawaban {subject} gagal: {e}", LOG_WARNING)
+            if is_rate_limit_error(e):
+                scheduler.bench(repair_key, extract_retry_after(e) or DEFAULT_BENCH_SECONDS)
+            elif is_invalid_key_error(e):
+                scheduler.bench(repair_key, INVALID_KEY_BENCH_SECONDS)
+            return None
+        scheduler.report_usage(repair_key, total_tokens, REPAIR_ESTIMATED_TOKENS)
+        self.stats.record_tokens(model_name, prompt_tokens, completion_tokens)
+        self.log_message(f"Respon perbaikan {provider} (kunci {repair_key.label}, {total_tokens} token): {response_text}", LOG_DEBUG)
+        return response_text
+
+    def _apply_ai_metadata(self, image_path, provider, model_name, metadata, tokens, cache_key):
+        """Menyimpan metadata hasil AI ke cache lalu menulisnya ke file. Melempar Exception jika penulisan gagal.
+
+        provider/model_name adalah route yang benar-benar menjawab; entri cache disimpan di bawah model itu.
+        """
+        title = metadata.get('title', 'Untitled')
+        description = metadata.get('description', 'No description available.')
+        keywords = metadata.get('keywords', '')
+
+        self.log_message(f"AI Metadata ({os.path.basename(image_path)}) - Title: {title}")
+        self.log_message(f"AI Metadata - Description: {description}", LOG_DEBUG)
+        self.log_message(f"AI Metadata - Keywords: {keywords}", LOG_DEBUG)
+
+        # Disimpan sebelum menulis file: jika penulisan gagal/crash, run berikutnya tidak membayar API lagi
+        if cache_key is not None:
+            self._store_in_cache(image_path, MetadataCache.rekey(cache_key, provider, model_name), metadata, tokens)
+
+        self._write_metadata(image_path, title, description, keywords)
+        self._remember_written_file(image_path, provider, model_name, metadata, tokens)
+        self._increment_counter("successful_files")
+        return True # Berhasil, keluar dari loop percobaan
+
+    def _handle_attempt_error(self, error, image_path, model_name, key_state, attempt, subject=None, fail_image=True):
+        """Mencatat error satu percobaan. Mengembalikan True jika gambar perlu dicoba lagi, False jika gagal permanen.
+
+        Untuk request multi-gambar subject menggantikan nama file di log dan fail_image=False: kegagalan
+        permanen tidak dihitung karena gambar grup masih akan dikirim ulang satu per satu.
+        """
+        error_message = str(error).lower()
+        file_name_only = subject or os.path.basename(image_path)
+        self.log_message(f"Gagal memproses {file_name_only} (Percobaan {attempt + 1}/{MAX_RETRIES}): {error}", LOG_WARNING)
+
+        if key_state is not None and is_rate_limit_error(error):
+            # Hanya kunci ini yang diistirahatkan; percobaan berikutnya langsung memakai kunci lain
+            delay = extract_retry_after(error) or INITIAL_RETRY_DELAY * (2 ** attempt)
+            self._scheduler_for(key_state).bench(key_state, delay)
+            self.log_message(f"Terdeteksi rate limit/kuota. Kunci {key_state.label} diistirahatkan {delay:.1f} detik; mencoba kunci lain.", LOG_WARNING)
+            self.stats.record_retry()
+            return True
+        if key_state is not None and is_invalid_key_error(error):
+            self.log_message(f"API Key {key_state.label} sepertinya tidak valid. Kunci ini tidak dipakai sementara; mencoba kunci berikutnya.", LOG_WARNING)
+            self._scheduler_for(key_state).bench(key_state, INVALID_KEY_BENCH_SECONDS)
+            self.stats.record_retry()
+            return True
+        if self.model_router is not None:
+            self.model_router.record_error(model_name)
+        if "deprecated" in error_message or "model_not_found" in error_message or "invalid model" in error_message:
+            self.log_message(f"Model AI yang dipilih mungkin tidak valid atau sudah deprecated: {model_name}. Harap pilih model lain.", LOG_ERROR)
+        elif fail_image:
+            self.log_message(f"Terjadi kesalahan tidak terduga: {error}. Menganggap gagal untuk gambar ini.", LOG_ERROR)
+        if fail_image:
+            self._increment_counter("failed_files")
+        return False # Gagal permanen untuk gambar ini (atau grup ini)
+
+    def _cache_routes(self, provider, model_name):
+        """Route (provider, model) yang jawaban cache-nya boleh dipakai run ini, dalam urutan dicoba.
+
+        Jawaban selalu disimpan di bawah model yang benar-benar menjawab, jadi tanpa router dan provider cadangan
+        hanya model pilihan yang dicari. Router mencari model yang lebih murah dulu (jawabannya hanya disimpan jika
+        lolos cek kualitas); provider cadangan ikut dicari jika routing aktif.
+        """
+        if self.model_router is not None and self.model_router.provider == provider:
+            routes = [(provider, name) for name in self.model_router.models]
+        else:
+            routes = [(provider, model_name)]
+        if self._secondary_route is not None and self._secondary_route not in routes:
+            routes.append(self._secondary_route)
+        return routes
+
+    def _lookup_cache(self, image_path, routes):
+        """Mencari jawaban cache untuk route pertama yang ada. Mengembalikan (cache_key, metadata atau None, route).
+
+        cache_key (milik route yang kena, atau route pertama) None jika cache tidak dipakai; saat menyimpan, kunci
+        diganti ke model yang menjawab dengan MetadataCache.rekey.
+        """
+        if self.result_cache is None:
+            return None, None, None
+        try:
+            content_hash = MetadataCache.hash_file(image_path)
+            for provider, model_name in routes:
+                cache_key = self.result_cache.make_key(content_hash, provider, model_name, METADATA_PROMPT)
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    return cache_key, cached, (provider, model_name)
+            return self.result_cache.make_key(content_hash, *routes[0], METADATA_PROMPT), None, None
+        except Exception as e:
+            self.log_message(f"Cache tidak bisa dibaca untuk {os.path.basename(image_path)}: {e}", LOG_WARNING)
+            return None, None, None
+
+    def _store_in_cache(self, image_path, cache_key, metadata, tokens):
+        """Cache hanya penghematan: gagal menyimpan (mis. database terkunci proses lain) tidak menggagalkan gambar
+        yang metadatanya sudah dibayar."""
+        try:
+            self.result_cache.put(cache_key, metadata, *tokens)
+        except sqlite3.Error as e:
+            self.log_message(f"Gagal menyimpan cache untuk {os.path.basename(image_path)}: {e}", LOG_WARNING)
+
+    def _remember_written_file(self, image_path, provider, model_name, metadata, tokens=(0, 0, 0)):
+        """Menyimpan metadata juga di bawah hash file setelah ditulis exiftool (isi file berubah karena XMP baru).
+
+        provider/model_name adalah model yang benar-benar menghasilkan metadata; anggota cluster duplikat
+        memakai ulang metadata (dan kunci cache) representatifnya.
+        """
+        if image_path in self._duplicates:
+            self._cluster_metadata[image_path] = (
+                metadata.get('title', 'Untitled'), metadata.get('description', 'No description available.'), metadata.get('keywords', ''), provider, model_name
+            )
+        if self.result_cache is None:
+            return
+        try:
+            written_key = self.result_cache.make_key(MetadataCache.hash_file(image_path), provider, model_name, METADATA_PROMPT)
+            self.result_cache.put(written_key, metadata, *tokens)
+        except Exception as e:
+            self.log_message(f"Gagal menyimpan cache untuk {os.path.basename(image_path)}: {e}", LOG_WARNING)
+
+    def _prepare_image_payload(self, image_path):
+        """Mengembalikan UploadPayload yang akan diupload: versi kecil hasil Pillow, atau file asli (mmap)."""
+        if self.upload_options.get("enabled"):
+            try:
+                original_size = os.path.getsize(image_path)
+                img_data, mime_type = prepare_upload_image(
+                    image_path,
+                    max_long_edge=self.upload_options["max_long_edge"],
+                    output_format=self.upload_options["output_format"],
+                )
+                self.log_message(f"Gambar diperkecil untuk upload: {original_size / 1024:.0f} KB -> {len(img_data) / 1024:.0f} KB", LOG_DEBUG)
+                return UploadPayload(img_data, mime_type)
+            except Exception as e:
+                self.log_message(f"Gagal memperkecil {os.path.basename(image_path)} dengan Pillow ({e}). Mengirim file asli.", LOG_WARNING)
+
+        return UploadPayload.from_file(image_path, self._get_mime_type(image_path))
+
+    def _get_mime_type(self, image_path):
+        file_extension = os.path.splitext(image_path)[1].lower()
+        return MIME_TYPES.get(file_extension, "application/octet-stream") # Default fallback
+
+    def _write_metadata(self, image_path, title, description, keywords):
+        """Menulis hasil sesuai output_mode: XMP di file (exiftool/internal), sidecar .xmp, baris CSV, atau JSON."""
+        with self.stats.time_stage("write"):
+            self._write_metadata_output(image_path, title, description, keywords)
+
+    def _write_metadata_output(self, image_path, title, description, keywords):
+        if self.output_mode == "jsonl":
+            record = {"file": image_path, "title": title, "description": description, "keywords": keywords}
+            with self._jsonl_lock:
+                self._jsonl_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self._jsonl_file.flush()
+            return
+        if self.output_mode == "csv":
+            self._csv_writer.write_row(image_path, title, keywords)
+            self.log_message(f"Metadata {os.path.basename(image_path)} ditambahkan ke CSV.")
+            return
+        if self.output_mode == "sidecar":
+            sidecar_path = write_xmp_sidecar(image_path, title, description, keywords)
+            self.log_message(f"Metadata (XMP) berhasil ditulis ke {os.path.basename(sidecar_path)}.")
+            return
+        if self.output_mode == "xmp" and os.path.splitext(image_path)[1].lower() in NATIVE_XMP_EXTENSIONS:
+            try:
+                write_embedded_xmp(image_path, title, description, keywords)
+                self.log_message(f"Metadata (XMP) berhasil ditambahkan ke {os.path.basename(image_path)}.")
+                return
+            except XmpError as e:
+                self.log_message(f"XMP {os.path.basename(image_path)} tidak bisa ditulis langsung ({e}). Memakai ExifTool.", LOG_WARNING)
+        self.add_metadata_with_exiftool_wsl(image_path, title, description, keywords)
+
+    def _open_output(self, target_folder):
+        if self.output_mode == "jsonl":
+            self._jsonl_file = sys.stdout if self.jsonl_path in (None, "-") else open(self.jsonl_path, "a", encoding="utf-8")
+        elif self.output_mode == "csv":
+            self._csv_writer = AdobeStockCsvWriter(self.csv_path or os.path.join(target_folder, ADOBE_STOCK_CSV_NAME))
+            self.log_message(f"Metadata ditulis ke CSV: {self._csv_writer.path}")
+
+    def _close_output(self):
+        if self._jsonl_file is not None and self._jsonl_file is not sys.stdout:
+            self._jsonl_file.close()
+        self._jsonl_file = None
+        if self._csv_writer is not None:
+            self._csv_writer.close()
+        self._csv_writer = None
+
+    def add_metadata_with_exiftool_wsl(self, image_path, title, description, keywords):
+        try:
+            self.log_message(f"Mengantrekan penulisan XMP via exiftool -stay_open untuk: {os.path.basename(image_path)}", LOG_DEBUG)
+            
+            output = self.exiftool_writer.write_metadata(image_path, title, description, keywords)
+            
+            self.log_message(f"ExifTool Output: {output.strip()}", LOG_DEBUG)
+            self.log_message(f"Metadata (XMP) berhasil ditambahkan ke {os.path.basename(image_path)} (via ExifTool).")
+
+        except FileNotFoundError:
+            raise Exception(f"Error: Perintah 'wsl' atau 'exiftool' tidak ditemukan. Pastikan WSL terinstal dan ExifTool terinstal di Ubuntu Anda.")
+        except ExifToolError as e:
+            raise Exception(f"Gagal menulis metadata dengan ExifTool: {e}")
+        except Exception as e:
+            raise Exception(f"Terjadi kesalahan tidak terduga saat menambahkan metadata via ExifTool: {e}")
+
+
+def _print_log(message, level=LOG_INFO):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}", file=sys.stderr, flush=True)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Generate metadata stock photo (title, description, keywords) dengan Gemini/OpenAI tanpa GUI."
+    )
+    parser.add_argument("path", help="File gambar atau folder yang akan diproses")
+    parser.add_argument("--provider", choices=["Gemini", "OpenAI"], default="Gemini")
+    parser.add_argument("--model", help="Nama model (default: gemini-1.5-flash / gpt-4o-mini)")
+    parser.add_argument("--key-file", help="File berisi API Key, satu per baris (wajib, kecuali untuk --queue-status)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKER_COUNT, help="Jumlah worker paralel")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT_PER_PROVIDER, help="Maks request aktif per provider")
+    parser.add_argument("--mode", choices=EXECUTION_MODES, default="threads", help="threads = thread pool, asyncio = satu event loop dengan klien async provider")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_ASYNC_CONCURRENCY, help=f"Request bersamaan di mode asyncio (maks {MAX_ASYNC_CONCURRENCY})")
+    parser.add_argument("--images-per-request", type=int, default=1, help=f"Kirim beberapa gambar dalam satu request (maks {MAX_IMAGES_PER_REQUEST}); hemat RPM dan token prompt. Tidak berlaku untuk --batch")
+    parser.add_argument("--secondary-provider", choices=["Gemini", "OpenAI"], help="Provider cadangan (kuncinya dari --key-file): dipakai otomatis saat semua kunci provider utama diistirahatkan karena rate limit")
+    parser.add_argument("--secondary-model", help="Model provider cadangan (default: model default provider tersebut)")
+    parser.add_argument("--secondary-rpm", type=int, help="Batas request/menit per API Key provider cadangan (default: batas default provider tersebut)")
+    parser.add_argument("--secondary-tpm", type=int, help="Batas token/menit per API Key provider cadangan")
+    parser.add_argument("--hedge-percentile", type=float, default=0, help="Mis. 95: request satu gambar yang belum dijawab setelah p95 latensi provider utama diduplikasi ke provider cadangan; jawaban valid pertama dipakai (0 = mati)")
+    parser.add_argument("--auto-model", action="store_true", help="Router model hemat: coba model provider termurah dulu dan naik ke model yang lebih kuat (sampai --model) hanya jika jawabannya gagal cek kualitas; titik mulai menyesuaikan tingkat gagal, latensi dan biaya token live")
+    parser.add_argument("--rpm", type=int, help="Batas request/menit per API Key provider utama")
+    parser.add_argument("--tpm", type=int, help="Batas token/menit per API Key provider utama")
+    parser.add_argument("--long-edge", type=int, default=DEFAULT_UPLOAD_LONG_EDGE, help="Sisi terpanjang gambar yang diupload (px)")
+    parser.add_argument("--upload-format", choices=list(UPLOAD_FORMATS), default=DEFAULT_UPLOAD_FORMAT)
+    parser.add_argument("--no-downscale", action="store_true", help="Kirim file asli tanpa diperkecil")
+    parser.add_argument("--memory-budget-mb", type=int, default=DEFAULT_UPLOAD_MEMORY_BUDGET_MB, help="Batas memori untuk gambar yang sedang disiapkan/diupload bersamaan (MB, 0 = tanpa batas); gambar besar menunggu giliran")
+    parser.add_argument("--no-cache", action="store_true", help="Jangan pakai cache hasil AI")
+    parser.add_argument("--no-resume", action="store_true", help="Abaikan manifest job sebelumnya dan proses ulang semua file")
+    parser.add_argument("--skip-tagged", action="store_true", help="Lewati file yang sudah punya XMP Title/Keywords")
+    parser.add_argument("--include", action="append", default=[], metavar="GLOB", help="Hanya proses file yang cocok dengan pola (nama atau path relatif); boleh diulang")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB", help="Lewati file yang cocok dengan pola; boleh diulang")
+    parser.add_argument("--min-size-kb", type=int, help="Lewati file yang lebih kecil dari ukuran ini (KB)")
+    parser.add_argument("--max-size-kb", type=int, help="Lewati file yang lebih besar dari ukuran ini (KB)")
+    parser.add_argument("--dedupe", action="store_true", help="Kelompokkan near-duplicate (pHash) dan kirim hanya satu gambar per cluster ke AI; metadatanya dipakai ulang untuk anggota cluster")
+    parser.add_argument("--dedupe-threshold", type=int, default=DEFAULT_DUPLICATE_THRESHOLD, help=f"Jarak Hamming maksimum pHash (0-{MAX_DUPLICATE_THRESHOLD} bit dari 64) agar dianggap duplikat")
+    parser.add_argument("--dedupe-vary", action="store_true", help="Acak urutan keyword setelah 10 pertama untuk setiap duplikat")
+    parser.add_argument("--dedupe-dry-run", action="store_true", help="Hanya tampilkan cluster duplikat dan penghematan request, tanpa memproses (mengaktifkan --dedupe)")
+    parser.add_argument("--batch", action="store_true", help="Mode batch offline (folder saja): kirim sebagai job Batch API, tunggu selesai, lalu tulis metadata. Jalankan ulang untuk melanjutkan job")
+    parser.add_argument("--poll-interval", type=int, default=BATCH_POLL_INTERVAL_SECONDS, help="Jeda antar pemeriksaan status job batch (detik)")
+    parser.add_argument("--queue", action="store_true", help=f"Ambil file dari antrean kerja bersama ({WORK_QUEUE_NAME} di folder) agar beberapa proses atau mesin (mis. yang me-mount share NAS yang sama) memproses satu folder bersama-sama")
+    parser.add_argument("--queue-path", help="Lokasi file antrean kerja (default: di dalam folder); semua worker harus memakai file yang sama")
+    parser.add_argument("--lease-seconds", type=int, default=WORK_QUEUE_LEASE_SECONDS, help="Lama lease file di antrean; file milik worker yang tidak memperpanjang lease selama ini diambil alih worker lain")
+    parser.add_argument("--queue-status", action="store_true", help="Koordinator: tampilkan progres gabungan antrean kerja folder (Processed/Success/Failed, juga per worker) lalu keluar")
+    parser.add_argument("--follow", action="store_true", help=f"Dengan --queue-status: perbarui setiap {WORK_QUEUE_STATUS_INTERVAL_SECONDS} detik sampai antrean tuntas")
+    parser.add_argument("--watch", action="store_true", help="Mode pantau (folder saja): proses file yang sudah ada, lalu terus pantau folder dan proses gambar baru begitu selesai disalin, sampai Ctrl+C")
+    parser.add_argument("--watch-stable-seconds", type=float, default=WATCH_STABLE_SECONDS, help="Dengan --watch: file baru diproses setelah ukuran dan waktu ubahnya tidak berubah selama ini (detik)")
+    parser.add_argument("--watch-poll", action="store_true", help="Dengan --watch: pakai polling alih-alih inotify (mis. share jaringan yang diisi mesin lain)")
+    parser.add_argument("--api-base", help="URL dasar API provider, untuk mode biasa maupun batch (mis. server lokal tiruan untuk pengujian)")
+    parser.add_argument("--output", choices=OUTPUT_MODES, default="exiftool", help="exiftool = tulis XMP ke file via exiftool, xmp = tulis XMP langsung ke JPEG/PNG tanpa exiftool (format lain via exiftool), sidecar = file .xmp di samping gambar, csv = CSV bulk upload Adobe Stock, jsonl = tulis hasil ke file JSON Lines; sidecar dan csv tidak mengubah file asli")
+    parser.add_argument("--jsonl-path", default="-", help="Tujuan output jsonl ('-' untuk stdout)")
+    parser.add_argument("--csv-path", help=f"Tujuan output csv (default: {ADOBE_STOCK_CSV_NAME} di folder yang diproses); file yang sudah ada ditambah barisnya")
+    parser.add_argument("--stats-file", help="Simpan statistik run (latensi per tahap, throughput, token, biaya) ke file ini; .prom = format Prometheus, lainnya JSON")
+    parser.add_argument("--verbosity", choices=LOG_LEVELS, default=LOG_INFO, help="Level log minimum yang ditampilkan di terminal (debug = termasuk respons mentah AI dan output exiftool)")
+    parser.add_argument("--log-file", help="Tulis log lengkap (semua level) ke file JSON Lines yang dirotasi")
+    wsl_group = parser.add_mutually_exclusive_group()
+    wsl_group.add_argument("--wsl", dest="use_wsl", action="store_const", const=True, help="Jalankan exiftool lewat WSL")
+    wsl_group.add_argument("--no-wsl", dest="use_wsl", action="store_const", const=False, help="Jalankan exiftool langsung")
+    return parser
+
+
+def show_queue_status(args):
+    """Koordinator antrean kerja: mencetak progres gabungan semua worker; dengan --follow diulang sampai tuntas."""
+    queue_path = args.queue_path or os.path.join(args.path, WORK_QUEUE_NAME)
+    if not os.path.isfile(queue_path):
+        _print_log(f"Error: Antrean kerja tidak ditemukan: {queue_path}")
+        return 2
+    work_queue = WorkQueue(queue_path, args.path)
+    try:
+        while True:
+            status = work_queue.status()
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] {format_queue_status(status)}", flush=True)
+            for worker, processed, successful, failed, seen_at, alive_until, finished in status["workers"]:
+                if finished:
+                    state = "selesai"
+                elif alive_until > time.time():
+                    state = "aktif"
+                else:
+                    state = f"tidak merespons sejak {datetime.fromtimestamp(seen_at).strftime('%H:%M:%S')}"
+                print(f"  {worker}: Processed: {processed}, Success: {successful}, Failed: {failed} ({state})", flush=True)
+            counts = status["counts"]
+            if not args.follow or not (counts.get(WorkQueue.PENDING) or counts.get(WorkQueue.LEASED)):
+                return 0
+            time.sleep(WORK_QUEUE_STATUS_INTERVAL_SECONDS)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        work_queue.close()
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    if args.queue_status:
+        return show_queue_status(args)
+    if not args.key_file:
+        _print_log("Error: --key-file wajib diisi.")
+        return 2
+
+    try:
+        with open(args.key_file, encoding="utf-8") as f:
+            keys = [line.strip() for line in f if line.strip()]
+    except OSError as e:
+        _print_log(f"Error: File API Key tidak bisa dibaca: {e}")
+        return 2
+
+    log_file = JsonlLogWriter(args.log_file) if args.log_file else None
+
+    def log(message, level=LOG_INFO):
+        if log_file is not None:
+            log_file.write(message, level)
+        if log_level_enabled(level, args.verbosity):
+            _print_log(message, level)
+
+    engine = MetadataEngine(log=log)
+    if args.use_wsl is not None:
+        engine.exiftool_writer = ExifToolWriter(use_wsl=args.use_wsl)
+    engine.set_api_keys(keys)
+    engine.provider = args.provider
+    engine.model_name = args.model or DEFAULT_MODELS[args.provider]
+    engine.worker_count = args.workers
+    engine.max_in_flight_per_provider = args.max_in_flight
+    engine.execution_mode = args.mode
+    engine.async_concurrency = args.concurrency
+    engine.images_per_request = args.images_per_request
+    engine.secondary_provider = args.secondary_provider
+    engine.secondary_model_name = args.secondary_model
+    engine.hedge_percentile = max(0.0, args.hedge_percentile)
+    engine.auto_model = args.auto_model
+    engine.dedupe_enabled = args.dedupe or args.dedupe_dry_run
+    engine.dedupe_threshold = args.dedupe_threshold
+    engine.dedupe_vary_keywords = args.dedupe_vary
+    engine.dedupe_dry_run = args.dedupe_dry_run
+    engine.key_limits = {}
+    for provider, rpm, tpm in ((args.provider, args.rpm, args.tpm), (args.secondary_provider, args.secondary_rpm, args.secondary_tpm)):
+        if provider and (rpm or tpm):
+            limits = DEFAULT_KEY_LIMITS[provider]
+            engine.key_limits[provider] = {"rpm": rpm or limits["rpm"], "tpm": tpm or limits["tpm"]}
+    engine.upload_options = {"enabled": not args.no_downscale, "max_long_edge": max(256, args.long_edge), "output_format": args.upload_format}
+    engine.upload_memory_budget_mb = args.memory_budget_mb
+    engine.use_result_cache = not args.no_cache
+    engine.resume_job = not args.no_resume
+    engine.skip_tagged_files = args.skip_tagged
+    engine.include_patterns = args.include
+    engine.exclude_patterns = args.exclude
+    engine.min_file_size = args.min_size_kb * 1024 if args.min_size_kb is not None else None
+    engine.max_file_size = args.max_size_kb * 1024 if args.max_size_kb is not None else None
+    engine.output_mode = args.output
+    engine.jsonl_path = args.jsonl_path
+    engine.csv_path = args.csv_path
+    engine.stats_export_path = args.stats_file
+    engine.api_base = args.api_base
+
+    provider_keys = engine.gemini_api_keys if args.provider == "Gemini" else engine.openai_api_keys
+    if not provider_keys:
+        _print_log(f"Error: Tidak ada API Key {args.provider} di {args.key_file}.")
+        return 2
+    if args.hedge_percentile and not args.secondary_provider:
+        _print_log("Error: --hedge-percentile membutuhkan --secondary-provider.")
+        return 2
+    if ((args.output == "exiftool" and not args.dedupe_dry_run) or args.skip_tagged) and not engine.check_exiftool():
+        return 2
+
+    selected_file = args.path if os.path.isfile(args.path) else None
+    selected_folder = args.path if os.path.isdir(args.path) else None
+    if not selected_file and not selected_folder:
+        _print_log(f"Error: Path tidak ditemukan: {args.path}")
+        return 2
+
+    if args.batch and not selected_folder:
+        _print_log("Error: Mode batch hanya untuk folder.")
+        return 2
+    if args.queue and (args.batch or args.dedupe_dry_run or not selected_folder):
+        _print_log("Error: --queue hanya untuk folder dan tidak bisa digabung dengan --batch atau --dedupe-dry-run.")
+        return 2
+    if args.watch and (args.batch or args.queue or args.dedupe_dry_run or not selected_folder):
+        _print_log("Error: --watch hanya untuk folder dan tidak bisa digabung dengan --batch, --queue atau --dedupe-dry-run.")
+        return 2
+    engine.watch_mode = args.watch
+    engine.watch_stable_seconds = max(0.0, args.watch_stable_seconds)
+    if args.watch_poll:
+        engine.watch_use_inotify = False
+    if args.queue:
+        engine.work_queue_path = args.queue_path or os.path.join(selected_folder, WORK_QUEUE_NAME)
+        engine.lease_seconds = args.lease_seconds
+
+    # Engine dijalankan di thread terpisah agar Ctrl+C bisa menghentikannya dengan rapi
+    result = {}
+    finished = threading.Event()
+
+    def run_engine():
+        try:
+            if args.batch:
+                result.update(engine.run_batch(selected_folder, poll_interval=max(1, args.poll_interval)))
+            else:
+                result.update(engine.run(selected_file, selected_folder))
+        finally:
+            finished.set()
+
+    runner = threading.Thread(target=run_engine, name="metadata-engine")
+    runner.start()
+    try:
+        # Menunggu lewat Event, bukan join(): join() yang terpotong KeyboardInterrupt bisa kembali
+        # sebelum thread selesai sehingga log dan manifest terakhir hilang
+        while not finished.wait(timeout=0.5):
+            pass
+    except KeyboardInterrupt:
+        _print_log("Menghentikan proses (Ctrl+C)...")
+        engine.stop()
+        finished.wait()
+    finally:
+        engine.close()
+        if log_file is not None:
+            log_file.close()
+
+    _print_log(f"Proses selesai. Berhasil: {result.get('successful', 0)}, Gagal: {result.get('failed', 0)}, Total: {result.get('processed', 0)}.")
+    # Mode watch hanya berakhir lewat Ctrl+C, jadi berhenti di sana bukan kegagalan
+    stopped = result.get("stopped") and not args.watch
+    return 0 if not result.get("failed") and not stopped else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
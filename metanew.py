@@ -1,44 +1,116 @@
+import time
+_MODULE_LOAD_STARTED = time.perf_counter() # Awal pengukuran waktu startup (impor + jendela pertama)
+
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-from PIL import Image
-import os
+import collections
 import json
-import google.generativeai as genai
-import base64
-import io
-import subprocess
+import queue
 import threading
-import time
 from datetime import datetime
 
-# Impor library OpenAI jika terinstal
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
-    print("Warning: OpenAI library not found. Install it with 'pip install openai' to enable OpenAI features.")
+from metadata_engine import (
+    DEFAULT_ASYNC_CONCURRENCY,
+    DEFAULT_DUPLICATE_THRESHOLD,
+    DEFAULT_KEY_LIMITS,
+    DEFAULT_MAX_IN_FLIGHT_PER_PROVIDER,
+    DEFAULT_MODELS,
+    DEFAULT_UPLOAD_FORMAT,
+    DEFAULT_UPLOAD_LONG_EDGE,
+    DEFAULT_UPLOAD_MEMORY_BUDGET_MB,
+    DEFAULT_WORKER_COUNT,
+    EXECUTION_MODES,
+    GEMINI_MODELS,
+    LOG_INFO,
+    LOG_LEVELS,
+    MAX_ASYNC_CONCURRENCY,
+    MAX_DUPLICATE_THRESHOLD,
+    MAX_IMAGES_PER_REQUEST,
+    MAX_WORKER_COUNT,
+    OPENAI_AVAILABLE,
+    OPENAI_MODELS,
+    OUTPUT_MODES,
+    UPLOAD_FORMATS,
+    WATCH_STABLE_SECONDS,
+    JsonlLogWriter,
+    MetadataEngine,
+    log_level_enabled,
+)
+
+_IMPORT_SECONDS = time.perf_counter() - _MODULE_LOAD_STARTED
+# Target waktu dari start sampai jendela pertama tampil. SDK provider diimpor lazy oleh engine,
+# jadi melewati batas ini biasanya berarti ada impor berat/operasi blocking baru di jalur startup.
+STARTUP_BUDGET_SECONDS = 1.5
+
+# Log dan progres dari worker diantrekan lalu ditampilkan per batch oleh timer after() di thread UI
+UI_FLUSH_INTERVAL_MS = 100
+UI_FLUSH_MAX_RECORDS = 500 # Maks record per tick agar UI tetap responsif saat log sangat ramai
+LOG_BUFFER_MAX_RECORDS = 5000 # Ring buffer log di memori (semua level), dipakai saat level tampilan diganti
+LOG_VIEW_MAX_LINES = 2000 # Maks baris di widget log; log lengkap ada di file JSONL
+STATS_REFRESH_SECONDS = 1.0 # Panel statistik cukup diperbarui sekali per detik
+NO_SECONDARY_PROVIDER = "Tidak ada"
+GUI_OUTPUT_MODES = tuple(mode for mode in OUTPUT_MODES if mode != "jsonl") # jsonl (stdout) hanya untuk CLI
+
 
 class AdobeStockMetadataApp:
     def __init__(self, master):
         self.master = master
         master.title("Adobe Stock AI Metadata Generator")
-        master.geometry("750x780") # Tinggi sedikit ditambah untuk tombol download log
+        master.geometry("750x1310") # Tinggi ditambah untuk tombol download log, pengaturan worker, mode eksekusi, kuota, upload, resume, output, mode pantau, duplikat, provider cadangan, router model dan statistik
         master.resizable(False, False)
 
-        self.gemini_api_keys = []
-        self.openai_api_keys = []
-        self.current_gemini_api_key_index = 0
-        self.current_openai_api_key_index = 0
+        # Log lengkap (termasuk debug) ditulis ke file; widget hanya menampilkan sebagian terakhir
+        try:
+            self.log_file = JsonlLogWriter()
+        except OSError:
+            self.log_file = None
+        self.ui_queue = queue.SimpleQueue()
+        self.log_buffer = collections.deque(maxlen=LOG_BUFFER_MAX_RECORDS)
+        self.log_verbosity = tk.StringVar(value=LOG_INFO)
+        self._progress_dirty = False
+        self._progress_file_name = None
+        self._stats_refreshed_at = 0.0
+
+        # Semua logika pemrosesan ada di MetadataEngine; GUI hanya mengisi pengaturan dan menampilkan hasil
+        self.engine = MetadataEngine(log=self.log_message, on_progress=self.update_progress)
 
         self.selected_folder = tk.StringVar()
         self.selected_file = tk.StringVar()
-        self.total_processed_files = 0
-        self.successful_files = 0
-        self.failed_files = 0
         self.is_processing = False
         self.process_thread = None
-        self.stop_event = threading.Event()
+        self._exiftool_ready = False
+
+        self.worker_count = tk.IntVar(value=DEFAULT_WORKER_COUNT)
+        self.max_in_flight_per_provider = tk.IntVar(value=DEFAULT_MAX_IN_FLIGHT_PER_PROVIDER)
+        self.execution_mode = tk.StringVar(value=EXECUTION_MODES[0])
+        self.async_concurrency = tk.IntVar(value=DEFAULT_ASYNC_CONCURRENCY)
+        self.images_per_request = tk.IntVar(value=1)
+        self.key_rpm = tk.IntVar(value=DEFAULT_KEY_LIMITS["Gemini"]["rpm"])
+        self.key_tpm = tk.IntVar(value=DEFAULT_KEY_LIMITS["Gemini"]["tpm"])
+
+        self.downscale_enabled = tk.BooleanVar(value=True)
+        self.upload_long_edge = tk.IntVar(value=DEFAULT_UPLOAD_LONG_EDGE)
+        self.upload_format = tk.StringVar(value=DEFAULT_UPLOAD_FORMAT)
+        self.upload_memory_budget_mb = tk.IntVar(value=DEFAULT_UPLOAD_MEMORY_BUDGET_MB)
+
+        self.use_result_cache = tk.BooleanVar(value=True)
+
+        self.resume_job = tk.BooleanVar(value=True)
+        self.skip_tagged_files = tk.BooleanVar(value=False)
+        self.output_mode = tk.StringVar(value=GUI_OUTPUT_MODES[0])
+
+        self.watch_mode = tk.BooleanVar(value=False)
+        self.watch_stable_seconds = tk.IntVar(value=int(WATCH_STABLE_SECONDS))
+        self.watch_polling = tk.BooleanVar(value=False)
+
+        self.dedupe_enabled = tk.BooleanVar(value=False)
+        self.dedupe_threshold = tk.IntVar(value=DEFAULT_DUPLICATE_THRESHOLD)
+        self.dedupe_vary_keywords = tk.BooleanVar(value=True)
+
+        self.secondary_provider = tk.StringVar(value=NO_SECONDARY_PROVIDER)
+        self.secondary_model = tk.StringVar()
+        self.hedge_percentile = tk.IntVar(value=0)
+        self.auto_model = tk.BooleanVar(value=False)
 
         self.ai_provider = tk.StringVar(value="Gemini") # Default provider
         self.gemini_model = tk.StringVar()
@@ -49,7 +121,7 @@ class AdobeStockMetadataApp:
         # Saat ini, 'gemini-1.5-flash' adalah yang paling umum dan tersedia secara luas.
         # Model 'gemini-2.0-flash' dan 'gemini-2.5-flash' adalah contoh berdasarkan permintaan user,
         # mungkin belum tersedia secara publik atau memiliki nama yang berbeda di masa mendatang.
-        self.available_gemini_models = ["gemini-1.5-flash", "gemini-2.0-flash", "gemini-2.5-flash"]
+        self.available_gemini_models = list(GEMINI_MODELS)
         self.gemini_model.set(self.available_gemini_models[0]) # Set default model
 
         self.available_openai_models = [] # Akan diisi dinamis
@@ -57,7 +129,11 @@ class AdobeStockMetadataApp:
         self.create_widgets()
         self.update_model_dropdown() # Panggil untuk mengatur model default saat startup
 
-        self.check_exiftool_on_start()
+        # Pemeriksaan exiftool (menjalankan WSL + Perl) dilakukan di background agar jendela langsung tampil
+        self.start_button.config(state="disabled")
+        threading.Thread(target=self._check_exiftool_in_background, name="exiftool-probe", daemon=True).start()
+        master.after_idle(self._report_startup_time)
+        master.after(UI_FLUSH_INTERVAL_MS, self._flush_ui_queue)
 
     def create_widgets(self):
         api_frame = tk.LabelFrame(self.master, text="AI API Keys (Satu per baris)", padx=10, pady=10)
@@ -96,6 +172,94 @@ class AdobeStockMetadataApp:
         tk.Button(input_frame, text="Browse File", command=self.browse_file).pack(side="left", padx=5)
         tk.Button(input_frame, text="Browse Folder", command=self.browse_folder).pack(side="left", padx="5")
 
+        concurrency_frame = tk.LabelFrame(self.master, text="Pemrosesan Paralel & Cache", padx=10, pady=5)
+        concurrency_frame.pack(pady=5, padx=10, fill="x")
+
+        tk.Label(concurrency_frame, text="Jumlah Worker:").pack(side="left", padx=5)
+        tk.Spinbox(concurrency_frame, from_=1, to=MAX_WORKER_COUNT, textvariable=self.worker_count, width=5).pack(side="left", padx=5)
+        tk.Label(concurrency_frame, text="Maks Request Aktif per Provider:").pack(side="left", padx=5)
+        tk.Spinbox(concurrency_frame, from_=1, to=MAX_WORKER_COUNT, textvariable=self.max_in_flight_per_provider, width=5).pack(side="left", padx=5)
+        tk.Checkbutton(concurrency_frame, text="Gunakan cache hasil AI", variable=self.use_result_cache).pack(side="left", padx=5)
+
+        mode_frame = tk.LabelFrame(self.master, text="Mode Eksekusi", padx=10, pady=5)
+        mode_frame.pack(pady=5, padx=10, fill="x")
+
+        tk.Label(mode_frame, text="Mode:").pack(side="left", padx=5)
+        ttk.Combobox(mode_frame, textvariable=self.execution_mode, values=list(EXECUTION_MODES), state="readonly", width=8).pack(side="left", padx=5)
+        tk.Label(mode_frame, text="Request Bersamaan (asyncio):").pack(side="left", padx=5)
+        tk.Spinbox(mode_frame, from_=1, to=MAX_ASYNC_CONCURRENCY, textvariable=self.async_concurrency, width=5).pack(side="left", padx=5)
+        tk.Label(mode_frame, text="Gambar/Request:").pack(side="left", padx=5)
+        tk.Spinbox(mode_frame, from_=1, to=MAX_IMAGES_PER_REQUEST, textvariable=self.images_per_request, width=4).pack(side="left", padx=5)
+
+        quota_frame = tk.LabelFrame(self.master, text="Kuota per API Key (provider terpilih)", padx=10, pady=5)
+        quota_frame.pack(pady=5, padx=10, fill="x")
+
+        tk.Label(quota_frame, text="Request/menit (RPM):").pack(side="left", padx=5)
+        tk.Spinbox(quota_frame, from_=1, to=100000, textvariable=self.key_rpm, width=8).pack(side="left", padx=5)
+        tk.Label(quota_frame, text="Token/menit (TPM):").pack(side="left", padx=5)
+        tk.Spinbox(quota_frame, from_=1000, to=100000000, increment=1000, textvariable=self.key_tpm, width=10).pack(side="left", padx=5)
+
+        upload_frame = tk.LabelFrame(self.master, text="Pra-pemrosesan Upload", padx=10, pady=5)
+        upload_frame.pack(pady=5, padx=10, fill="x")
+
+        tk.Checkbutton(upload_frame, text="Perkecil gambar sebelum upload", variable=self.downscale_enabled).pack(side="left", padx=5)
+        tk.Label(upload_frame, text="Sisi Terpanjang (px):").pack(side="left", padx=5)
+        tk.Spinbox(upload_frame, from_=256, to=4096, increment=128, textvariable=self.upload_long_edge, width=6).pack(side="left", padx=5)
+        tk.Label(upload_frame, text="Format:").pack(side="left", padx=5)
+        ttk.Combobox(upload_frame, textvariable=self.upload_format, values=list(UPLOAD_FORMATS), state="readonly", width=6).pack(side="left", padx=5)
+        tk.Label(upload_frame, text="Batas Memori (MB):").pack(side="left", padx=5)
+        tk.Spinbox(upload_frame, from_=0, to=65536, increment=256, textvariable=self.upload_memory_budget_mb, width=6).pack(side="left", padx=5)
+
+        job_frame = tk.LabelFrame(self.master, text="Job & Resume", padx=10, pady=5)
+        job_frame.pack(pady=5, padx=10, fill="x")
+
+        tk.Checkbutton(job_frame, text="Lanjutkan job sebelumnya (lewati file yang sudah selesai)", variable=self.resume_job).pack(side="left", padx=5)
+        tk.Checkbutton(job_frame, text="Lewati file yang sudah punya Title/Keywords", variable=self.skip_tagged_files, command=self._update_start_button).pack(side="left", padx=5)
+
+        output_frame = tk.LabelFrame(self.master, text="Output Metadata", padx=10, pady=5)
+        output_frame.pack(pady=5, padx=10, fill="x")
+
+        tk.Label(output_frame, text="Tulis ke:").pack(side="left", padx=5)
+        output_combobox = ttk.Combobox(output_frame, textvariable=self.output_mode, values=list(GUI_OUTPUT_MODES), state="readonly", width=9)
+        output_combobox.pack(side="left", padx=5)
+        output_combobox.bind("<<ComboboxSelected>>", lambda event: self._update_start_button())
+        tk.Label(output_frame, text="xmp = langsung ke JPEG/PNG tanpa ExifTool; sidecar/csv tidak mengubah file asli").pack(side="left", padx=5)
+
+        watch_frame = tk.LabelFrame(self.master, text="Mode Pantau Folder", padx=10, pady=5)
+        watch_frame.pack(pady=5, padx=10, fill="x")
+
+        tk.Checkbutton(watch_frame, text="Terus pantau folder dan proses file baru sampai Stop", variable=self.watch_mode).pack(side="left", padx=5)
+        tk.Label(watch_frame, text="Stabil (detik):").pack(side="left", padx=5)
+        tk.Spinbox(watch_frame, from_=0, to=600, textvariable=self.watch_stable_seconds, width=4).pack(side="left", padx=5)
+        tk.Checkbutton(watch_frame, text="Polling (share jaringan)", variable=self.watch_polling).pack(side="left", padx=5)
+
+        dedupe_frame = tk.LabelFrame(self.master, text="Near-Duplicate (folder)", padx=10, pady=5)
+        dedupe_frame.pack(pady=5, padx=10, fill="x")
+
+        tk.Checkbutton(dedupe_frame, text="Kirim satu gambar per cluster duplikat", variable=self.dedupe_enabled).pack(side="left", padx=5)
+        tk.Label(dedupe_frame, text="Threshold (bit):").pack(side="left", padx=5)
+        tk.Spinbox(dedupe_frame, from_=1, to=MAX_DUPLICATE_THRESHOLD, textvariable=self.dedupe_threshold, width=4).pack(side="left", padx=5)
+        tk.Checkbutton(dedupe_frame, text="Variasikan urutan keyword", variable=self.dedupe_vary_keywords).pack(side="left", padx=5)
+
+        routing_frame = tk.LabelFrame(self.master, text="Provider Cadangan (failover saat rate limit, hedging)", padx=10, pady=5)
+        routing_frame.pack(pady=5, padx=10, fill="x")
+
+        tk.Label(routing_frame, text="Provider:").pack(side="left", padx=5)
+        secondary_provider_combobox = ttk.Combobox(routing_frame, textvariable=self.secondary_provider, values=[NO_SECONDARY_PROVIDER, "Gemini", "OpenAI"], state="readonly", width=9)
+        secondary_provider_combobox.pack(side="left", padx=5)
+        secondary_provider_combobox.bind("<<ComboboxSelected>>", self.on_secondary_provider_selected)
+        tk.Label(routing_frame, text="Model:").pack(side="left", padx=5)
+        self.secondary_model_combobox = ttk.Combobox(routing_frame, textvariable=self.secondary_model, values=[], state="disabled", width=18)
+        self.secondary_model_combobox.pack(side="left", padx=5)
+        tk.Label(routing_frame, text="Hedging Persentil (0 = mati):").pack(side="left", padx=5)
+        tk.Spinbox(routing_frame, from_=0, to=99, textvariable=self.hedge_percentile, width=4).pack(side="left", padx=5)
+
+        model_router_frame = tk.LabelFrame(self.master, text="Router Model Hemat", padx=10, pady=5)
+        model_router_frame.pack(pady=5, padx=10, fill="x")
+
+        tk.Checkbutton(model_router_frame, text="Coba model termurah dulu", variable=self.auto_model).pack(side="left", padx=5)
+        tk.Label(model_router_frame, text="naik sampai model terpilih hanya jika keyword/title tidak lolos cek kualitas").pack(side="left", padx=5)
+
         control_frame = tk.Frame(self.master)
         control_frame.pack(pady=10)
 
@@ -111,36 +275,134 @@ class AdobeStockMetadataApp:
         self.download_log_button.pack(side="left", padx=5)
         # --- Akhir penambahan ---
 
+        tk.Label(control_frame, text="Detail Log:").pack(side="left", padx=5)
+        verbosity_combobox = ttk.Combobox(control_frame, textvariable=self.log_verbosity, values=list(LOG_LEVELS), state="readonly", width=8)
+        verbosity_combobox.pack(side="left", padx=5)
+        verbosity_combobox.bind("<<ComboboxSelected>>", lambda event: self._render_log_view())
+
         self.progress_label = tk.Label(self.master, text="Processed: 0, Success: 0, Failed: 0")
         self.progress_label.pack(pady=5)
 
+        stats_frame = tk.LabelFrame(self.master, text="Statistik Run", padx=10, pady=5)
+        stats_frame.pack(padx=10, fill="x")
+        self.stats_label = tk.Label(stats_frame, text="-", anchor="w", justify="left", wraplength=600)
+        self.stats_label.pack(side="left", fill="x", expand=True)
+        self.export_stats_button = tk.Button(stats_frame, text="Export Stats", command=self.export_stats)
+        self.export_stats_button.pack(side="right", padx=5)
+
         self.log_text = tk.Text(self.master, height=15, width=80, state="disabled")
         self.log_text.pack(pady=10, padx=10, fill="both", expand=True)
 
         self.master.protocol("WM_DELETE_WINDOW", self.on_closing)
 
-    def log_message(self, message):
+    def log_message(self, message, level=LOG_INFO):
+        """Aman dipanggil dari thread mana pun: record ditulis ke file log lalu diantrekan untuk widget."""
+        timestamp = datetime.now()
+        if self.log_file is not None:
+            self.log_file.write(message, level, timestamp)
+        self.ui_queue.put(("log", (timestamp, level, message)))
+
+    def _flush_ui_queue(self):
+        """Timer di thread UI: memindahkan log/progres yang diantrekan worker ke widget dalam satu batch."""
+        new_lines = []
+        finished_summary = None
+        verbosity = self.log_verbosity.get()
+        try:
+            for _ in range(UI_FLUSH_MAX_RECORDS):
+                kind, payload = self.ui_queue.get_nowait()
+                if kind == "log":
+                    self.log_buffer.append(payload)
+                    if log_level_enabled(payload[1], verbosity):
+                        new_lines.append(self._format_log_record(payload))
+                elif kind == "exiftool_ready":
+                    self._exiftool_ready = payload
+                    self._update_start_button()
+                elif kind == "finished":
+                    finished_summary = payload
+        except queue.Empty:
+            pass
+
+        if new_lines:
+            self._append_log_lines(new_lines)
+        if self._progress_dirty:
+            self._progress_dirty = False
+            self._render_progress()
+        if self.is_processing and time.monotonic() - self._stats_refreshed_at >= STATS_REFRESH_SECONDS:
+            self._render_stats()
+        self.master.after(UI_FLUSH_INTERVAL_MS, self._flush_ui_queue)
+        if finished_summary is not None:
+            self._on_processing_finished(finished_summary) # Setelah timer dijadwalkan ulang, karena messagebox bersifat modal
+
+    @staticmethod
+    def _format_log_record(record):
+        timestamp, level, message = record
+        prefix = "" if level == LOG_INFO else f"{level.upper()}: "
+        return f"[{timestamp.strftime('%H:%M:%S')}] {prefix}{message}\n"
+
+    def _append_log_lines(self, lines):
         self.log_text.config(state="normal")
-        self.log_text.insert(tk.END, f"[{datetime.now().strftime('%H:%M:%S')}] {message}\n")
+        self.log_text.insert(tk.END, "".join(lines))
+        line_count = int(self.log_text.index("end-1c").split(".")[0])
+        if line_count > LOG_VIEW_MAX_LINES:
+            self.log_text.delete("1.0", f"{line_count - LOG_VIEW_MAX_LINES + 1}.0")
         self.log_text.see(tk.END)
         self.log_text.config(state="disabled")
 
+    def _render_log_view(self):
+        """Menampilkan ulang ring buffer sesuai level log yang dipilih."""
+        verbosity = self.log_verbosity.get()
+        self.log_text.config(state="normal")
+        self.log_text.delete("1.0", tk.END)
+        self.log_text.config(state="disabled")
+        self._append_log_lines([self._format_log_record(record) for record in self.log_buffer if log_level_enabled(record[1], verbosity)])
+
+    def _clear_log_view(self):
+        self.log_buffer.clear()
+        self.log_text.config(state="normal")
+        self.log_text.delete("1.0", tk.END)
+        self.log_text.config(state="disabled")
+
+    def _render_stats(self):
+        self._stats_refreshed_at = time.monotonic()
+        self.stats_label.config(text=self.engine.stats.summary_text())
+
+    def export_stats(self):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json"), ("Prometheus text", "*.prom"), ("All files", "*.*")],
+            initialfile="run_stats.json"
+        )
+        if file_path:
+            try:
+                self.engine.stats.export(file_path)
+                self.log_message(f"Statistik run disimpan ke: {file_path}")
+            except OSError as e:
+                messagebox.showerror("Error", f"Gagal menyimpan statistik:\n{e}")
+
     # --- Fungsi untuk download log ---
     def download_log(self):
-        log_content = self.log_text.get("1.0", tk.END)
-        if not log_content.strip():
+        # Diambil dari file log sesi ini (semua level), bukan dari widget yang hanya menyimpan baris terakhir
+        if self.log_file is not None:
+            records = list(self.log_file.iter_records(session=self.log_file.session))
+        else:
+            records = [{"time": timestamp.isoformat(timespec="milliseconds"), "level": level, "message": message} for timestamp, level, message in self.log_buffer]
+        if not records:
             messagebox.showinfo("Informasi", "Log kosong, tidak ada yang bisa didownload.")
             return
 
         file_path = filedialog.asksaveasfilename(
             defaultextension=".txt",
-            filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
+            filetypes=[("Text files", "*.txt"), ("JSON Lines", "*.jsonl"), ("All files", "*.*")],
             initialfile="application_log.txt"
         )
         if file_path:
             try:
                 with open(file_path, "w", encoding="utf-8") as f:
-                    f.write(log_content)
+                    for record in records:
+                        if file_path.lower().endswith(".jsonl"):
+                            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        else:
+                            f.write(f"[{record['time']}] {record['level'].upper()}: {record['message']}\n")
                 messagebox.showinfo("Sukses", f"Log berhasil disimpan ke:\n{file_path}")
                 self.log_message(f"Log berhasil didownload ke: {file_path}")
             except Exception as e:
@@ -149,16 +411,24 @@ class AdobeStockMetadataApp:
     # --- Akhir fungsi download log ---
 
     def update_progress(self, current_file_name=None):
-        status_text = f"Processed: {self.total_processed_files}, Success: {self.successful_files}, Failed: {self.failed_files}"
+        """Dipanggil dari worker; label progres diperbarui oleh _flush_ui_queue paling sering sekali per tick."""
         if current_file_name:
-            status_text += f" (Processing: {current_file_name})"
+            self._progress_file_name = current_file_name
+        self._progress_dirty = True
+
+    def _render_progress(self):
+        engine = self.engine
+        status_text = f"Processed: {engine.total_processed_files}, Success: {engine.successful_files}, Failed: {engine.failed_files}"
+        if engine.result_cache is not None:
+            status_text += f" | Cache Hit: {engine.result_cache.hits}, Miss: {engine.result_cache.misses}"
+        if self._progress_file_name and self.is_processing:
+            status_text += f" (Processing: {self._progress_file_name})"
         self.progress_label.config(text=status_text)
 
     def set_api_keys(self):
         raw_keys = self.api_key_text.get("1.0", tk.END).strip()
         
-        self.gemini_api_keys = []
-        self.openai_api_keys = []
+        self.engine.set_api_keys([])
 
         if not raw_keys:
             messagebox.showerror("Error", "API Keys tidak boleh kosong. Harap masukkan setidaknya satu kunci.")
@@ -171,26 +441,21 @@ class AdobeStockMetadataApp:
             self.api_key_count_label.config(text="Jumlah Gemini Keys: 0 | Jumlah OpenAI Keys: 0", fg="red")
             return
         
-        for key in keys:
-            if key.startswith("sk-") and OPENAI_AVAILABLE:
-                self.openai_api_keys.append(key)
-            elif key.startswith("AIza"):
-                self.gemini_api_keys.append(key)
-            else:
-                self.log_message(f"Peringatan: Kunci '{key[:10]}...' tidak dikenali sebagai Gemini atau OpenAI, atau OpenAI tidak diinstal.")
-        
-        self.current_gemini_api_key_index = 0
-        self.current_openai_api_key_index = 0
+        self.engine.set_api_keys(keys) # Kunci yang tidak dikenali dicatat di log oleh engine
 
-        total_keys_msg = f"Gemini: {len(self.gemini_api_keys)} | OpenAI: {len(self.openai_api_keys)}"
+        total_keys_msg = f"Gemini: {len(self.engine.gemini_api_keys)} | OpenAI: {len(self.engine.openai_api_keys)}"
         messagebox.showinfo("Sukses", f"API Keys berhasil diatur. {total_keys_msg}")
         self.log_message(f"API Keys berhasil dikonfigurasi. {total_keys_msg}")
-        self.api_key_count_label.config(text=f"Jumlah Gemini Keys: {len(self.gemini_api_keys)} | Jumlah OpenAI Keys: {len(self.openai_api_keys)}", fg="blue")
+        self.api_key_count_label.config(text=f"Jumlah Gemini Keys: {len(self.engine.gemini_api_keys)} | Jumlah OpenAI Keys: {len(self.engine.openai_api_keys)}", fg="blue")
 
         self.update_model_dropdown() # Perbarui dropdown model setelah API Key diatur
 
     def on_provider_selected(self, event=None):
         self.log_message(f"AI Provider dipilih: {self.ai_provider.get()}")
+        limits = DEFAULT_KEY_LIMITS.get(self.ai_provider.get())
+        if limits:
+            self.key_rpm.set(limits["rpm"])
+            self.key_tpm.set(limits["tpm"])
         self.update_model_dropdown()
 
     def update_model_dropdown(self):
@@ -211,7 +476,7 @@ class AdobeStockMetadataApp:
         elif selected_provider == "OpenAI":
             if OPENAI_AVAILABLE:
                 # List model vision yang paling relevan dan efisien dari OpenAI
-                self.available_openai_models = ["gpt-4o-mini", "gpt-4o", "gpt-4-turbo", "gpt-4-vision-preview"]
+                self.available_openai_models = list(OPENAI_MODELS)
                 self.model_combobox.config(values=self.available_openai_models)
                 if self.available_openai_models:
                     # Prefer gpt-4o-mini untuk biaya dan performa, lalu gpt-4o
@@ -230,6 +495,17 @@ class AdobeStockMetadataApp:
                 self.openai_model.set("")
                 messagebox.showwarning("Peringatan", "OpenAI library tidak terinstal. Fitur OpenAI dinonaktifkan.")
 
+    def on_secondary_provider_selected(self, event=None):
+        provider = self.secondary_provider.get()
+        if provider == NO_SECONDARY_PROVIDER:
+            self.secondary_model_combobox.config(values=[], state="disabled")
+            self.secondary_model.set("")
+            return
+        models = GEMINI_MODELS if provider == "Gemini" else OPENAI_MODELS
+        self.secondary_model_combobox.config(values=models, state="readonly")
+        if self.secondary_model.get() not in models:
+            self.secondary_model.set(DEFAULT_MODELS[provider])
+
     def on_model_selected(self, event=None):
         if self.ai_provider.get() == "Gemini":
             selected_model = self.gemini_model.get()
@@ -256,31 +532,34 @@ class AdobeStockMetadataApp:
             self.start_button.config(state="normal")
 
     def check_exiftool_on_start(self):
-        try:
-            result = subprocess.run(["wsl", "exiftool", "-ver"], capture_output=True, text=True, check=True, creationflags=subprocess.CREATE_NO_WINDOW)
-            self.log_message(f"ExifTool {result.stdout.strip()} ditemukan dan berfungsi di WSL.")
-            self.start_button.config(state="normal")
-            return True
-        except FileNotFoundError:
-            self.log_message(f"Error: Perintah 'wsl' tidak ditemukan.")
-            self.log_message("Harap pastikan WSL terinstal dan fitur 'Windows Subsystem for Linux' sudah diaktifkan.")
-            self.start_button.config(state="disabled")
-            return False
-        except subprocess.CalledProcessError as e:
-            self.log_message(f"Error saat menjalankan ExifTool di WSL: {e.stderr.strip()}")
-            self.log_message("Harap pastikan 'libimage-exiftool-perl' sudah terinstal di lingkungan WSL Anda (mis. Ubuntu).")
-            self.start_button.config(state="disabled")
-            return False
-        except Exception as e:
-            self.log_message(f"Terjadi kesalahan tak terduga saat memeriksa ExifTool di WSL: {e}")
-            self.start_button.config(state="disabled")
-            return False
+        # Hasil pemeriksaan di-cache engine selama proses exiftool masih hidup
+        self._exiftool_ready = self.engine.check_exiftool()
+        self._update_start_button()
+        return self._exiftool_ready
+
+    def _output_needs_exiftool(self):
+        # Mode xmp hanya memanggil exiftool untuk TIFF/PSD; engine memeriksanya saat file seperti itu pertama ditemukan
+        # dan melewatinya sebelum panggilan AI jika exiftool tidak tersedia
+        return self.output_mode.get() == "exiftool" or bool(self.skip_tagged_files.get())
+
+    def _update_start_button(self):
+        if not self.is_processing:
+            self.start_button.config(state="normal" if self._exiftool_ready or not self._output_needs_exiftool() else "disabled")
+
+    def _check_exiftool_in_background(self):
+        self.ui_queue.put(("exiftool_ready", self.engine.check_exiftool()))
+
+    def _report_startup_time(self):
+        startup_seconds = time.perf_counter() - _MODULE_LOAD_STARTED
+        self.log_message(f"Waktu startup: impor {_IMPORT_SECONDS:.2f} detik, jendela pertama {startup_seconds:.2f} detik.")
+        if startup_seconds > STARTUP_BUDGET_SECONDS:
+            self.log_message(f"Peringatan: startup melebihi target {STARTUP_BUDGET_SECONDS:.1f} detik.")
 
     def start_processing(self):
         if self.is_processing:
             return
 
-        if not self.check_exiftool_on_start():
+        if self._output_needs_exiftool() and not self.check_exiftool_on_start():
             messagebox.showerror("Error", "WSL atau ExifTool tidak siap. Harap periksa log dan ikuti instruksi instalasi WSL/ExifTool.")
             return
 
@@ -290,286 +569,121 @@ class AdobeStockMetadataApp:
         if not selected_file and not selected_folder:
             messagebox.showerror("Error", "Pilih file atau folder terlebih dahulu.")
             return
+        if self.watch_mode.get() and not selected_folder:
+            messagebox.showerror("Error", "Mode pantau hanya bisa dipakai untuk folder.")
+            return
 
         current_provider = self.ai_provider.get()
-        if current_provider == "Gemini" and not self.gemini_api_keys:
+        if current_provider == "Gemini" and not self.engine.gemini_api_keys:
             messagebox.showerror("Error", "Harap masukkan setidaknya satu Gemini API Key untuk provider Gemini.")
             return
-        elif current_provider == "OpenAI" and not self.openai_api_keys:
+        elif current_provider == "OpenAI" and not self.engine.openai_api_keys:
             messagebox.showerror("Error", "Harap masukkan setidaknya satu OpenAI API Key untuk provider OpenAI.")
             return
         elif current_provider == "OpenAI" and not OPENAI_AVAILABLE:
             messagebox.showerror("Error", "OpenAI library tidak terinstal. Silakan instal dengan 'pip install openai' atau pilih provider Gemini.")
             return
 
-        self.total_processed_files = 0
-        self.successful_files = 0
-        self.failed_files = 0
-        self.update_progress()
-        self.log_text.config(state="normal")
-        self.log_text.delete(1.0, tk.END)
-        self.log_text.config(state="disabled")
+        self._apply_settings_to_engine()
+        self._clear_log_view()
+        self._progress_file_name = None
         self.log_message("Memulai proses...")
-        self.log_message("Peringatan: File asli akan ditimpa dengan metadata. Pastikan Anda memiliki cadangan jika diperlukan.")
+        if self.engine.output_mode in ("exiftool", "xmp"):
+            self.log_message("Peringatan: File asli akan ditimpa dengan metadata. Pastikan Anda memiliki cadangan jika diperlukan.")
         
         self.is_processing = True
         self.start_button.config(state="disabled")
         self.stop_button.config(state="normal")
         self.exit_button.config(state="disabled")
         self.download_log_button.config(state="disabled") # Nonaktifkan saat proses
-        self.stop_event.clear()
+        self.engine.stop_event.clear()
 
-        self.process_thread = threading.Thread(target=self._process_images_in_background)
+        self.process_thread = threading.Thread(target=self._process_images_in_background, args=(selected_file, selected_folder))
         self.process_thread.start()
 
+    def _apply_settings_to_engine(self):
+        """Menyalin pengaturan dari widget ke engine di thread UI; worker tidak membaca variabel Tk."""
+        engine = self.engine
+        engine.provider = self.ai_provider.get()
+        engine.model_name = self.gemini_model.get() if engine.provider == "Gemini" else self.openai_model.get()
+        engine.worker_count = self._get_spinbox_value(self.worker_count, DEFAULT_WORKER_COUNT)
+        engine.max_in_flight_per_provider = self._get_spinbox_value(self.max_in_flight_per_provider, DEFAULT_MAX_IN_FLIGHT_PER_PROVIDER)
+        engine.execution_mode = self.execution_mode.get() if self.execution_mode.get() in EXECUTION_MODES else EXECUTION_MODES[0]
+        engine.async_concurrency = self._get_spinbox_value(self.async_concurrency, DEFAULT_ASYNC_CONCURRENCY, MAX_ASYNC_CONCURRENCY)
+        engine.images_per_request = self._get_spinbox_value(self.images_per_request, 1, MAX_IMAGES_PER_REQUEST)
+
+        # Batas di GUI hanya untuk provider terpilih; provider cadangan memakai DEFAULT_KEY_LIMITS-nya sendiri
+        limits = DEFAULT_KEY_LIMITS[engine.provider]
+        try:
+            engine.key_limits = {engine.provider: {"rpm": max(1, int(self.key_rpm.get())), "tpm": max(1000, int(self.key_tpm.get()))}}
+        except (tk.TclError, ValueError):
+            engine.key_limits = {engine.provider: dict(limits)}
+
+        try:
+            long_edge = max(256, int(self.upload_long_edge.get()))
+        except (tk.TclError, ValueError):
+            long_edge = DEFAULT_UPLOAD_LONG_EDGE
+        engine.upload_options = {
+            "enabled": bool(self.downscale_enabled.get()),
+            "max_long_edge": long_edge,
+            "output_format": self.upload_format.get() if self.upload_format.get() in UPLOAD_FORMATS else DEFAULT_UPLOAD_FORMAT,
+        }
+        try:
+            engine.upload_memory_budget_mb = max(0, int(self.upload_memory_budget_mb.get()))
+        except (tk.TclError, ValueError):
+            engine.upload_memory_budget_mb = DEFAULT_UPLOAD_MEMORY_BUDGET_MB
+
+        engine.use_result_cache = bool(self.use_result_cache.get())
+        engine.resume_job = bool(self.resume_job.get())
+        engine.skip_tagged_files = bool(self.skip_tagged_files.get())
+        engine.output_mode = self.output_mode.get() if self.output_mode.get() in GUI_OUTPUT_MODES else GUI_OUTPUT_MODES[0]
+        engine.dedupe_enabled = bool(self.dedupe_enabled.get())
+        engine.dedupe_threshold = self._get_spinbox_value(self.dedupe_threshold, DEFAULT_DUPLICATE_THRESHOLD, MAX_DUPLICATE_THRESHOLD)
+        engine.dedupe_vary_keywords = bool(self.dedupe_vary_keywords.get())
+        engine.watch_mode = bool(self.watch_mode.get())
+        try:
+            engine.watch_stable_seconds = max(0, int(self.watch_stable_seconds.get()))
+        except (tk.TclError, ValueError):
+            engine.watch_stable_seconds = WATCH_STABLE_SECONDS
+        engine.watch_use_inotify = False if self.watch_polling.get() else None
+
+        secondary_provider = self.secondary_provider.get()
+        engine.secondary_provider = secondary_provider if secondary_provider in DEFAULT_MODELS else None
+        engine.secondary_model_name = self.secondary_model.get() or None
+        try:
+            engine.hedge_percentile = min(99, max(0, int(self.hedge_percentile.get())))
+        except (tk.TclError, ValueError):
+            engine.hedge_percentile = 0
+        engine.auto_model = bool(self.auto_model.get())
+
+    def _get_spinbox_value(self, variable, default, maximum=MAX_WORKER_COUNT):
+        try:
+            return min(maximum, max(1, int(variable.get())))
+        except (tk.TclError, ValueError):
+            return default
+
     def stop_processing(self):
         if not self.is_processing:
             return
         self.log_message("Mengirim sinyal stop ke proses...")
-        self.stop_event.set()
+        self.engine.stop()
         self.stop_button.config(state="disabled")
         self.log_message("Menunggu proses berhenti (mungkin butuh waktu untuk gambar yang sedang diproses)...")
 
-    def _get_configured_ai_client_and_model(self):
-        """Mencoba menginisialisasi klien AI (Gemini/OpenAI) dengan API Key yang tersedia."""
-        provider = self.ai_provider.get()
-        
-        if provider == "Gemini":
-            if not self.gemini_api_keys: return None, None
-            for i in range(len(self.gemini_api_keys)):
-                key_to_try = self.gemini_api_keys[self.current_gemini_api_key_index]
-                try:
-                    genai.configure(api_key=key_to_try)
-                    model_name = self.gemini_model.get()
-                    model = genai.GenerativeModel(model_name)
-                    self.log_message(f"Berhasil menginisialisasi Gemini model '{model_name}' dengan kunci index {self.current_gemini_api_key_index}: {key_to_try[:5]}...")
-                    return "Gemini", model
-                except Exception as e:
-                    self.log_message(f"Gagal inisialisasi Gemini dengan kunci index {self.current_gemini_api_key_index}: {key_to_try[:5]}... Error: {e}")
-                    self.current_gemini_api_key_index = (self.current_gemini_api_key_index + 1) % len(self.gemini_api_keys)
-                    self.log_message(f"Mencoba kunci Gemini berikutnya (index {self.current_gemini_api_key_index})...")
-            return None, None # Semua kunci Gemini gagal
-
-        elif provider == "OpenAI":
-            if not OPENAI_AVAILABLE or not self.openai_api_keys: return None, None
-            for i in range(len(self.openai_api_keys)):
-                key_to_try = self.openai_api_keys[self.current_openai_api_key_index]
-                try:
-                    client = OpenAI(api_key=key_to_try)
-                    self.log_message(f"Berhasil menginisialisasi OpenAI client dengan kunci index {self.current_openai_api_key_index}: {key_to_try[:5]}...")
-                    return "OpenAI", client
-                except Exception as e:
-                    self.log_message(f"Gagal inisialisasi OpenAI dengan kunci index {self.current_openai_api_key_index}: {key_to_try[:5]}... Error: {e}")
-                    self.current_openai_api_key_index = (self.current_openai_api_key_index + 1) % len(self.openai_api_keys)
-                    self.log_message(f"Mencoba kunci OpenAI berikutnya (index {self.current_openai_api_key_index})...")
-            return None, None # Semua kunci OpenAI gagal
-        
-        return None, None # Provider tidak dikenal
-
-    def _process_images_in_background(self):
-        image_paths = []
-        selected_file = self.selected_file.get()
-        selected_folder = self.selected_folder.get()
-        
-        if selected_file:
-            image_paths.append(selected_file)
-        elif selected_folder:
-            for root, _, files in os.walk(selected_folder):
-                for file in files:
-                    if file.lower().endswith(('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.psd')):
-                        image_paths.append(os.path.join(root, file))
-
-        if not image_paths:
-            self.log_message("Tidak ada file gambar yang ditemukan di lokasi yang dipilih.")
-            self._reset_ui_after_processing()
-            return
-
-        selected_provider = self.ai_provider.get()
-        selected_model_name = self.gemini_model.get() if selected_provider == "Gemini" else self.openai_model.get()
-
-        for image_path in image_paths:
-            if self.stop_event.is_set():
-                self.log_message("Proses dihentikan oleh pengguna.")
-                break
-
-            self.total_processed_files += 1
-            file_name_only = os.path.basename(image_path)
-            self.log_message(f"\nMemproses gambar: {file_name_only}")
-            self.update_progress(current_file_name=file_name_only)
-            
-            MAX_RETRIES = 5
-            INITIAL_DELAY = 2 # Lebih besar untuk rate limit gratisan
-
-            for attempt in range(MAX_RETRIES):
-                try:
-                    provider_type, ai_client = self._get_configured_ai_client_and_model()
-                    if not ai_client:
-                        raise Exception(f"Tidak ada API Key valid untuk provider {selected_provider} yang dapat digunakan.")
-
-                    with open(image_path, "rb") as img_file:
-                        img_data = img_file.read()
-                        
-                    encoded_image = base64.b64encode(img_data).decode('utf-8')
-                    
-                    metadata = {}
-                    response_text = ""
-                    prompt_tokens = 0
-                    completion_tokens = 0
-                    total_tokens = 0
-
-                    if provider_type == "Gemini":
-                        mime_type = self._get_mime_type(image_path)
-                        image_parts = [{"mime_type": mime_type, "data": encoded_image}]
-                        prompt_parts = [
-                            image_parts[0],
-                            "Analyze this image for stock photography metadata. Provide a highly descriptive title (max 200 characters), a comprehensive description (max 200 characters), and exactly 49 relevant, comma-separated keywords (focus on specific nouns, action verbs, vivid adjectives, and relevant concepts). Format the output as a JSON object with keys: 'title', 'description', 'keywords'."
-                        ]
-                        self.log_message(f"Mengirim gambar ke Gemini AI '{selected_model_name}' (Percobaan {attempt + 1}/{MAX_RETRIES})...")
-                        response = ai_client.generate_content(prompt_parts)
-                        response_text = response.text.strip()
-                        
-                        # Ambil penggunaan token dari respons Gemini
-                        if response.usage_metadata:
-                            prompt_tokens = response.usage_metadata.prompt_token_count
-                            completion_tokens = response.usage_metadata.candidates_token_count
-                            total_tokens = response.usage_metadata.total_token_count
-                    
-                    elif provider_type == "OpenAI":
-                        if not OPENAI_AVAILABLE:
-                            raise Exception("OpenAI library tidak terinstal.")
-                        
-                        # OpenAI Vision API requires data URL format
-                        mime_type = self._get_mime_type(image_path)
-                        data_url = f"data:{mime_type};base64,{encoded_image}"
-
-                        self.log_message(f"Mengirim gambar ke OpenAI AI '{selected_model_name}' (Percobaan {attempt + 1}/{MAX_RETRIES})...")
-                        chat_completion = ai_client.chat.completions.create(
-                            model=selected_model_name,
-                            messages=[
-                                {
-                                    "role": "user",
-                                    "content": [
-                                        {"type": "text", "text": "Analyze this image for stock photography metadata. Provide a highly descriptive title (max 200 characters), a comprehensive description (max 200 characters), and exactly 49 relevant, comma-separated keywords (focus on specific nouns, action verbs, vivid adjectives, and relevant concepts). Format the output as a JSON object with keys: 'title', 'description', 'keywords'."},
-                                        {"type": "image_url", "image_url": {"url": data_url}},
-                                    ],
-                                }
-                            ],
-                            response_format={"type": "json_object"} # Meminta JSON object langsung
-                        )
-                        response_text = chat_completion.choices[0].message.content.strip()
-                        
-                        # Ambil penggunaan token dari respons OpenAI
-                        if chat_completion.usage:
-                            prompt_tokens = chat_completion.usage.prompt_tokens
-                            completion_tokens = chat_completion.usage.completion_tokens
-                            total_tokens = chat_completion.usage.total_tokens
-
-                    self.log_message(f"Respon {provider_type}: {response_text}")
-                    self.log_message(f"Penggunaan Token: Prompt={prompt_tokens}, Completion={completion_tokens}, Total={total_tokens}")
-
-                    try:
-                        # Membersihkan markdown JSON jika ada
-                        if response_text.startswith("```json"):
-                            response_text = response_text[len("```json"):].strip()
-                        if response_text.endswith("```"):
-                            response_text = response_text[:-len("```")].strip()
-                        metadata = json.loads(response_text)
-                    except json.JSONDecodeError as jde:
-                        self.log_message(f"Error parsing JSON dari {provider_type}: {jde}. Respon mentah: {response_text}")
-                        raise Exception(f"Gagal parsing JSON dari {provider_type}.")
-
-                    title = metadata.get('title', 'Untitled')
-                    description = metadata.get('description', 'No description available.')
-                    keywords = metadata.get('keywords', '')
-
-                    self.log_message(f"AI Metadata - Title: {title}")
-                    self.log_message(f"AI Metadata - Description: {description}")
-                    self.log_message(f"AI Metadata - Keywords: {keywords}")
-
-                    self.add_metadata_with_exiftool_wsl(image_path, title, description, keywords)
-                    self.successful_files += 1
-                    self.update_progress()
-                    break # Berhasil, keluar dari loop percobaan
-                
-                except Exception as e:
-                    error_message = str(e).lower()
-                    self.log_message(f"Gagal memproses {file_name_only} (Percobaan {attempt + 1}/{MAX_RETRIES}): {e}")
-
-                    if "rate limit" in error_message or "quota" in error_message or "resource exhausted" in error_message or "too many requests" in error_message:
-                        delay = INITIAL_DELAY * (2 ** attempt)
-                        self.log_message(f"Terdeteksi rate limit/kuota. Menunggu {delay:.1f} detik sebelum mencoba lagi atau beralih API Key.")
-                        time.sleep(delay)
-                        # _get_configured_ai_client_and_model() akan menangani perpindahan kunci jika perlu
-                    elif "invalid api key" in error_message or "authentication" in error_message or "bad api key" in error_message:
-                        self.log_message(f"API Key sepertinya tidak valid. Akan mencoba kunci berikutnya jika tersedia.")
-                        # _get_configured_ai_client_and_model() sudah akan beralih kunci
-                        time.sleep(INITIAL_DELAY)
-                    elif "deprecated" in error_message or "model_not_found" in error_message or "invalid model" in error_message:
-                        self.log_message(f"Model AI yang dipilih mungkin tidak valid atau sudah deprecated: {selected_model_name}. Harap pilih model lain.")
-                        self.failed_files += 1
-                        self.update_progress()
-                        break # Gagal permanen untuk gambar ini karena masalah model
-                    else:
-                        self.log_message(f"Terjadi kesalahan tidak terduga: {e}. Menganggap gagal untuk gambar ini.")
-                        self.failed_files += 1
-                        self.update_progress()
-                        break # Keluar dari loop percobaan
-            else: # Jika semua percobaan gagal
-                self.log_message(f"Gagal memproses {file_name_only} setelah {MAX_RETRIES} percobaan.")
-                self.failed_files += 1
-                self.update_progress()
-            
-            time.sleep(1) # Jeda minimal antar gambar
+    def _process_images_in_background(self, selected_file, selected_folder):
+        summary = None
+        try:
+            summary = self.engine.run(selected_file, selected_folder)
+        finally:
+            self.ui_queue.put(("finished", summary or self.engine.summary())) # Widget hanya disentuh dari thread UI
 
+    def _on_processing_finished(self, summary):
         self._reset_ui_after_processing()
-        messagebox.showinfo("Proses Selesai", f"Proses selesai. Berhasil: {self.successful_files}, Gagal: {self.failed_files}, Total: {self.total_processed_files}.")
-        self.log_message("\n--- Semua gambar telah diproses. ---")
-
-    def _get_mime_type(self, image_path):
-        file_extension = os.path.splitext(image_path)[1].lower()
-        if file_extension in (".jpg", ".jpeg"):
-            return "image/jpeg"
-        elif file_extension == ".png":
-            return "image/png"
-        elif file_extension in (".tif", ".tiff"):
-            return "image/tiff"
-        elif file_extension == ".psd":
-            return "image/vnd.adobe.photoshop"
-        return "application/octet-stream" # Default fallback
-
-    def add_metadata_with_exiftool_wsl(self, image_path, title, description, keywords):
-        try:
-            wsl_path = image_path.replace("C:", "/mnt/c").replace("\\", "/")
-
-            command = [
-                "wsl",
-                "exiftool",
-                f"-XMP-dc:Title={title}",
-                f"-XMP-dc:Description={description}",
-                f"-XMP-dc:Subject={keywords}",
-                "-overwrite_original",
-                "-charset", "UTF8",
-                "-m",
-                wsl_path
-            ]
-            
-            self.log_message(f"Menjalankan exiftool via WSL untuk penulisan XMP: {' '.join(command)}")
-            
-            result = subprocess.run(command, capture_output=True, text=True, check=True, creationflags=subprocess.CREATE_NO_WINDOW)
-            
-            self.log_message(f"ExifTool Stdout (WSL): {result.stdout.strip()}")
-            if result.stderr:
-                self.log_message(f"ExifTool Stderr (WSL): {result.stderr.strip()}")
-            
-            self.log_message(f"Metadata (XMP) berhasil ditambahkan ke {os.path.basename(image_path)} (via ExifTool di WSL).")
-
-        except FileNotFoundError:
-            raise Exception(f"Error: Perintah 'wsl' atau 'exiftool' tidak ditemukan. Pastikan WSL terinstal dan ExifTool terinstal di Ubuntu Anda.")
-        except subprocess.CalledProcessError as e:
-            error_output = e.stderr.strip() if e.stderr else e.stdout.strip()
-            raise Exception(f"Gagal memanggil ExifTool di WSL: {error_output} [Return Code {e.returncode}]")
-        except Exception as e:
-            raise Exception(f"Terjadi kesalahan tidak terduga saat menambahkan metadata via ExifTool di WSL: {e}")
+        self._render_progress()
+        self._render_stats()
+        if summary["processed"] or summary["stopped"]:
+            messagebox.showinfo("Proses Selesai", f"Proses selesai. Berhasil: {summary['successful']}, Gagal: {summary['failed']}, Total: {summary['processed']}.")
+            self.log_message("\n--- Semua gambar telah diproses. ---")
 
     def _reset_ui_after_processing(self):
         self.is_processing = False
@@ -581,16 +695,23 @@ class AdobeStockMetadataApp:
     def on_closing(self):
         if self.is_processing:
             if messagebox.askyesno("Keluar Aplikasi", "Proses sedang berjalan. Apakah Anda yakin ingin menghentikannya dan keluar?"):
-                self.stop_event.set()
+                self.engine.stop()
                 self.log_message("Aplikasi ditutup. Menunggu proses berhenti...")
                 if self.process_thread and self.process_thread.is_alive():
                     self.process_thread.join(timeout=10) # Beri waktu thread untuk berhenti
+                self._close_resources()
                 self.master.destroy()
             else:
                 pass
         else:
+            self._close_resources()
             self.master.destroy()
 
+    def _close_resources(self):
+        self.engine.close()
+        if self.log_file is not None:
+            self.log_file.close()
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = AdobeStockMetadataApp(root)
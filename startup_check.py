@@ -0,0 +1,120 @@
+"""Memeriksa anggaran waktu startup GUI (STARTUP_BUDGET_SECONDS di metanew.py).
+
+Setiap pengukuran berjalan di interpreter baru, jadi cache impor modul tidak ikut membantu: metanew diimpor,
+lalu jendela pertama dibuat dan digambar sekali (root.update()). Waktu diukur dari titik yang sama dengan log
+"Waktu startup" di aplikasi (_MODULE_LOAD_STARTED). Di Linux tanpa DISPLAY, Xvfb sementara dijalankan jika
+terinstal; tanpa display maupun Xvfb langkah jendela dilewati dan hanya waktu impor yang dibandingkan dengan
+anggaran. Pemeriksaan yang sama dijalankan pytest lewat tests/test_startup.py.
+
+Contoh:
+    python startup_check.py
+    python startup_check.py --repeat 5 --budget 2.0
+
+Exit code 0 jika median run di bawah anggaran, 1 jika melebihi, 2 jika pengukuran gagal.
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+
+# Dijalankan di interpreter baru; mencetak satu baris JSON hasil pengukuran
+_MEASURE_SOURCE = r'''
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+import metanew
+
+result = {"import_seconds": metanew._IMPORT_SECONDS, "budget_seconds": metanew.STARTUP_BUDGET_SECONDS, "window_seconds": None}
+try:
+    root = metanew.tk.Tk()
+except metanew.tk.TclError as e:
+    result["skipped_window"] = str(e)
+else:
+    app = metanew.AdobeStockMetadataApp(root)
+    root.update()
+    result["window_seconds"] = time.perf_counter() - metanew._MODULE_LOAD_STARTED
+    app._close_resources()
+    root.destroy()
+print(json.dumps(result))
+'''
+
+
+def has_display():
+    return sys.platform in ("win32", "darwin") or bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+@contextlib.contextmanager
+def display_environment():
+    """Environment untuk proses anak yang bisa membuka jendela: display yang ada, atau Xvfb sementara jika
+    terinstal (dihentikan saat keluar dari blok). None jika tidak ada keduanya."""
+    if has_display():
+        yield dict(os.environ)
+        return
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        yield None
+        return
+    # -displayfd: Xvfb memilih nomor display bebas dan menuliskannya setelah siap menerima koneksi
+    process = subprocess.Popen([xvfb, "-displayfd", "1", "-nolisten", "tcp"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        number = process.stdout.readline().decode("ascii", "replace").strip()
+        yield dict(os.environ, DISPLAY=f":{number}") if number.isdigit() else None
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def measure_once(timeout, env=None):
+    """Satu pengukuran di interpreter baru. Mengembalikan dict hasil dari proses anak."""
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    completed = subprocess.run(
+        [sys.executable, "-c", _MEASURE_SOURCE, repo_dir], capture_output=True, text=True, timeout=timeout, cwd=repo_dir, env=env
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip() or f"exit code {completed.returncode}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Periksa waktu impor metanew dan waktu sampai jendela pertama tampil terhadap anggaran startup.")
+    parser.add_argument("--repeat", type=int, default=3, help="Jumlah pengukuran; yang dibandingkan adalah mediannya")
+    parser.add_argument("--budget", type=float, help="Anggaran dalam detik (default: STARTUP_BUDGET_SECONDS di metanew.py)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Batas waktu satu pengukuran (detik)")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    runs = []
+    with display_environment() as env:
+        for index in range(max(1, args.repeat)):
+            try:
+                runs.append(measure_once(args.timeout, env))
+            except (RuntimeError, subprocess.TimeoutExpired, ValueError) as e:
+                print(f"Error: Pengukuran {index + 1} gagal: {e}", file=sys.stderr)
+                return 2
+
+    budget = args.budget if args.budget is not None else runs[0]["budget_seconds"]
+    import_seconds = statistics.median(run["import_seconds"] for run in runs)
+    import_runs = ", ".join(f"{run['import_seconds']:.3f}" for run in runs)
+    print(f"Impor metanew        : median {import_seconds:.3f} s ({import_runs})")
+    window_runs = [run["window_seconds"] for run in runs if run["window_seconds"] is not None]
+    if window_runs:
+        measured = statistics.median(window_runs)
+        print(f"Jendela pertama      : median {measured:.3f} s ({', '.join(f'{seconds:.3f}' for seconds in window_runs)})")
+    else:
+        measured = import_seconds
+        print(f"Jendela pertama      : dilewati, tidak ada display ({runs[0].get('skipped_window', '')}); hanya impor yang diperiksa")
+    print(f"Anggaran startup     : {budget:.3f} s")
+    if measured > budget:
+        print(f"GAGAL: startup {measured:.3f} s melebihi anggaran {budget:.3f} s.")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""Anggaran waktu startup GUI (STARTUP_BUDGET_SECONDS di metanew.py).
+
+Setiap pengukuran berjalan di interpreter baru lewat startup_check.measure_once. Waktu sampai jendela pertama
+diperiksa di display yang ada atau di Xvfb sementara; test itu hanya dilewati jika keduanya tidak tersedia.
+"""
+import os
+import statistics
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import startup_check # noqa: E402
+
+REPEAT = 3 # Median beberapa run agar satu run lambat (cache disk dingin) tidak langsung menggagalkan test
+TIMEOUT_SECONDS = 60
+
+
+class StartupBudgetTest(unittest.TestCase):
+    def test_import_within_budget(self):
+        runs = [startup_check.measure_once(TIMEOUT_SECONDS) for _ in range(REPEAT)]
+        budget = runs[0]["budget_seconds"]
+        import_seconds = statistics.median(run["import_seconds"] for run in runs)
+        self.assertLessEqual(import_seconds, budget, f"impor metanew {import_seconds:.3f} s melebihi anggaran {budget:.3f} s")
+
+    def test_first_window_within_budget(self):
+        with startup_check.display_environment() as env:
+            if env is None:
+                self.skipTest("tidak ada display dan Xvfb tidak terinstal")
+            runs = [startup_check.measure_once(TIMEOUT_SECONDS, env) for _ in range(REPEAT)]
+        skipped = [run["skipped_window"] for run in runs if run["window_seconds"] is None]
+        self.assertFalse(skipped, f"jendela pertama tidak bisa dibuat: {skipped[:1]}")
+        budget = runs[0]["budget_seconds"]
+        window_seconds = statistics.median(run["window_seconds"] for run in runs)
+        self.assertLessEqual(window_seconds, budget, f"jendela pertama {window_seconds:.3f} s melebihi anggaran {budget:.3f} s")
+
+
+if __name__ == "__main__":
+    unittest.main()